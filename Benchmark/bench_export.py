@@ -0,0 +1,103 @@
+# 房间图像导出的性能测试
+# 对比通过QPainter与图集逐块绘制的旧实现与基于NumPy的合成实现,新实现按照条带合成,不保留整张图像
+# 使用--png时额外测试逐条带编码写入PNG文件的耗时以及进程峰值内存的增长
+# 用法: python Benchmark/bench_export.py [--sizes 512 1024 4096] [--tilesize 8] [--legacy-limit 1024] [--png]
+
+import os
+import sys
+import time
+import argparse
+import resource
+import tempfile
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from PyQt5.QtWidgets import QApplication
+from PyQt5.QtGui import *
+
+app = QApplication.instance() or QApplication(sys.argv)
+
+from EditorChunk import ChunkedTilemap
+from EditorTileAtlas import TileAtlas
+from EditorExport import TileImages, RoomCompositor, export_image
+
+
+def build_atlas(tilesize:int, ntiles:int, tall:int) -> TileAtlas:
+    '''每tall块瓦片中有一块是两格高的瓦片,每三块瓦片中有一块是半透明的'''
+
+    atlas = TileAtlas()
+    for tileId in range(1, ntiles + 1):
+        pixmap = QPixmap(tilesize, tilesize * 2 if tileId % tall == 0 else tilesize)
+        pixmap.fill(QColor.fromHsv(tileId * 47 % 360, 200, 200, 255 if tileId % 3 else 128))
+        atlas.add(tileId, pixmap)
+    return atlas
+
+def build_layers(side:int, ntiles:int, densities:list, rng: np.random.Generator) -> list:
+    layers = list()
+    for density in densities:
+        storage = ChunkedTilemap((side, side))
+        for y0 in range(0, side, 512):
+            rows = min(512, side - y0)
+            storage.write_block(0, y0, np.where(rng.random((side, rows)) < density, rng.integers(1, ntiles + 1, (side, rows)), 0))
+        layers.append(storage)
+    return layers
+
+def legacy_export(layers:list, atlas: TileAtlas, size:tuple, tilesize:int) -> QImage:
+    '''旧版export_room_image,所有格子通过图集绘制到一张完整的图像中'''
+
+    image = QImage(size[0] * tilesize, size[1] * tilesize, QImage.Format_ARGB32_Premultiplied)
+    image.fill(0)
+    painter = QPainter(image)
+    for storage in layers:
+        xs, ys, tileIds = storage.nonzero()
+        order = np.lexsort((xs, -ys))
+        atlas.paint(painter, (xs[order] * tilesize).tolist(), (image.height() - ys[order] * tilesize).tolist(), tileIds[order].tolist())
+    painter.end()
+    return image
+
+def run(side:int, tilesize:int, strip:int, legacy_limit:int, png:bool, atlas: TileAtlas, rng: np.random.Generator):
+    layers = build_layers(side, len(atlas.rects), [0.9, 0.3], rng)
+    tiles = TileImages.from_atlas(atlas, (tilesize, tilesize))
+    compositor = RoomCompositor(layers, (side, side), tiles)
+
+    start = time.perf_counter()
+    for top in range(0, compositor.height, strip):
+        compositor.render(0, top, compositor.width, min(top + strip, compositor.height))
+    t_new = time.perf_counter() - start
+    pixels = compositor.width * compositor.height
+
+    line = f"{side:>5}^2 tiles  {compositor.width}x{compositor.height}px  numpy {t_new:7.2f}s ({pixels / t_new / 1e6:5.0f} Mpx/s)"
+    if png:
+        # DOC> ru_maxrss在Linux上以KB为单位
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        with tempfile.TemporaryDirectory() as folder:
+            filepath = os.path.join(folder, "room.png")
+            start = time.perf_counter()
+            export_image(compositor, filepath, strip)
+            t_png = time.perf_counter() - start
+            filesize = os.path.getsize(filepath)
+        growth = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss - peak
+        line += f"  | png {t_png:7.2f}s {filesize / 2**20:6.1f}MB peak +{growth / 1024:4.0f}MB (raw {pixels * 4 / 2**20:6.0f}MB)"
+    if side <= legacy_limit:
+        start = time.perf_counter()
+        legacy_export(layers, atlas, (side, side), tilesize)
+        t_legacy = time.perf_counter() - start
+        line += f"  | legacy {t_legacy:7.2f}s ({t_legacy / t_new:4.1f}x)"
+    else:
+        line += "  | legacy skipped"
+    print(line)
+
+if __name__ == '__main__':
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sizes", type=int, nargs="+", default=[512, 1024, 4096])
+    parser.add_argument("--tilesize", type=int, default=8)
+    parser.add_argument("--strip", type=int, default=256, help="每次合成的条带高度(像素)")
+    parser.add_argument("--legacy-limit", type=int, default=1024, help="超过该边长时跳过旧实现")
+    parser.add_argument("--png", action="store_true", help="同时测试流式写入PNG文件")
+    args = parser.parse_args()
+
+    atlas = build_atlas(args.tilesize, 64, 16)
+    rng = np.random.default_rng(0)
+    for side in args.sizes:
+        run(side, args.tilesize, args.strip, args.legacy_limit, args.png, atlas, rng)
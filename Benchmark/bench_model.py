@@ -0,0 +1,87 @@
+# 地图数据核心模块的性能测试
+# 只使用EditorModel,不导入PyQt5,可以在没有显示器的环境以及工作进程中运行
+# 测试瓦片id的分配与回收、房间文件(JSON/二进制)的存储与读取、写时复制快照以及在进程池中并行读取房间文件
+# 用法: python Benchmark/bench_model.py [--tiles 20000] [--size 1024] [--rooms 8] [--jobs 4]
+
+import os
+import sys
+import time
+import argparse
+import tempfile
+import concurrent.futures
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from EditorModel import Project, RoomBuffer, load_room_file, save_room_file
+
+
+def timeit(func, *args):
+    start = time.perf_counter()
+    result = func(*args)
+    return time.perf_counter() - start, result
+
+def build_project(folder:str, ntiles:int) -> Project:
+    '''创建ntiles块瓦片(空文件即可,核心模块不读取图像),再删除其中一半并重新创建,测试id的回收'''
+
+    project = Project((16, 16))
+    manager = project.tileManager
+    manager.createLib()
+    for i in range(ntiles):
+        filepath = os.path.join(folder, f"tile{i}.png")
+        open(filepath, "wb").close()
+        manager.create(filepath)
+    for index in range(len(manager.currentlib.tiles) - 1, -1, -2):
+        project.remove_tile(manager.currentlib, index)
+    for i in range(1, ntiles, 2):
+        manager.create(os.path.join(folder, f"tile{i}.png"))
+    return project
+
+def build_room(side:int, ntiles:int, rng: np.random.Generator) -> RoomBuffer:
+    room = RoomBuffer((side, side))
+    for name, density in zip(room.layers, (0.9, 0.5, 0.2, 0.05)):
+        room.layers[name]._tilemap.write_block(0, 0, np.where(rng.random((side, side)) < density, rng.integers(1, ntiles + 1, (side, side)), 0))
+    return room
+
+def load_file(filepath:str) -> int:
+    '''工作进程中读取一个房间文件,返回房间中非零格子的数量'''
+
+    _, room = load_room_file(filepath)
+    return sum(value._tilemap.count_nonzero() for value in room.layers.values())
+
+if __name__ == '__main__':
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--tiles", type=int, default=20000)
+    parser.add_argument("--size", type=int, default=1024, help="房间的边长(格子)")
+    parser.add_argument("--rooms", type=int, default=8, help="进程池测试中的房间文件数量")
+    parser.add_argument("--jobs", type=int, default=os.cpu_count() or 1)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    with tempfile.TemporaryDirectory() as folder:
+        t, project = timeit(build_project, folder, args.tiles)
+        print(f"tiles   {args.tiles} created, half removed and recreated  {t:6.2f}s  ids in use {project.tileManager.counter.count}")
+
+        room = build_room(args.size, args.tiles, rng)
+        for ext in (".mroom", ".json"):
+            filepath = os.path.join(folder, "room" + ext)
+            t_save, _ = timeit(save_room_file, filepath, project.json, room)
+            t_load, _ = timeit(load_room_file, filepath)
+            print(f"room    {args.size}^2 {ext:<6}  save {t_save:6.2f}s  load {t_load:6.2f}s  file {os.path.getsize(filepath) / 2**20:7.1f}MB")
+
+        t, snapshot = timeit(room.snapshot)
+        storage = room.layers["Base"]._tilemap
+        t_write, _ = timeit(storage.write_block, 0, 0, np.zeros((args.size, args.size), dtype=np.int32))
+        print(f"snapshot {t * 1000:6.2f}ms  first full-layer write after snapshot {t_write * 1000:6.2f}ms")
+
+        files = list()
+        for i in range(args.rooms):
+            filepath = os.path.join(folder, f"batch{i}.mroom")
+            save_room_file(filepath, project.json, snapshot)
+            files.append(filepath)
+        t_serial, _ = timeit(lambda: [load_file(filepath) for filepath in files])
+        with concurrent.futures.ProcessPoolExecutor(args.jobs) as pool:
+            t_pool, _ = timeit(lambda: list(pool.map(load_file, files)))
+        print(f"load {args.rooms} rooms  serial {t_serial:6.2f}s  pool({args.jobs}) {t_pool:6.2f}s")
+
+    print("PyQt5 imported:", any(name.startswith("PyQt5") for name in sys.modules))
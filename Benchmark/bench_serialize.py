@@ -0,0 +1,75 @@
+# 层级序列化与反序列化的性能测试
+# 对比逐格遍历的旧实现与基于NumPy的分块实现
+# 用法: python Benchmark/bench_serialize.py [--density 0.25] [--legacy-limit 1024]
+
+import os
+import sys
+import time
+import argparse
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from EditorChunk import ChunkedTilemap
+
+
+def legacy_json(tilemap:np.ndarray) -> list:
+    '''旧版TilemapBuffer.json,逐格遍历稠密数组'''
+
+    output = []
+    width, height = tilemap.shape
+    for x in range(width):
+        for y in range(height):
+            v = tilemap[x, y]
+            if v != 0:output.append([x, y, int(tilemap[x, y])])
+    return output
+
+def legacy_load(size:tuple, cells:list) -> ChunkedTilemap:
+    '''旧版本没有加载函数,这里按照编辑器逐格绘制的方式逐个写入'''
+
+    storage = ChunkedTilemap(size)
+    for x, y, tileId in cells:
+        storage.set(x, y, tileId)
+    return storage
+
+def normalize(cells:list) -> np.ndarray:
+    '''新实现按照分块顺序输出,比较前统一排序'''
+
+    cells = np.asarray(cells, dtype=np.int64).reshape(-1, 3)
+    return cells[np.lexsort((cells[:, 1], cells[:, 0]))]
+
+def timeit(func, *args) -> tuple:
+    start = time.perf_counter()
+    result = func(*args)
+    return time.perf_counter() - start, result
+
+def run(side:int, density:float, legacy_limit:int, rng: np.random.Generator):
+    size = (side, side)
+    dense = np.where(rng.random(size) < density, rng.integers(1, 256, size), 0).astype(np.int32)
+    storage = ChunkedTilemap.from_cells(size, np.column_stack((*np.nonzero(dense), dense[dense != 0])))
+
+    t_save, cells = timeit(storage.tolist)
+    t_load, loaded = timeit(ChunkedTilemap.from_cells, size, cells)
+    assert (loaded.to_dense() == dense).all()
+
+    line = f"{side:>5}^2  cells={len(cells):>9}  new save {t_save * 1000:9.1f}ms  new load {t_load * 1000:9.1f}ms"
+    if side <= legacy_limit:
+        t_legacy_save, legacy_cells = timeit(legacy_json, dense)
+        t_legacy_load, _ = timeit(legacy_load, size, legacy_cells)
+        assert (normalize(legacy_cells) == normalize(cells)).all()
+        line += f"  | legacy save {t_legacy_save * 1000:9.1f}ms ({t_legacy_save / t_save:5.1f}x)"
+        line += f"  legacy load {t_legacy_load * 1000:9.1f}ms ({t_legacy_load / t_load:5.1f}x)"
+    else:
+        line += "  | legacy skipped"
+    print(line)
+
+if __name__ == '__main__':
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--density", type=float, default=0.25, help="已绘制格子的比例")
+    parser.add_argument("--legacy-limit", type=int, default=4096, help="超过该边长时跳过旧实现")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[256, 1024, 4096])
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    for side in args.sizes:
+        run(side, args.density, args.legacy_limit, rng)
@@ -0,0 +1,119 @@
+# 视图渲染配置的性能测试
+# 在一个铺满瓦片的层级上移动鼠标指示器,测量每一种渲染配置下从鼠标移动事件到视口重绘完成的延迟以及重绘的面积
+# 用法: python Benchmark/bench_viewport.py [--size 256] [--zooms 1.0 0.5 2.0] [--moves 400]
+
+import os
+import sys
+import time
+import argparse
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from PyQt5.QtWidgets import *
+from PyQt5.QtCore import *
+from PyQt5.QtGui import *
+
+app = QApplication.instance() or QApplication(sys.argv)
+
+from Euclid.EuclidGraphicsView import EuclidSceneGrid, RENDER_PROFILES
+from Editor import EditorView
+from EditorChunk import ChunkedTilemap
+from EditorTileAtlas import TileAtlas
+from EditorLayerRenderer import LayerRenderer
+from EditorTools import ToolHelper
+
+
+class PaintMonitor(QObject):
+    '''统计视口的重绘次数与重绘面积'''
+
+    def __init__(self, widget: QWidget):
+        super().__init__(widget)
+        self.count = 0
+        self.area = 0
+        widget.installEventFilter(self)
+
+    def eventFilter(self, obj, event):
+        if event.type() == QEvent.Paint:
+            self.count += 1
+            self.area += sum(rect.width() * rect.height() for rect in event.region().rects())
+        return False
+
+def build(side:int, tilesize:tuple, ntiles:int, rng: np.random.Generator):
+    '''创建一个铺满随机瓦片的场景'''
+
+    atlas = TileAtlas()
+    for tileId in range(1, ntiles + 1):
+        pixmap = QPixmap(*tilesize)
+        pixmap.fill(QColor.fromHsv(tileId * 47 % 360, 200, 200))
+        atlas.add(tileId, pixmap)
+
+    scene = EuclidSceneGrid(cellsize=tilesize)
+    data = np.where(rng.random((side, side)) < 0.6, rng.integers(1, ntiles + 1, (side, side)), 0)
+    storage = ChunkedTilemap((side, side))
+    storage.write_block(0, 0, data)
+    layer = LayerRenderer(storage, tilesize, QPointF(-side * tilesize[0] // 2, side * tilesize[1] // 2), atlas)
+    scene.addItem(layer)
+    layer.markAll()
+    layer.flush()
+    return scene, layer
+
+def settle(monitor: PaintMonitor, painted:int) -> None:
+    '''处理事件直到视口完成重绘,场景的变化需要经过几轮事件循环才会触发重绘'''
+
+    for _ in range(8):
+        app.processEvents()
+        if monitor.count > painted:
+            return
+
+def run(view: EditorView, indicator: QGraphicsRectItem, helper: ToolHelper, monitor: PaintMonitor, moves:int) -> tuple:
+    viewport = view.viewport()
+    w, h = viewport.width(), viewport.height()
+    positions = [QPoint(int(w * (0.1 + 0.8 * i / moves)), int(h * (0.5 + 0.3 * np.sin(i / 10)))) for i in range(moves)]
+    for pos in positions[:20]:
+        indicator.setPos(helper.qgridsnap(view.mapToScene(pos)))
+        settle(monitor, monitor.count)
+
+    times = list()
+    monitor.area, count = 0, monitor.count
+    for pos in positions:
+        start = time.perf_counter()
+        QApplication.sendEvent(viewport, QMouseEvent(QEvent.MouseMove, QPointF(pos), Qt.NoButton, Qt.NoButton, Qt.NoModifier))
+        settle(monitor, monitor.count)
+        times.append(time.perf_counter() - start)
+    times = np.array(times) * 1000
+    return times.mean(), np.percentile(times, 95), monitor.area / max(1, monitor.count - count)
+
+if __name__ == '__main__':
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--size", type=int, default=256, help="层级的边长(格子)")
+    parser.add_argument("--tilesize", type=int, default=16)
+    parser.add_argument("--zooms", type=float, nargs="+", default=[1.0, 0.5, 2.0])
+    parser.add_argument("--moves", type=int, default=400, help="每一组测试中鼠标移动的次数")
+    parser.add_argument("--viewport", type=int, nargs=2, default=[1400, 900])
+    args = parser.parse_args()
+
+    tilesize = (args.tilesize, args.tilesize)
+    scene, layer = build(args.size, tilesize, 64, np.random.default_rng(0))
+    helper = ToolHelper(tilesize)
+    indicator = helper.createindicator(QColor("#ffffff"))
+    indicator.setZValue(100)
+    scene.addItem(indicator)
+
+    view = EditorView()
+    view.setScene(scene)
+    view.resize(*args.viewport)
+    view.show()
+    view.onMove.connect(lambda event: indicator.setPos(helper.qgridsnap(view.mapToScene(event.pos()))))
+    monitor = PaintMonitor(view.viewport())
+    view.centerOn(0, 0)
+    app.processEvents()
+
+    for zoom in args.zooms:
+        view.resetTransform()
+        view.scale(zoom, zoom)
+        view.centerOn(0, 0)
+        for profile in RENDER_PROFILES:
+            view.setRenderProfile(profile)
+            mean, p95, area = run(view, indicator, helper, monitor, args.moves)
+            print(f"zoom {zoom:4.2f}  {profile.name:<12}  move latency mean {mean:7.2f}ms  p95 {p95:7.2f}ms  painted {area:10.0f}px/frame")
@@ -2,8 +2,8 @@
 
 from Euclid.EuclidWindow import *
 from Euclid.EuclidWidgets import *
-from Euclid.EuclidGraphicsView import EuclidView
-import queue
+from Euclid.EuclidGraphicsView import EuclidView, RENDER_PIXEL
+from EditorThumbnail import scale_thumbnail
 
 class EditorColor:
 
@@ -23,175 +23,164 @@ class EditorColor:
     SLIENT_COLOR_PURPLE = QColor("#5655a6")
     SLIENT_COLOR_GREEN = QColor("#78a655")
 
-class EditorLabelContainer(EuclidScrollArea):
-    '''EditorLabel的容器盒子'''
+class EditorLabelModel(QAbstractListModel):
+    '''瓦片面板的数据模型,只保存渲染信息,缩略图在label被绘制时才通过容器获取'''
+
+    def __init__(self, container):
+        super().__init__(container)
+        self.container = container
+        self.infos = list()
+
+    def rowCount(self, parent=QModelIndex()) -> int:
+        return 0 if parent.isValid() else len(self.infos)
+
+    def data(self, index: QModelIndex, role=Qt.DisplayRole):
+        if not index.isValid() or index.row() >= len(self.infos):
+            return None
+        info = self.infos[index.row()]
+        if role == Qt.DisplayRole:
+            return info[0]
+        if role == Qt.DecorationRole:
+            return self.container.thumbnail(info)
+        if role == Qt.ToolTipRole and self.container.describe != None:
+            return self.container.describe(info)
+        return None
+
+    def reset(self, infos:list):
+        '''替换所有的渲染信息'''
+
+        self.beginResetModel()
+        self.infos = list(infos)
+        self.endResetModel()
+
+    def setInfo(self, row:int, info:tuple):
+        '''替换第row个渲染信息'''
+
+        if row >= 0 and row < len(self.infos):
+            self.infos[row] = info
+            index = self.index(row)
+            self.dataChanged.emit(index, index)
+
+
+class EditorLabelDelegate(QStyledItemDelegate):
+    '''绘制单个label:圆角边框+居中的缩略图+标题,鼠标悬停与选中时改变边框的颜色'''
+
+    BORDER_COLOR = QColor("#8e8e9f")
+    HOVER_COLOR = EditorColor.EYECATCH_COLOR_CYAN
+    CHOOSED_COLOR = EditorColor.EYECATCH_COLOR_RED
+
+    def __init__(self, container):
+        super().__init__(container)
+        self.container = container
+
+    def sizeHint(self, option, index) -> QSize:
+        return QSize(*self.container.labelSize)
+
+    def paint(self, painter: QPainter, option: QStyleOptionViewItem, index: QModelIndex):
+        w, h = self.container.labelSize
+        rect = QRect(option.rect.topLeft(), QSize(w, h))
+        if index.row() == self.container.choosedIndex:
+            color = self.CHOOSED_COLOR
+        elif option.state & QStyle.State_MouseOver:
+            color = self.HOVER_COLOR
+        else:
+            color = self.BORDER_COLOR
+
+        painter.save()
+        painter.setRenderHint(QPainter.Antialiasing, True)
+        painter.setPen(QPen(color, 1))
+        painter.setBrush(Qt.NoBrush)
+        painter.drawRoundedRect(QRectF(rect).adjusted(0.5, 0.5, -0.5, -0.5), 4, 4)
+
+        # DOC> 缩略图居中绘制在正方形的图片框中,超出图片框的部分被裁剪
+        thumbnail = index.data(Qt.DecorationRole)
+        if thumbnail != None and not thumbnail.isNull():
+            box = QRect(rect.x() + 1, rect.y() + 1, w - 2, w - 2)
+            target = QRect(QPoint(0, 0), thumbnail.size())
+            target.moveCenter(box.center())
+            painter.setClipRect(box)
+            painter.drawPixmap(target.topLeft(), thumbnail)
+            painter.setClipping(False)
+
+        painter.setPen(EditorColor.TEXT_COLOR)
+        painter.setFont(option.font)
+        painter.drawText(QRect(rect.x(), rect.y() + w, w, h - w), Qt.AlignCenter, index.data(Qt.DisplayRole) or "")
+        painter.restore()
+
+
+class EditorLabelContainer(QListView):
+    '''EditorLabel的容器盒子\n
+    以模型/视图的方式实现,只有可见的label会被绘制并获取缩略图,因此label的数量不会影响渲染与调整尺寸的开销'''
 
     onLabelChoosed = pyqtSignal(int)
     '''当第index个label被选中的时候,该信号触发'''
 
-    def __init__(self, parent=None, labelSize=(50, 64)):
+    def __init__(self, parent=None, labelSize=(50, 64), thumbnails=None):
         super().__init__(parent=parent)
+        self.setObjectName(EUCLID_SUBAREA)
 
-        self.labelList = list()
         self.labelSize = labelSize
-        self.recycleQueue = queue.Queue()
-        self.gridLayout = QGridLayout(self.container)
-        self.gridLayout.setAlignment(Qt.AlignLeft| Qt.AlignTop)
-        self.choosedLabel = None
+        # DOC> 缩略图缓存(EditorThumbnail.ThumbnailCache),为None时每次绘制都重新缩放图像
+        self.thumbnails = thumbnails
+        # DOC> 根据渲染信息生成label提示信息的函数,只有鼠标悬停时才会调用
+        self.describe = None
         self.choosedIndex = -1
-        self.row = 1
+
+        self.labelModel = EditorLabelModel(self)
+        self.setModel(self.labelModel)
+        self.setItemDelegate(EditorLabelDelegate(self))
+
+        # DOC> 所有label尺寸相同,以固定网格从左到右从上到下排列,尺寸改变时自动重新排列
+        self.setViewMode(QListView.IconMode)
+        self.setFlow(QListView.LeftToRight)
+        self.setWrapping(True)
+        self.setResizeMode(QListView.Adjust)
+        self.setMovement(QListView.Static)
+        self.setUniformItemSizes(True)
+        # DOC> 分批排列label,数量很多时渲染和调整尺寸不会阻塞界面
+        self.setLayoutMode(QListView.Batched)
+        self.setBatchSize(1000)
+        self.setGridSize(QSize(*labelSize))
+        self.setSpacing(0)
+        self.setSelectionMode(QAbstractItemView.NoSelection)
+        self.setHorizontalScrollBarPolicy(Qt.ScrollBarAlwaysOff)
+        self.setVerticalScrollMode(QAbstractItemView.ScrollPerPixel)
+        self.setMouseTracking(True)
+        self.pressed.connect(lambda index:self._onLabelChoosed(index.row()))
 
     def _onLabelChoosed(self, index:int):
         '''回调函数(当Label被选中)'''
 
         if self.choosedIndex != index:
             self.choosedIndex = index
-            if self.choosedLabel != None:
-                restyle(self.choosedLabel, "EditorLabel")
-            self.choosedLabel = self.labelList[index]
-            restyle(self.choosedLabel, "EditorLabelChoosed")
+            self.viewport().update()
             self.onLabelChoosed.emit(index)
 
+    def thumbnail(self, info:tuple) -> QPixmap:
+        '''获取渲染信息对应的缩略图\n
+        渲染信息为(标题, 图像)或者(标题, 图像, 缓存键, 源文件路径),只有带有缓存键的信息才会使用缩略图缓存'''
+
+        picture = info[1]
+        if self.thumbnails is None or len(info) < 3:
+            return scale_thumbnail(picture, self.labelSize)
+        return self.thumbnails.get(info[2], picture, self.labelSize, info[3] if len(info) > 3 else None)
+
     def clear(self):
         '''清空所有的渲染'''
 
-        self.checkCount(0)
-        self.choosedLabel = None
-        self.choosedIndex = -1
+        self.render([])
 
     def render(self, brushes:list):
         '''渲染一组笔刷信息(注意,只有笔刷信息,而不是具体的数据概念)'''
 
         # 清空之前的选中对象
-        if self.choosedLabel != None:
-            restyle(self.choosedLabel, "EditorLabel")
-            self.choosedLabel = None
-        self.choosedIndex = -1;
-
-        _count = len(brushes)
-        self.checkCount(_count)
-        self.row = max(1, self.container.width() // self.labelSize[0])
-
-        for idx, info in enumerate(brushes):
-            label = self.labelList[idx]
-            self.gridLayout.addWidget(label, idx // self.row, idx % self.row, 1, 1)
-            label.render(info[0], info[1])
-            label.index = idx
-        self._updateLayout(_count)
-
-    def generate(self):
-        '''创建一个新的Label'''
-
-        if self.recycleQueue.empty():
-            return _EditorLabel(self._onLabelChoosed, self.labelSize)
-        label = self.recycleQueue.get()
-        label.setFixedSize(*self.labelSize)
-        label.show()
-        return label
-
-    def checkCount(self, count:int) -> bool:
-        '''确保当前的Label数量为count'''
-
-        _count = len(self.labelList)
-        if _count == count:return False
-        if _count > count:
-            for i in range(_count - count):
-                label = self.labelList.pop()
-                label.hide()
-                self.gridLayout.removeWidget(label)
-                self.recycleQueue.put(label)
-            return True
-        else:
-            for i in range(count - _count):                
-                self.labelList.append(self.generate())
-            return True
-
-    def updateLayoutSize(self):
-        '''调整当前网格布局的排布 '''
-
-        count = len(self.labelList)
-        rowLength = max(1, self.container.width() // self.labelSize[0])
-        if rowLength != self.row and count >= rowLength:
-            # 横轴长度发生变化, 需要更新所有的渲染器位置
-
-            self.row = rowLength
-            self._updateLayout(count)
-
-    def _updateLayout(self, count):
-        '''更新容器布局'''
-
-        row = self.row
-        for idx, label in enumerate(self.labelList):
-            self.gridLayout.addWidget(label, idx // row, idx % row, 1, 1)
-        h = count // row if count % row == 0 else (count // row) + 1
-        self.container.setMinimumHeight(h * self.labelSize[1])
-
-    def resizeEvent(self, evt: QResizeEvent):
-        _size = evt.size()
-        self.container.resize(_size.width(), max(_size.height() - 10, self.container.minimumHeight()))
-        self.updateLayoutSize()
-        super().resizeEvent(evt)
-
-class _EditorLabel(QLabel):
-    '''显示一张图片+标题'''
+        self.choosedIndex = -1
+        self.labelModel.reset(brushes)
 
-    def __init__(self, clickCallback, size=(50,64), parent=None):
-        super().__init__(parent=parent)
-        self.setObjectName("EditorLabel")
-        self.setFixedSize(*size)
-        self.setAlignment(Qt.AlignCenter)
-        self.clickCallback = clickCallback
-
-        self.pictureBox = QLabel(self)
-        self.pictureBox.setObjectName("EditorLabel_picturebox")
-        self.pictureBox.setAlignment(Qt.AlignCenter)
-        self.pictureBox.setFixedSize(size[0] - 2, size[0] - 2)
-        self.pictureBox.move(1, 1)
-
-        self.title = QLabel(self)
-        self.title.setAlignment(Qt.AlignCenter)
-        self.title.setFixedSize(size[0], size[1] - size[0])
-        self.title.move(0, size[0])
-
-        self.index = 0
-
-    def mousePressEvent(self, ev) -> None:
-        self.clickCallback(self.index)
-        return super().mousePressEvent(ev)
-
-    def render(self, text:str, picture:QPixmap):
-        '''渲染笔刷信息'''
-
-        self.title.setText(text)
-        if picture.height() > picture.width():
-            _pixmap = picture.scaledToHeight(self.height())
-        else:
-            _pixmap = picture.scaledToWidth(self.width())
-        self.pictureBox.setPixmap(_pixmap)
-
-    # def mousePressEvent(self, ev: QMouseEvent):
-    #     if ev.button() == Qt.RightButton:
-    #         self.entryPoint = ev.pos()
-    #         self.pressed = True
-
-    # def mouseMoveEvent(self, evt: QMouseEvent) -> None:
-    #     if self.pressed:
-    #         if (evt.pos() - self.entryPoint).manhattanLength() >= QApplication.startDragDistance():
-    #             e = QDrag(self)
-    #             mimeData = QMimeData()
-    #             mimeData.setParent(self)
-    #             mimeData.setProperty("brush", self.brush)
-    #             e.setMimeData(mimeData)
-    #             e.exec_()
-    #     return super().mouseMoveEvent(evt)
-
-    # def mouseReleaseEvent(self, evt) -> None:
-    #     if evt.button() == Qt.RightButton:
-    #         self.pressed = False
-    #     elif evt.button() == Qt.LeftButton:
-    #         restyle(self.pictureBox, "IndicatorChoozed")
-    #         self.callback(self)
+    def update_label(self, index:int, info:tuple):
+        '''只更新第index个label的渲染信息,不改变当前的选中状态'''
 
+        self.labelModel.setInfo(index, info)
 
 class EditorListItem(QWidget):
     '''一个支持编辑的Item,自身携带一个按钮'''
@@ -330,13 +319,32 @@ class EditorView(EuclidView):
     onEnter = pyqtSignal(QEnterEvent)
     onLeave = pyqtSignal(QEvent)
     onRelease = pyqtSignal(QMouseEvent)
+    viewportChanged = pyqtSignal()
+    '''视口的可见范围因为滚动、缩放或者尺寸改变而发生了变化'''
 
-    def __init__(self, parent=None):
-        super().__init__(parent=parent)
+    def __init__(self, parent=None, profile=RENDER_PIXEL):
+        super().__init__(parent=parent, profile=profile)
 
     def setSelectable(self, value):
         self.setBaseRubberBand(QGraphicsView.RubberBandDrag if value else QGraphicsView.NoDrag)
 
+    def visibleSceneRect(self) -> QRectF:
+        '''视口在场景中的可见范围'''
+
+        return self.mapToScene(self.viewport().rect()).boundingRect()
+
+    def scrollContentsBy(self, dx:int, dy:int):
+        super().scrollContentsBy(dx, dy)
+        self.viewportChanged.emit()
+
+    def resizeEvent(self, event: QResizeEvent):
+        super().resizeEvent(event)
+        self.viewportChanged.emit()
+
+    def wheelEvent(self, evt):
+        super().wheelEvent(evt)
+        self.viewportChanged.emit()
+
     def mousePressEvent(self, event):
         self.onClicked.emit(event, super().mousePressEvent(event))
         
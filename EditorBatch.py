@@ -0,0 +1,159 @@
+# 批量导出
+# 不启动编辑器,直接在命令行中将一批房间文件(导出的JSON或者房间二进制文件)合成为PNG图像并重新存储房间数据,
+# 文件分配到进程池中并行处理,每个进程缓存已经读取的瓦片图像,同一个工程的多个房间只读取一次瓦片,
+# 整个过程只依赖NumPy与zlib,没有安装PyQt5或者使用--no-qt时通过read_png读取瓦片文件
+# 用法: python -m EditorBatch rooms/ other.mroom -o out/ [--data json|mroom] [-j 8] [--no-qt]
+
+import os
+import sys
+import json
+import time
+import argparse
+import concurrent.futures
+
+import EditorRoomFile
+from EditorModel import load_room_file, save_room_file
+from EditorExport import TileImages, RoomCompositor, export_image
+
+EXTENSIONS = (".json", EditorRoomFile.EXTENSION)
+
+# DOC> 每个工作进程中已经读取的瓦片图像 (瓦片尺寸, 是否使用Qt, 房间文件夹, 瓦片列表) > TileImages
+_tile_cache = dict()
+
+
+def find_files(inputs:list) -> list:
+    '''展开输入的文件与文件夹,文件夹中的房间文件按照文件名排序'''
+
+    files = list()
+    for path in inputs:
+        if os.path.isdir(path):
+            names = sorted(name for name in os.listdir(path) if name.endswith(EXTENSIONS))
+            files.extend(os.path.join(path, name) for name in names)
+        else:
+            files.append(path)
+    return files
+
+def tile_images(project:dict, folder:str, useQt:bool) -> TileImages:
+    '''读取工程中的瓦片图像,同一个进程中相同的工程只读取一次'''
+
+    key = (tuple(project["tilesize"]), useQt, folder, json.dumps(project["tileManager"]["tiles"]["tiles"], sort_keys=True))
+    tiles = _tile_cache.get(key)
+    if tiles is None:
+        tiles = _tile_cache[key] = TileImages.from_project(project, useQt, folder)
+    return tiles
+
+def normpath(path:str) -> str:
+    '''用于比较两个路径是否指向同一个文件'''
+
+    return os.path.normcase(os.path.realpath(path))
+
+def export_file(filepath:str, options:dict) -> dict:
+    '''处理一个房间文件(在工作进程中运行),返回各阶段的耗时(秒)以及输出信息,失败时返回错误信息\n
+    重新存储的房间数据会覆盖本次处理的任意一个输入文件时不处理该文件'''
+
+    result = {"file":filepath, "outputs":list()}
+    start = time.perf_counter()
+    try:
+        stem = os.path.splitext(os.path.basename(filepath))[0]
+        folder = options["output"] or os.path.dirname(filepath)
+        data = None
+        if options["data"] != None:
+            data = os.path.join(folder, stem + (".json" if options["data"] == "json" else EditorRoomFile.EXTENSION))
+            if normpath(data) in options["inputs"]:
+                raise ValueError("重新存储的房间数据会覆盖输入文件,请使用-o指定其他的输出文件夹")
+
+        project, room = load_room_file(filepath)
+        result["load"] = time.perf_counter() - start
+
+        if options["image"]:
+            mark = time.perf_counter()
+            tiles = tile_images(project, os.path.dirname(os.path.abspath(filepath)), options["useQt"])
+            compositor = RoomCompositor.from_room(room, tiles, options["layers"])
+            image = os.path.join(folder, stem + ".png")
+            export_image(compositor, image, compresslevel=options["compresslevel"])
+            result["render"] = time.perf_counter() - mark
+            result["pixels"] = (compositor.width, compositor.height)
+            result["outputs"].append(image)
+
+        if data != None:
+            mark = time.perf_counter()
+            save_room_file(data, project, room)
+            result["save"] = time.perf_counter() - mark
+            result["outputs"].append(data)
+    except Exception as e:
+        result["error"] = f"{type(e).__name__}: {e}"
+    result["total"] = time.perf_counter() - start
+    return result
+
+def format_result(result:dict) -> str:
+    '''单个文件的耗时信息'''
+
+    if "error" in result:
+        return f"{result['file']}  失败 {result['error']}"
+    line = f"{result['file']}  load {result['load']:.2f}s"
+    if "render" in result:
+        line += f"  render {result['render']:.2f}s ({result['pixels'][0]}x{result['pixels'][1]}px)"
+    if "save" in result:
+        line += f"  save {result['save']:.2f}s"
+    return line + f"  total {result['total']:.2f}s"
+
+def run(files:list, options:dict, jobs:int, output=print) -> list:
+    '''在进程池中处理所有文件,每完成一个文件输出一行耗时信息,返回按照输入顺序排列的结果\n
+    jobs为1时直接在当前进程中处理,便于调试'''
+
+    results = [None] * len(files)
+    count = 0
+    def report(index:int, result:dict) -> None:
+        nonlocal count
+        count += 1
+        results[index] = result
+        output(f"[{count}/{len(files)}] {format_result(result)}")
+
+    if jobs <= 1:
+        for index, filepath in enumerate(files):
+            report(index, export_file(filepath, options))
+        return results
+    with concurrent.futures.ProcessPoolExecutor(jobs) as pool:
+        futures = {pool.submit(export_file, filepath, options):index for index, filepath in enumerate(files)}
+        for future in concurrent.futures.as_completed(futures):
+            report(futures[future], future.result())
+    return results
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(prog="python -m EditorBatch", description="批量将房间文件导出为PNG图像并重新存储房间数据")
+    parser.add_argument("inputs", nargs="+", help=f"房间文件或者包含房间文件({'/'.join(EXTENSIONS)})的文件夹")
+    parser.add_argument("-o", "--output", default=None, help="输出文件夹,默认与输入文件相同")
+    parser.add_argument("-j", "--jobs", type=int, default=os.cpu_count() or 1, help="工作进程数量")
+    parser.add_argument("--data", choices=("json", "mroom"), default=None, help="同时以指定的格式重新存储房间数据,会覆盖输入文件时跳过该文件,此时需要用-o指定其他文件夹")
+    parser.add_argument("--no-image", action="store_true", help="不导出PNG图像")
+    parser.add_argument("--layers", nargs="+", default=None, help="只合成指定的层级")
+    parser.add_argument("--compresslevel", type=int, default=6, help="PNG的zlib压缩等级")
+    parser.add_argument("--no-qt", action="store_true", help="不使用Qt读取瓦片文件")
+    args = parser.parse_args(argv)
+
+    files = find_files(args.inputs)
+    if len(files) == 0:
+        print("没有找到房间文件", file=sys.stderr)
+        return 2
+    if args.output != None:
+        os.makedirs(args.output, exist_ok=True)
+    options = {
+        "output":args.output,
+        "inputs":set(normpath(filepath) for filepath in files),
+        "image":not args.no_image,
+        "data":args.data,
+        "layers":args.layers,
+        "compresslevel":args.compresslevel,
+        "useQt":not args.no_qt,
+    }
+
+    start = time.perf_counter()
+    results = run(files, options, min(args.jobs, len(files)))
+    wall = time.perf_counter() - start
+    failed = sum(1 for result in results if "error" in result)
+    busy = sum(result["total"] for result in results)
+    print(f"{len(files)}个文件, 失败{failed}个, 耗时{wall:.2f}s (各文件合计{busy:.2f}s)")
+    return 1 if failed > 0 else 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,87 @@
+# 笔刷
+# 笔刷是一个任意形状的瓦片id二维数组(与层级一样以[x, y]索引,y向上),为0的格子是透明的,
+# 绘制时笔刷的左上角对齐鼠标所在的格子,单块瓦片的brushdata就是一个1x1的笔刷
+
+from PyQt5.QtCore import *
+from PyQt5.QtGui import *
+
+import numpy as np
+
+
+class Brush:
+    '''一个多格笔刷(印章)'''
+
+    def __init__(self, name:str, data:np.ndarray):
+        '''@param name 笔刷名
+        @param data 瓦片id二维数组,为0的格子不会被绘制'''
+
+        self.name = name
+        self.data = np.ascontiguousarray(data, dtype=np.int32)
+        if self.data.ndim != 2 or self.data.size == 0:
+            raise ValueError("笔刷数据必须是非空的二维数组")
+        self.tileIds = np.unique(self.data[self.data != 0]).tolist()
+
+        # DOC> 预览图的缓存,图集中瓦片的位置与尺寸发生变化时重新合成
+        self._preview = QPixmap()
+        self._previewKey = None
+        self.previewOffset = QPointF(0, 0)
+
+    @staticmethod
+    def from_tile(tile) -> "Brush":
+        return Brush(tile.tileName, tile.brushdata)
+
+    @property
+    def size(self) -> tuple:
+        return self.data.shape
+
+    @property
+    def isSingleTile(self) -> bool:
+        return self.data.shape == (1, 1)
+
+    @property
+    def render_info(self) -> tuple:
+        '''笔刷面板的渲染信息(标题, 预览图)'''
+
+        return self.name, self._preview
+
+    def contains(self, tileId:int) -> bool:
+        return tileId in self.tileIds
+
+    def replace(self, tileId:int, value=0) -> bool:
+        '''将笔刷中的某种瓦片替换为value(默认擦除),返回笔刷是否发生了变化'''
+
+        if tileId not in self.tileIds:
+            return False
+        self.data[self.data == tileId] = value
+        self.tileIds = np.unique(self.data[self.data != 0]).tolist()
+        self._previewKey = None
+        return True
+
+    def preview(self, atlas, tilesize:tuple) -> QPixmap:
+        '''合成笔刷的预览图,鼠标指示器使用该图像\n
+        预览图的左上角对齐笔刷左上角的格子,超出格子高度的瓦片向上溢出,
+        溢出的高度记录在previewOffset中(指示器需要向上偏移)'''
+
+        tilew, tileh = tilesize
+        key = (tilew, tileh, tuple(atlas.rect(tileId).getRect() if tileId in atlas else None for tileId in self.tileIds))
+        if key == self._previewKey:
+            return self._preview
+
+        w, h = self.data.shape
+        marginw = max([atlas.size(tileId)[0] - tilew for tileId in self.tileIds] + [0])
+        marginh = max([atlas.size(tileId)[1] - tileh for tileId in self.tileIds] + [0])
+        pixmap = QPixmap(w * tilew + marginw, h * tileh + marginh)
+        pixmap.fill(Qt.transparent)
+
+        # DOC> 与分块的绘制顺序一致,从上往下逐行绘制,下方的瓦片覆盖上方溢出的部分
+        xs, ys = np.nonzero(self.data)
+        order = np.lexsort((xs, -ys))
+        xs, ys = xs[order], ys[order]
+        painter = QPainter(pixmap)
+        atlas.paint(painter, (xs * tilew).tolist(), ((h - ys) * tileh + marginh).tolist(), self.data[xs, ys].tolist())
+        painter.end()
+
+        self._preview = pixmap
+        self._previewKey = key
+        self.previewOffset = QPointF(0, -marginh)
+        return pixmap
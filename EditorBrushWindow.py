@@ -6,13 +6,19 @@ from PyQt5.QtGui import *
 
 from Euclid.EuclidWindow import *
 from Euclid.EuclidWidgets import *
-from Editor import _EditorLabel, EditorLabelContainer
+from Editor import EditorLabelContainer
+from EditorBrush import Brush
 
 class EditorBrushWindow(EuclidWindow):
     '''编辑器的笔刷窗体|临时存储当前所有的笔刷信息'''
 
+    brushChoosed = pyqtSignal(object)
+    '''选中了一个笔刷(EditorBrush.Brush)'''
+
     def __init__(self, parent=None):
         super().__init__(parent=parent,title="笔刷盒")
+        self.brushes = list()
+        self.project = None
         self.build()
 
     def build(self):
@@ -23,6 +29,7 @@ class EditorBrushWindow(EuclidWindow):
         self.btn_import = EuclidButton(text="新增瓦片")
         self.btn_savebrushbox = EuclidButton(text="保存笔刷库")
         self.btn_loadbrushbox = EuclidButton(text="加载笔刷库")
+        self.brush_box.onLabelChoosed.connect(self.on_brushbox_labelChoosed)
         self.setup()
 
     def setup(self):
@@ -33,4 +40,40 @@ class EditorBrushWindow(EuclidWindow):
         # self.addh_calch(self.brushlib_list, 100, (1.0, -30))
 
         # 按钮
-        self.addv(self.btn_import)
\ No newline at end of file
+        self.addv(self.btn_import)
+
+    def load_project(self, project):
+        '''切换工程,笔刷中的瓦片id只在同一个工程中有效,因此清空所有的笔刷'''
+
+        self.project = project
+        self.brushes.clear()
+        self.brush_box.clear()
+        project.tileRemoved.connect(self.on_project_tileRemoved)
+
+    def add_brush(self, brush: Brush):
+        '''增加一个笔刷并选中它'''
+
+        self.brushes.append(brush)
+        self.render()
+        self.brush_box.choosedIndex = len(self.brushes) - 1
+
+    def render(self):
+        '''重新渲染所有笔刷的预览图'''
+
+        if self.project != None:
+            for brush in self.brushes:
+                brush.preview(self.project.tileManager.atlas, self.project.tilesize)
+        self.brush_box.render([brush.render_info for brush in self.brushes])
+
+    @pyqtSlot(int)
+    def on_brushbox_labelChoosed(self, index:int):
+        if index >= 0 and index < len(self.brushes):
+            self.brushChoosed.emit(self.brushes[index])
+
+    def on_project_tileRemoved(self, tile):
+        '''瓦片被删除时从所有笔刷中擦除该瓦片,不再包含任何瓦片的笔刷被删除'''
+
+        changed = [brush.replace(tile.tileId) for brush in self.brushes]
+        if any(changed):
+            self.brushes = [brush for brush in self.brushes if len(brush.tileIds) > 0]
+            self.render()
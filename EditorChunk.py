@@ -0,0 +1,465 @@
+# 分块稀疏存储
+# 房间中每一个层级的瓦片id都存储在固定大小的分块中,分块只有在第一次写入非零数据时才会被分配,
+# 当分块中的数据被全部擦除时分块会被回收,因此内存与创建时间只与已绘制的区域相关,而与房间尺寸无关
+# 每个层级还维护一个瓦片id > {分块坐标:数量}的反向索引,查询某种瓦片的使用次数与位置时只需要访问包含它的分块
+# 快照与原层级共享分块,任何一方写入共享的分块之前才会复制该分块(写时复制),因此后台任务可以在编辑的同时读取快照
+
+import gc
+import itertools
+import contextlib
+import numpy as np
+
+CHUNK_SIZE = 32
+
+
+@contextlib.contextmanager
+def _gc_paused():
+    '''创建数百万个小列表会反复触发分代垃圾回收,生成期间暂停回收'''
+
+    enabled = gc.isenabled()
+    gc.disable()
+    try:
+        yield
+    finally:
+        if enabled:
+            gc.enable()
+
+
+class ChunkedTilemap:
+    '''以分块的形式存储一个层级的瓦片id,提供与二维np.ndarray相似的索引接口\n
+    支持 tilemap[x, y] 读写单点, tilemap[x0:x1, y0:y1] 读写矩形区域'''
+
+    def __init__(self, size:tuple, chunksize=CHUNK_SIZE, dtype=np.int32):
+        '''创建一个空的分块存储,此时不会分配任何分块'''
+
+        self.width, self.height = size
+        self.chunksize = chunksize
+        self.dtype = np.dtype(dtype)
+
+        # DOC> 分块目录 (cx, cy) > np.ndarray(chunksize, chunksize)
+        self.chunks = dict()
+        # DOC> 分块目录 (cx, cy) > 分块中非零数据的数量,为0时回收该分块
+        self.counts = dict()
+        # DOC> 反向索引 瓦片id > {(cx, cy):数量},第一次查询时才会建立,之后随写入增量更新
+        self._usage = None
+        # DOC> 与快照共享的分块坐标,写入这些分块之前需要先复制
+        self._shared = set()
+
+    @property
+    def shape(self) -> tuple:
+        return self.width, self.height
+
+    @property
+    def nbytes(self) -> int:
+        '''当前已分配的分块所占用的字节数'''
+
+        return len(self.chunks) * self.chunksize * self.chunksize * self.dtype.itemsize
+
+    def chunkpos(self, x:int, y:int) -> tuple:
+        '''计算一个点所在的分块以及其在分块中的局部坐标'''
+
+        cx, lx = divmod(x, self.chunksize)
+        cy, ly = divmod(y, self.chunksize)
+        return (cx, cy), lx, ly
+
+    def chunkrect(self, key:tuple) -> tuple:
+        '''计算分块在层级中覆盖的范围,返回左下角与右上角(不包含)的坐标'''
+
+        x0, y0 = key[0] * self.chunksize, key[1] * self.chunksize
+        return x0, y0, min(x0 + self.chunksize, self.width), min(y0 + self.chunksize, self.height)
+
+    def extent(self) -> tuple:
+        '''所有已分配分块覆盖的范围,返回左下角与右上角(不包含)的坐标,没有分块时返回None\n
+        范围之外的格子一定为0'''
+
+        if len(self.chunks) == 0:
+            return None
+        cxs = [key[0] for key in self.chunks]
+        cys = [key[1] for key in self.chunks]
+        x0, y0, _, _ = self.chunkrect((min(cxs), min(cys)))
+        _, _, x1, y1 = self.chunkrect((max(cxs), max(cys)))
+        return x0, y0, x1, y1
+
+    def _check(self, x:int, y:int) -> None:
+        if x < 0 or y < 0 or x >= self.width or y >= self.height:
+            raise IndexError(f"位置({x},{y})超出了层级的范围{self.shape}")
+
+    def _allocate(self, key:tuple) -> np.ndarray:
+        '''分配一个新的分块'''
+
+        chunk = np.zeros((self.chunksize, self.chunksize), dtype=self.dtype)
+        self.chunks[key] = chunk
+        self.counts[key] = 0
+        self._shared.discard(key)
+        return chunk
+
+    def _release(self, key:tuple) -> None:
+        '''回收一个空的分块'''
+
+        self.chunks.pop(key, None)
+        self.counts.pop(key, None)
+        self._shared.discard(key)
+
+    def _writable(self, key:tuple) -> np.ndarray:
+        '''返回一个可以写入的分块,分块与快照共享时先复制一份,不存在时返回None'''
+
+        chunk = self.chunks.get(key)
+        if chunk is not None and key in self._shared:
+            chunk = self.chunks[key] = chunk.copy()
+            self._shared.discard(key)
+        return chunk
+
+    def snapshot(self) -> "ChunkedTilemap":
+        '''创建层级当前数据的快照,快照与层级共享所有的分块,只有被写入的分块才会被复制\n
+        快照只复制分块目录,耗时只与分块数量有关'''
+
+        other = ChunkedTilemap(self.shape, self.chunksize, self.dtype)
+        other.chunks = dict(self.chunks)
+        other.counts = dict(self.counts)
+        self._shared = set(self.chunks)
+        other._shared = set(self.chunks)
+        return other
+
+    @property
+    def usage(self) -> dict:
+        '''瓦片id > {分块坐标:该瓦片在分块中的数量}'''
+
+        if self._usage is None:
+            self._usage = dict()
+            for key, chunk in self.chunks.items():
+                self._account(key, chunk, 1)
+        return self._usage
+
+    def invalidate_usage(self) -> None:
+        '''直接修改了chunks中的数据之后调用,反向索引会在下一次查询时重新建立'''
+
+        self._usage = None
+
+    def _account_one(self, key:tuple, tileId:int, delta:int) -> None:
+        '''更新反向索引中一个分块的一种瓦片的数量'''
+
+        chunks = self._usage.setdefault(tileId, dict())
+        count = chunks.get(key, 0) + delta
+        if count == 0:
+            chunks.pop(key, None)
+            if len(chunks) == 0:
+                self._usage.pop(tileId)
+        else:
+            chunks[key] = count
+
+    def _account(self, key:tuple, values:np.ndarray, sign:int) -> None:
+        '''将一组数据计入(sign=1)或者移出(sign=-1)一个分块的反向索引,0不会被计入'''
+
+        values = values[values != 0]
+        if values.size == 0:
+            return
+        top = int(values.max())
+        if top <= 4 * values.size + 1024:
+            # DOC> 瓦片id一般是从1开始连续分配的,直接计数比排序去重更快
+            counts = np.bincount(values.ravel(), minlength=top + 1)
+            tileIds = np.flatnonzero(counts)
+            counts = counts[tileIds]
+        else:
+            tileIds, counts = np.unique(values, return_counts=True)
+        for tileId, count in zip(tileIds.tolist(), counts.tolist()):
+            self._account_one(key, tileId, sign * count)
+
+    def usage_count(self, tileId:int) -> int:
+        '''某种瓦片在层级中的数量'''
+
+        return sum(self.usage.get(tileId, {}).values())
+
+    def used_ids(self) -> list:
+        '''层级中所有被使用的瓦片id'''
+
+        return list(self.usage)
+
+    def get(self, x:int, y:int) -> int:
+        '''读取单点数据'''
+
+        self._check(x, y)
+        key, lx, ly = self.chunkpos(x, y)
+        chunk = self.chunks.get(key)
+        if chunk is None:
+            return 0
+        return int(chunk[lx, ly])
+
+    def set(self, x:int, y:int, value:int) -> int:
+        '''写入单点数据,返回该点之前的数据'''
+
+        self._check(x, y)
+        key, lx, ly = self.chunkpos(x, y)
+        chunk = self._writable(key)
+        if chunk is None:
+            if value == 0:
+                return 0
+            chunk = self._allocate(key)
+        old = int(chunk[lx, ly])
+        if old == value:
+            return old
+        chunk[lx, ly] = value
+        if self._usage is not None:
+            if old != 0:
+                self._account_one(key, old, -1)
+            if value != 0:
+                self._account_one(key, int(value), 1)
+        if old == 0:
+            self.counts[key] += 1
+        elif value == 0:
+            self.counts[key] -= 1
+            if self.counts[key] == 0:
+                self._release(key)
+        return old
+
+    def _clip(self, xs:slice, ys:slice) -> tuple:
+        '''将切片裁剪到层级范围内,与np.ndarray的切片行为一致'''
+
+        if xs.step not in (None, 1) or ys.step not in (None, 1):
+            raise IndexError("ChunkedTilemap只支持步长为1的切片")
+        x0, x1, _ = xs.indices(self.width)
+        y0, y1, _ = ys.indices(self.height)
+        return x0, y0, max(x0, x1), max(y0, y1)
+
+    def _overlapped(self, x0:int, y0:int, x1:int, y1:int):
+        '''遍历与矩形区域相交的所有分块坐标'''
+
+        size = self.chunksize
+        for cx in range(x0 // size, (x1 - 1) // size + 1):
+            for cy in range(y0 // size, (y1 - 1) // size + 1):
+                yield cx, cy
+
+    def read_block(self, x0:int, y0:int, x1:int, y1:int) -> np.ndarray:
+        '''读取一个矩形区域的数据,返回一个新的稠密数组'''
+
+        out = np.zeros((x1 - x0, y1 - y0), dtype=self.dtype)
+        if out.size == 0:
+            return out
+        for key in self._overlapped(x0, y0, x1, y1):
+            chunk = self.chunks.get(key)
+            if chunk is None:
+                continue
+            cx0, cy0, cx1, cy1 = self.chunkrect(key)
+            ax0, ay0 = max(x0, cx0), max(y0, cy0)
+            ax1, ay1 = min(x1, cx1), min(y1, cy1)
+            out[ax0 - x0:ax1 - x0, ay0 - y0:ay1 - y0] = chunk[ax0 - cx0:ax1 - cx0, ay0 - cy0:ay1 - cy0]
+        return out
+
+    def write_block(self, x0:int, y0:int, block) -> None:
+        '''将一个矩形区域的数据写入到层级中,block可以是数组或者单个数值'''
+
+        block = np.asarray(block, dtype=self.dtype)
+        if block.ndim != 2:
+            raise ValueError("write_block需要一个二维数组")
+        w, h = block.shape
+        x1, y1 = x0 + w, y0 + h
+        if w == 0 or h == 0:
+            return
+        if x0 < 0 or y0 < 0 or x1 > self.width or y1 > self.height:
+            raise IndexError(f"区域({x0},{y0},{x1},{y1})超出了层级的范围{self.shape}")
+        for key in self._overlapped(x0, y0, x1, y1):
+            cx0, cy0, cx1, cy1 = self.chunkrect(key)
+            ax0, ay0 = max(x0, cx0), max(y0, cy0)
+            ax1, ay1 = min(x1, cx1), min(y1, cy1)
+            part = block[ax0 - x0:ax1 - x0, ay0 - y0:ay1 - y0]
+            chunk = self._writable(key)
+            if chunk is None:
+                if not part.any():
+                    continue
+                chunk = self._allocate(key)
+            target = chunk[ax0 - cx0:ax1 - cx0, ay0 - cy0:ay1 - cy0]
+            if self._usage is not None:
+                self._account(key, target, -1)
+                self._account(key, part, 1)
+            target[...] = part
+            count = int(np.count_nonzero(chunk))
+            if count == 0:
+                self._release(key)
+            else:
+                self.counts[key] = count
+
+    def __getitem__(self, index):
+        x, y = index
+        if isinstance(x, slice) and isinstance(y, slice):
+            return self.read_block(*self._clip(x, y))
+        return self.get(int(x), int(y))
+
+    def __setitem__(self, index, value):
+        x, y = index
+        if isinstance(x, slice) and isinstance(y, slice):
+            x0, y0, x1, y1 = self._clip(x, y)
+            block = np.broadcast_to(np.asarray(value, dtype=self.dtype), (x1 - x0, y1 - y0))
+            self.write_block(x0, y0, block)
+        else:
+            self.set(int(x), int(y), int(value))
+
+    def put(self, xs:np.ndarray, ys:np.ndarray, values) -> None:
+        '''将一组数据批量写入到层级中,按照分块分组之后每个分块只进行一次花式索引赋值'''
+
+        xs = np.asarray(xs, dtype=np.int64)
+        ys = np.asarray(ys, dtype=np.int64)
+        values = np.broadcast_to(np.asarray(values, dtype=self.dtype), xs.shape)
+        if xs.size == 0:
+            return
+        if xs.min() < 0 or ys.min() < 0 or xs.max() >= self.width or ys.max() >= self.height:
+            raise IndexError(f"存在超出层级范围{self.shape}的位置")
+        size = self.chunksize
+        cxs, cys = xs // size, ys // size
+        keys = cxs * ((self.height + size - 1) // size) + cys
+        order = np.argsort(keys, kind="stable")
+        keys = keys[order]
+        bounds = np.flatnonzero(np.diff(keys)) + 1
+        for part in np.split(order, bounds):
+            key = int(cxs[part[0]]), int(cys[part[0]])
+            chunk = self._writable(key)
+            if chunk is None:
+                if not values[part].any():
+                    continue
+                chunk = self._allocate(key)
+            lx, ly = xs[part] - key[0] * size, ys[part] - key[1] * size
+            if self._usage is None:
+                chunk[lx, ly] = values[part]
+            else:
+                # DOC> 同一个格子可能被写入多次,只统计每个格子写入前后的数值
+                seen = np.zeros(size * size, dtype=bool)
+                seen[lx * size + ly] = True
+                ux, uy = np.divmod(np.flatnonzero(seen), size)
+                self._account(key, chunk[ux, uy], -1)
+                chunk[lx, ly] = values[part]
+                self._account(key, chunk[ux, uy], 1)
+            count = int(np.count_nonzero(chunk))
+            if count == 0:
+                self._release(key)
+            else:
+                self.counts[key] = count
+
+    def take(self, xs:np.ndarray, ys:np.ndarray) -> np.ndarray:
+        '''批量读取一组位置的数据,与put相对应'''
+
+        xs = np.asarray(xs, dtype=np.int64)
+        ys = np.asarray(ys, dtype=np.int64)
+        out = np.zeros(xs.shape, dtype=self.dtype)
+        if xs.size == 0:
+            return out
+        if xs.min() < 0 or ys.min() < 0 or xs.max() >= self.width or ys.max() >= self.height:
+            raise IndexError(f"存在超出层级范围{self.shape}的位置")
+        size = self.chunksize
+        cxs, cys = xs // size, ys // size
+        keys = cxs * ((self.height + size - 1) // size) + cys
+        order = np.argsort(keys, kind="stable")
+        bounds = np.flatnonzero(np.diff(keys[order])) + 1
+        for part in np.split(order, bounds):
+            key = int(cxs[part[0]]), int(cys[part[0]])
+            chunk = self.chunks.get(key)
+            if chunk is not None:
+                out[part] = chunk[xs[part] - key[0] * size, ys[part] - key[1] * size]
+        return out
+
+    def _batches(self, batch=4096):
+        '''按照分块坐标排序后分批遍历所有的分块,返回(分块坐标数组(n, 2), 分块数组(n, chunksize, chunksize)),
+        分批是为了限制堆叠分块时额外占用的内存'''
+
+        keys = sorted(self.chunks)
+        for i in range(0, len(keys), batch):
+            part = keys[i:i + batch]
+            yield np.array(part, dtype=np.int64).reshape(-1, 2), np.stack([self.chunks[key] for key in part])
+
+    def _collect(self, test) -> tuple:
+        '''收集所有满足test(分块数组)的格子,返回(xs, ys, values)'''
+
+        xs, ys, vs = [], [], []
+        size = self.chunksize
+        for keys, stacked in self._batches():
+            k, lx, ly = np.nonzero(test(stacked))
+            xs.append(keys[k, 0] * size + lx)
+            ys.append(keys[k, 1] * size + ly)
+            vs.append(stacked[k, lx, ly])
+        if len(xs) == 0:
+            empty = np.zeros(0, dtype=np.int64)
+            return empty, empty, np.zeros(0, dtype=self.dtype)
+        return np.concatenate(xs), np.concatenate(ys), np.concatenate(vs)
+
+    def nonzero(self) -> tuple:
+        '''返回所有非零数据的坐标和数值(xs, ys, values),按照分块坐标排序,分块内以x优先的顺序排列'''
+
+        return self._collect(lambda stacked: stacked)
+
+    def cells(self) -> np.ndarray:
+        '''返回所有非零数据组成的(N, 3)数组,每一行为[x, y, value]'''
+
+        xs, ys, values = self.nonzero()
+        return np.stack((xs, ys, values.astype(np.int64)), axis=1)
+
+    def iter_cells(self, batch=256):
+        '''分批返回[[x, y, value], ...]形式的数据,每一批最多包含batch个分块的数据'''
+
+        size = self.chunksize
+        for keys, stacked in self._batches(batch):
+            k, lx, ly = np.nonzero(stacked)
+            cells = np.stack((keys[k, 0] * size + lx, keys[k, 1] * size + ly, stacked[k, lx, ly].astype(np.int64)), axis=1)
+            with _gc_paused():
+                yield cells.tolist()
+
+    def tolist(self) -> list:
+        '''返回[[x, y, value], ...]形式的数据'''
+
+        cells = self.cells()
+        with _gc_paused():
+            return cells.tolist()
+
+    @staticmethod
+    def from_cells(size:tuple, cells, chunksize=CHUNK_SIZE) -> "ChunkedTilemap":
+        '''根据[[x, y, value], ...]形式的数据创建一个分块存储'''
+
+        storage = ChunkedTilemap(size, chunksize)
+        if isinstance(cells, np.ndarray):
+            cells = cells.astype(np.int64, copy=False).reshape(-1, 3)
+        else:
+            # DOC> 直接从嵌套列表中逐个读取数值,比np.asarray解析嵌套列表更快
+            cells = np.fromiter(itertools.chain.from_iterable(cells), dtype=np.int64).reshape(-1, 3)
+        storage.put(cells[:, 0], cells[:, 1], cells[:, 2])
+        return storage
+
+    def pack(self) -> dict:
+        '''将所有分块打包为紧凑的数组{"keys":(n, 2)分块坐标, "data":(n, chunksize, chunksize)分块数据},
+        数据使用能够容纳最大瓦片id的最小整数类型存储'''
+
+        keys = sorted(self.chunks)
+        size = self.chunksize
+        if len(keys) == 0:
+            return {"keys":np.zeros((0, 2), dtype=np.int32), "data":np.zeros((0, size, size), dtype=np.uint8)}
+        data = np.stack([self.chunks[key] for key in keys])
+        top = int(data.max())
+        dtype = np.uint8 if top < 1 << 8 else np.uint16 if top < 1 << 16 else self.dtype
+        return {"keys":np.array(keys, dtype=np.int32), "data":data.astype(dtype)}
+
+    @staticmethod
+    def unpack(size:tuple, packed:dict, chunksize=CHUNK_SIZE) -> "ChunkedTilemap":
+        '''根据pack的结果恢复分块存储,所有分块共享同一块连续的内存'''
+
+        storage = ChunkedTilemap(size, chunksize)
+        data = packed["data"].astype(storage.dtype)
+        counts = np.count_nonzero(data, axis=(1, 2))
+        for key, chunk, count in zip(map(tuple, packed["keys"].tolist()), data, counts.tolist()):
+            if count > 0:
+                storage.chunks[key] = chunk
+                storage.counts[key] = count
+        return storage
+
+    def where(self, value:int) -> tuple:
+        '''返回所有数据等于value的坐标(xs, ys),value不能为0,只会访问反向索引中包含value的分块'''
+
+        xs, ys = [np.zeros(0, dtype=np.int64)], [np.zeros(0, dtype=np.int64)]
+        size = self.chunksize
+        for key in sorted(self.usage.get(value, {})):
+            lx, ly = np.nonzero(self.chunks[key] == value)
+            xs.append(lx + key[0] * size)
+            ys.append(ly + key[1] * size)
+        return np.concatenate(xs), np.concatenate(ys)
+
+    def count_nonzero(self) -> int:
+        return sum(self.counts.values())
+
+    def to_dense(self) -> np.ndarray:
+        '''将整个层级转换为稠密数组,仅用于调试或小尺寸房间'''
+
+        return self.read_block(0, 0, self.width, self.height)
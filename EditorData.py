@@ -1,4 +1,5 @@
 # 地图编辑器数据模块
+# 数据本身由EditorModel中不依赖Qt的类负责,这里的类只是在其基础上增加图像、图集、缩略图与信号的Qt适配层
 
 from PyQt5.QtWidgets import *
 from PyQt5.QtCore import *
@@ -10,179 +11,74 @@ import numpy as np
 
 
 from EditorRoomBuffer import *
+from EditorModel import Tile as TileData, TileLib as TileLibData, TileRegistry, Project
+from EditorTileAtlas import TileAtlas
+from EditorTileLoader import TileLoader
+from EditorThumbnail import ThumbnailCache
 
 
 
 # WARN> 关于瓦片
-class Tile:
-    '''单块瓦片数据'''
+class Tile(TileData):
+    '''单块瓦片数据,瓦片的图像在第一次被访问时才会从文件中读取'''
 
-    def __init__(self, tileId:int, tileName:str, pixmap:QPixmap, filepath:str, refcount=1):
+    def __init__(self, tileId:int, tileName:str, filepath:str, refcount=1, pixmap:QPixmap=None):
         '''初始化单块瓦片数据'''
 
-        self.tileId = tileId
-        self.tileName = tileName
-        self.filepath = filepath
-        self.pixmap = pixmap
-        self.refcount = refcount
+        super().__init__(tileId, tileName, filepath, refcount)
+        self._pixmap = pixmap
 
-        # 编辑器认为瓦片可以直接作为笔刷来绘画
-        self.brushdata = np.array([[tileId]])
+    @property
+    def pixmap(self) -> QPixmap:
+        if self._pixmap is None:
+            self._pixmap = QPixmap(self.filepath)
+        return self._pixmap
+
+    @pixmap.setter
+    def pixmap(self, pixmap: QPixmap) -> None:
+        self._pixmap = pixmap
 
     @property
-    def json(self):
-        '''将该瓦片的数据转换为JSON结构'''
+    def render_info(self) -> tuple:
+        '''瓦片面板的渲染信息(标题, 图像, 缩略图缓存键, 源文件路径)'''
 
-        return {
-            "id":self.tileId,
-            "name":self.tileName,
-            "filepath":self.filepath,
-            "refcount":self.refcount
-        }
+        return self.tileName, self.pixmap, self.tileId, self.filepath
 
-class TileLib:
+class TileLib(TileLibData):
     '''描述一个瓦片库/一个瓦片库可以具有多个瓦片但每个瓦片只会有一个'''
 
-    def __init__(self, libid, name):
-        '''创建一个瓦片库'''
-
-        self.name = name
-        self.libid = libid
-        self.tiles = list()
-        self.tileIds = set()
-
-    def add(self, tile:Tile) -> bool:
-        '''增加瓦片数据'''
-
-        if tile.tileId in self.tileIds:
-            return False
-        self.tileIds.add(tile.tileId)
-        self.tiles.append(tile)
-        return True
-
-    def remove(self, index:int) -> Tile:
-        '''根据给定的索引来删除瓦片数据,并返回该瓦片'''
-
-        if index >= 0 and index < len(self.tiles):
-            tile = self.tiles[index]
-            tile.refcount -= 1
-            self.tiles.remove(tile)
-            self.tileIds.remove(tile.tileId)
-            return tile
-        return None
-
-    def clear_tiles(self):
-        '''所有的瓦片引用数减一,如果瓦片引用数为0,则准备删除该瓦片'''
-
-        output = list()
-        self.tileIds.clear()
-        for tile in self.tiles:
-            tile.refcount -= 1
-            if tile.refcount == 0:
-                output.append(tile)
-        return output
-
     @property
     def render_infos(self):
         '''获取需要渲染的数据'''
 
-        return [(_.tileName, _.pixmap) for _ in self.tiles]
+        return [_.render_info for _ in self.tiles]
+
+class TileManager(TileRegistry):
+    '''瓦片管理器,在TileRegistry的基础上维护瓦片图集、缩略图以及瓦片图像的后台加载'''
 
-class TileManager:
-    '''瓦片管理器'''
+    tileType = Tile
+    libType = TileLib
 
     def __init__(self, tilesize=(12, 12)):
         '''管理所有的瓦片'''
 
+        super().__init__(tilesize)
         TileManager.instance = self
-        self.counter = utils.Counter(entry=1)
         self.tilesize = QSize(*tilesize)
 
-        # DOC> 瓦片名 > 瓦片实体
-        self.tiles = dict()
-
-        self.libs = list()
-        self.libCounter = utils.Counter(entry=1)
-        self.currentlib = None
-        self.hasSaved = True
-
-    def findLib(self, name) -> tuple:
-        '''根据名称找到目标库'''
-
-        for i, lib in enumerate(self.libs):
-            if lib.name == name:
-                return i, lib
-        return -1, None
-
-    def indexLib(self, index:int) -> TileLib:
-        '''根据索引找到一个库'''
-
-        if index >= 0 and index < len(self.libs):
-            return self.libs[index]
-        return None
-
-    def set_current_lib(self, name:str) -> TileLib:
-        '''设置当前的瓦片库'''
-
-        index, lib = self.findLib(name)
-        if lib != None:
-            self.currentlib = lib
-            return self.currentlib
-        return None
-
-    def createLib(self):
-        '''新建一个瓦片的库/该库会成为当前被选中的库'''
-
-        libid = self.libCounter.next_id
-        name = f"新建库{libid}"
-        self.currentlib = TileLib(libid, name)
-        self.libs.append(self.currentlib)
-        return self.currentlib
+        # DOC> 所有瓦片的图集,房间渲染与导出时通过图集批量绘制瓦片
+        self.atlas = TileAtlas()
+        # DOC> 打开工程时在后台解码瓦片图像的加载器
+        self.loader = None
+        # DOC> 瓦片面板的缩略图缓存
+        self.thumbnails = ThumbnailCache()
 
-    def removeLib(self, index):
-        '''删除目标瓦片库'''
+    def _tile_added(self, tile: Tile) -> None:
+        self.atlas.add(tile.tileId, tile.pixmap)
 
-        lib = self.libs[index]
-        tiles = lib.clear_tiles()
-        self.libCounter.recycle(lib.libid)
-        self.libs.remove(lib)
-
-        for tile in tiles:
-            self.tiles.pop(tile.tileName)
-            self.counter.recycle(tile.tileId)
-
-    def removeTile(self, tile: Tile):
-        '''删除单块瓦片\n
-        检查是否有地图数据引用了这块瓦片,如果有则不予删除'''
-
-        # TODO> 检查是否有地图或者笔刷数据引用了这块瓦片
-        self.counter.recycle(tile.tileId)
-        self.tiles.pop(tile.tileName)
-        # self.tilesById.pop(tile.tileId)
-
-    def create(self, file:str):
-        '''根据给定的文件创建一个新的瓦片数据'''
-
-        if file is None or not os.path.exists(file):
-            return False
-        try:
-            name = utils.parseNameFromPath(file)
-            if name in self.tiles:
-                tile = self.tiles[name]
-                tile.refcount += 1
-                self.currentlib.add(tile)
-                return True
-            pixmap = QPixmap(file)
-            # DOC> 不限制瓦片的大小
-            # if pixmap.size() != self.tilesize:
-            #     return False
-            tile = Tile(self.counter.next_id, name, pixmap, file)
-            self.tiles.setdefault(tile.tileName, tile)
-            # self.tilesById.setdefault(tile.tileId, tile)
-            self.currentlib.add(tile)
-            return True
-        except:
-            return False
+    def _tile_removed(self, tile: Tile) -> None:
+        self.atlas.remove(tile.tileId)
+        self.thumbnails.discard(tile.tileId)
 
     def _import_tiles(self) -> list:
         '''导入一组瓦片'''
@@ -197,65 +93,43 @@ class TileManager:
                 failed_list.append(filename)
         return True, failed_list
 
-    @property
-    def json(self):
-        '''将所有的瓦片转换为一个JSON数据,它将以查找表的形式存在,通过瓦片Id查找瓦片名称,并且该数据还会记录自身的回收列表情况'''
-
-        tiles = {
-            "counter":self.counter.json,
-            "tiles":[v.json for v in self.tiles.values()]
-        }
-        _libs = dict()
-        for lib in self.libs:
-            _libs.setdefault(lib.name, {"tiles":[_.tileId for _ in lib.tiles],"libId":lib.libid})
-        return {
-            "tiles":tiles,
-            "libs":{
-                "counter":self.libCounter.json,
-                "libs":_libs
-            }
-        }
-
-    def load_json(self, obj: dict) -> int:
-        '''从json数据中恢复当前的tileManager'''
-
-        jsonTile = obj["tiles"]
-        missingCount = 0
-        self.counter.load_json(jsonTile["counter"])
-        namelut = dict()
-        for tileinfo in jsonTile["tiles"]:
-            try:
-                pixmap = QPixmap(tileinfo["filepath"])
-                tmp = Tile(tileinfo["id"], tileinfo["name"], pixmap, tileinfo["filepath"], tileinfo["refcount"])
-                self.tiles.setdefault(tmp.tileName, tmp)
-                namelut.setdefault(tmp.tileId, tmp.tileName)
-            except:
-                missingCount += 1
-
-        jsonLib = obj["libs"]
-        self.libCounter.load_json(jsonLib["counter"])
-        for name, lib in jsonLib["libs"].items():
-            tmp = TileLib(lib["libId"], name)
-            for tileId in lib["tiles"]:
-                tile = self.tiles.get(namelut[tileId])
-                if tile != None:
-                    tmp.add(tile)
-            self.libs.append(tmp)
-            self.currentlib = tmp
+    def load_json(self, obj: dict, wait=True) -> int:
+        '''从json数据中恢复当前的tileManager\n
+        瓦片图像在线程池中解码,瓦片对象会先以空的pixmap创建,图像可用之后由self.loader通知\n
+        wait为True时阻塞到所有瓦片加载完成并返回丢失的瓦片数量,否则立即返回已知的错误数量,
+        丢失的瓦片数量通过self.loader.finished信号给出'''
+
+        pending, missingCount = self._load_json(obj)
+        # DOC> 加载完成之前使用空的图像占位,避免访问图像时在主线程中同步读取文件
+        for tile in pending:
+            tile.pixmap = QPixmap()
+
+        if self.loader != None:
+            self.loader.cancel()
+        self.loader = TileLoader(self.atlas)
+        self.loader.start(pending)
+        if wait:
+            missingCount += self.loader.wait()
         return missingCount
 
+    def stop_loading(self):
+        '''停止后台的瓦片加载'''
 
-class ProjectData(QObject):
+        if self.loader != None:
+            self.loader.cancel()
+
+
+class ProjectData(QObject, Project):
     '''工程文件
-    1.管理编辑器所有的数据信息'''
+    1.管理编辑器所有的数据信息,数据由Project负责,这里只增加当前瓦片与信号'''
 
     @staticmethod
-    def load_fromjson(data:dict):
-        '''从json文件中恢复所有的数据'''
+    def load_fromjson(data:dict, wait=True):
+        '''从json文件中恢复所有的数据,wait的含义与TileManager.load_json相同'''
 
         tilesize = tuple(data["tilesize"])
         project = ProjectData(tilesize)
-        missingCount = project.tileManager.load_json(data["tileManager"])
+        missingCount = project.tileManager.load_json(data["tileManager"], wait)
         return project, missingCount
 
     tileChoosed = pyqtSignal(Tile)
@@ -264,11 +138,8 @@ class ProjectData(QObject):
     def __init__(self, tilesize=(12, 12)):
         '''创建所有的数据单位'''
 
-        super().__init__(None)
-        self.tilesize = tilesize
-        self.tilew,self.tileh = tilesize
-        self.tileManager = TileManager(tilesize)
-        # self.dungeon = None
+        # DOC> QObject.__init__是协作式的,多余的关键字参数会沿着MRO传递给Project.__init__
+        super().__init__(tilesize=tilesize, tileManager=TileManager(tilesize))
 
         self.__current_tile = None
 
@@ -280,23 +151,29 @@ class ProjectData(QObject):
         self.tileChoosed.emit(self.__current_tile)
 
     def removetile(self, index:int) -> list:
-        '''当某个瓦片被删除时执行该函数,返回被删除瓦片所在库的渲染信息'''
+        '''当某个瓦片被删除时执行该函数,返回被删除瓦片所在库的渲染信息\n
+        瓦片只存在于当前库中并且仍然被地图引用时不予删除,返回None'''
 
         lib = self.tileManager.currentlib
-        tile = lib.remove(index)
-        if tile.refcount == 0:
+        removed, tile = self.remove_tile(lib, index)
+        if not removed:
+            return None
+        if tile != None:
             if tile is self.__current_tile:
                 self.__current_tile = None
-            self.tileManager.removeTile(tile)
             self.tileRemoved.emit(tile)
-            return lib.render_infos
+        return lib.render_infos
 
-    @property
-    def json(self):
-        return {
-            "tileManager":self.tileManager.json,
-            "tilesize":[self.tilew, self.tileh]
-        }
+    def removelib(self, index:int) -> bool:
+        '''删除一个瓦片库,被彻底删除的瓦片逐个发出tileRemoved信号\n
+        库中只存在于该库的瓦片仍然被地图引用时不予删除,返回False'''
+
+        removed, tiles = self.remove_lib(index)
+        for tile in tiles:
+            if tile is self.__current_tile:
+                self.__current_tile = None
+            self.tileRemoved.emit(tile)
+        return removed
 
     @property
     def currentTile(self):
@@ -305,4 +182,3 @@ class ProjectData(QObject):
     @property
     def hasSaved(self):
         return False
-
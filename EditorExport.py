@@ -0,0 +1,507 @@
+# 房间图像导出
+# 瓦片图像预先转换为预乘alpha的RGBA数组,每个层级中不超过格子尺寸的瓦片通过花式索引一次性取出并进行alpha混合,
+# 超出格子尺寸的瓦片以及被它们向右溢出的部分覆盖的格子按照与场景相同的顺序(从上往下,从左往右)逐个混合,
+# 整个过程只依赖层级的分块存储,不需要QGraphicsScene,可以在脚本中直接调用,
+# 保存时按照条带逐段合成并写入增量PNG编码器,整张图像不会同时存在于内存中
+# 没有安装PyQt5时瓦片文件通过read_png读取,合成与保存都不需要Qt
+
+try:
+    from PyQt5.QtGui import QImage
+except ImportError:
+    QImage = None
+
+import os
+import math
+import zlib
+import struct
+import numpy as np
+
+import utils
+
+
+
+def qimage_to_array(image: QImage) -> np.ndarray:
+    '''将QImage转换为预乘alpha的RGBA数组(h, w, 4)'''
+
+    image = image.convertToFormat(QImage.Format_RGBA8888_Premultiplied)
+    w, h = image.width(), image.height()
+    bits = image.constBits()
+    bits.setsize(image.byteCount())
+    return np.frombuffer(bits, dtype=np.uint8).reshape(h, image.bytesPerLine())[:, :w * 4].reshape(h, w, 4).copy()
+
+# DOC> 反预乘的查找表,下标为 alpha * 256 + 预乘的颜色值
+_UNPREMULTIPLY = np.minimum((np.arange(256)[None, :] * 255 + np.arange(256)[:, None] // 2) // np.maximum(np.arange(256), 1)[:, None], 255).astype(np.uint8).ravel()
+
+def unpremultiply(array: np.ndarray, band=16) -> np.ndarray:
+    '''将预乘alpha的RGBA数组原地转换为普通的RGBA数组并返回\n
+    每次只对band行查表,使得下标数组能够留在缓存中'''
+
+    for r in range(0, array.shape[0], band):
+        rows = array[r:r + band]
+        rows[..., :3] = _UNPREMULTIPLY[(rows[..., 3:4].astype(np.uint16) << 8) | rows[..., :3]]
+    return array
+
+def blend(dst: np.ndarray, src: np.ndarray) -> None:
+    '''预乘alpha的source-over混合,结果写回dst'''
+
+    inverse = 255 - src[..., 3:4].astype(np.uint16)
+    dst[...] = src + ((dst * inverse + 127) // 255).astype(np.uint8)
+
+
+class TileImages:
+    '''瓦片id > 预乘alpha的RGBA数组(h, w, 4)\n
+    不超过格子尺寸的瓦片以左下角对齐补齐为格子大小并合并为一个数组,合成时通过花式索引一次性取出'''
+
+    def __init__(self, tilesize:tuple):
+        self.tilesize = tuple(tilesize)
+        self.tilew, self.tileh = tilesize
+        self.images = dict()
+        self._stack = None
+        self._columns = None
+
+    def __contains__(self, tileId:int) -> bool:
+        return tileId in self.images
+
+    def add(self, tileId:int, image) -> bool:
+        '''添加一块瓦片的图像,image为QImage或者预乘alpha的RGBA数组'''
+
+        if QImage is not None and isinstance(image, QImage):
+            if image.isNull():
+                return False
+            image = qimage_to_array(image)
+        self.images[tileId] = image
+        self._stack = None
+        self._columns = None
+        return True
+
+    @staticmethod
+    def from_atlas(atlas, tilesize:tuple) -> "TileImages":
+        '''从瓦片图集中读取所有瓦片的图像,每张图集页只转换一次'''
+
+        tiles = TileImages(tilesize)
+        pages = [qimage_to_array(page.pixmap.toImage()) for page in atlas.pages]
+        for tileId, (index, rect) in atlas.rects.items():
+            x, y, w, h = (int(v) for v in rect.getRect())
+            tiles.add(tileId, pages[index][y:y + h, x:x + w].copy())
+        return tiles
+
+    @staticmethod
+    def from_files(filepaths:dict, tilesize:tuple, useQt=True) -> "TileImages":
+        '''从瓦片文件中读取图像,filepaths为瓦片id > 文件路径,无法读取的文件被忽略
+        @param useQt 为False或者没有安装PyQt5时使用read_png读取,只支持PNG文件'''
+
+        tiles = TileImages(tilesize)
+        for tileId, filepath in filepaths.items():
+            if useQt and QImage is not None:
+                tiles.add(tileId, QImage(filepath))
+                continue
+            try:
+                tiles.add(tileId, read_png(filepath))
+            except (OSError, ValueError, zlib.error):
+                pass
+        return tiles
+
+    @staticmethod
+    def from_project(obj:dict, useQt=True, folder=None) -> "TileImages":
+        '''根据工程的JSON数据读取所有瓦片的图像
+        @param folder 瓦片文件为相对路径并且相对于当前目录不存在时,相对于该目录查找'''
+
+        filepaths = dict()
+        for tile in obj["tileManager"]["tiles"]["tiles"]:
+            filepath = tile["filepath"]
+            if folder != None and not os.path.isabs(filepath) and not os.path.exists(filepath):
+                filepath = os.path.join(folder, filepath)
+            filepaths[tile["id"]] = filepath
+        return TileImages.from_files(filepaths, tuple(obj["tilesize"]), useQt)
+
+    def reach(self, tileId:int) -> tuple:
+        '''瓦片向右和向上溢出的格子数'''
+
+        image = self.images.get(tileId)
+        if image is None:
+            return 0, 0
+        h, w = image.shape[:2]
+        return max(0, math.ceil((w - self.tilew) / self.tilew)), max(0, math.ceil((h - self.tileh) / self.tileh))
+
+    def margins(self, tileIds) -> tuple:
+        '''一组瓦片向右和向上溢出格子的最大距离(像素)'''
+
+        marginw, marginh = 0, 0
+        for tileId in tileIds:
+            image = self.images.get(tileId)
+            if image is not None:
+                marginw = max(marginw, image.shape[1] - self.tilew)
+                marginh = max(marginh, image.shape[0] - self.tileh)
+        return marginw, marginh
+
+    def stack(self) -> tuple:
+        '''返回(lookup, stack, opaque, reachx, reachy)\n
+        lookup[id]为瓦片在stack中的索引(0表示没有图像或者超出格子尺寸),stack为(n + 1, tileh, tilew, 4)的数组,
+        opaque[index]表示stack中的瓦片是否完全不透明(可以直接覆盖),
+        reachx[id], reachy[id]为瓦片向右和向上溢出的格子数'''
+
+        if self._stack is not None:
+            return self._stack
+        count = max(self.images, default=0) + 1
+        reachx = np.zeros(count, dtype=np.int32)
+        reachy = np.zeros(count, dtype=np.int32)
+        for tileId in self.images:
+            reachx[tileId], reachy[tileId] = self.reach(tileId)
+        lookup, stack = self._pad([tileId for tileId in self.images if reachx[tileId] == 0 and reachy[tileId] == 0], self.tileh, count)
+        opaque = (stack[..., 3] == 255).all(axis=(1, 2))
+        self._stack = (lookup, stack, opaque, reachx, reachy)
+        return self._stack
+
+    def columns(self, reachy:int) -> tuple:
+        '''返回(lookup, stack),包含所有不向右溢出并且向上溢出不超过reachy格的瓦片,
+        每块瓦片以左下角对齐补齐为(tileh * (reachy + 1), tilew),用于同一行中的瓦片一次性混合'''
+
+        if self._columns is not None and self._columns[0] == reachy:
+            return self._columns[1:]
+        count = max(self.images, default=0) + 1
+        tileIds = [tileId for tileId in self.images if self.reach(tileId)[0] == 0 and self.reach(tileId)[1] <= reachy]
+        self._columns = (reachy, *self._pad(tileIds, self.tileh * (reachy + 1), count))
+        return self._columns[1:]
+
+    def _pad(self, tileIds:list, height:int, count:int) -> tuple:
+        lookup = np.zeros(count, dtype=np.int32)
+        stack = np.zeros((len(tileIds) + 1, height, self.tilew, 4), dtype=np.uint8)
+        for index, tileId in enumerate(tileIds, 1):
+            image = self.images[tileId]
+            h, w = image.shape[:2]
+            stack[index, height - h:, :w] = image
+            lookup[tileId] = index
+        return lookup, stack
+
+
+class RoomCompositor:
+    '''将房间的一组层级合成为RGBA图像\n
+    图像的左上角为房间(区域)左上角向上偏移溢出的高度,图像的尺寸为房间(区域)尺寸加上瓦片向右和向上溢出的最大距离'''
+
+    def __init__(self, layers:list, size:tuple, tiles: TileImages, region=None):
+        '''@param layers 从下往上排列的层级(ChunkedTilemap)
+        @param size 房间尺寸(格子)
+        @param tiles 瓦片图像
+        @param region 只合成房间中的一个区域(x0, y0, x1, y1),不包含x1, y1,区域以外的格子视为空白,为None时合成整个房间'''
+
+        self.layers = layers
+        self.tiles = tiles
+        self.tilew, self.tileh = tiles.tilesize
+        x0, y0, x1, y1 = (0, 0, *size) if region is None else region
+        x0, y0, x1, y1 = max(x0, 0), max(y0, 0), min(x1, size[0]), min(y1, size[1])
+        if x0 >= x1 or y0 >= y1:
+            raise ValueError("导出区域与房间没有交集")
+        self.region = (x0, y0, x1, y1)
+        self.size = (x1 - x0, y1 - y0)
+
+        used = set()
+        for storage in layers:
+            used.update(self._used_ids(storage, tuple(size)))
+        self.marginw, self.marginh = tiles.margins(used)
+        self.reachx = max([tiles.reach(tileId)[0] for tileId in used] + [0])
+        self.reachy = max([tiles.reach(tileId)[1] for tileId in used] + [0])
+
+    def _used_ids(self, storage, size:tuple, band=512) -> list:
+        '''区域中使用到的瓦片id,合成整个房间时直接使用层级的使用索引'''
+
+        x0, y0, x1, y1 = self.region
+        if self.region == (0, 0, *size):
+            return storage.used_ids()
+        used = set()
+        for top in range(y0, y1, band):
+            used.update(np.unique(storage.read_block(x0, top, x1, min(top + band, y1))).tolist())
+        used.discard(0)
+        return list(used)
+
+    def _read(self, storage, x0:int, y0:int, x1:int, y1:int) -> np.ndarray:
+        '''读取区域坐标中的一个矩形,区域以外的格子为0'''
+
+        w, h = self.size
+        out = np.zeros((x1 - x0, y1 - y0), dtype=storage.dtype)
+        ax0, ay0, ax1, ay1 = max(x0, 0), max(y0, 0), min(x1, w), min(y1, h)
+        if ax0 < ax1 and ay0 < ay1:
+            ox, oy = self.region[:2]
+            out[ax0 - x0:ax1 - x0, ay0 - y0:ay1 - y0] = storage.read_block(ax0 + ox, ay0 + oy, ax1 + ox, ay1 + oy)
+        return out
+
+    @staticmethod
+    def from_room(room, tiles: TileImages, layers=None, region=None) -> "RoomCompositor":
+        '''@param room RoomBuffer
+        @param layers 需要合成的层级名,为None时合成所有层级
+        @param region 需要合成的区域,与RoomCompositor的region相同\n
+        被卸载的房间从打包数据临时恢复层级,房间本身保持卸载的状态'''
+
+        storages = room._storages()
+        names = [name for name in storages if layers is None or name in layers]
+        return RoomCompositor([storages[name] for name in names], room.size, tiles, region)
+
+    @property
+    def width(self) -> int:
+        return self.size[0] * self.tilew + self.marginw
+
+    @property
+    def height(self) -> int:
+        return self.size[1] * self.tileh + self.marginh
+
+    def render(self, left=0, top=0, right=None, bottom=None) -> np.ndarray:
+        '''合成图像中的一个矩形区域(像素,不包含right, bottom),返回预乘alpha的RGBA数组(h, w, 4)\n
+        区域外的瓦片溢出到区域中的部分同样会被绘制,因此可以分块合成同一张图像'''
+
+        right = self.width if right is None else right
+        bottom = self.height if bottom is None else bottom
+        tilew, tileh = self.tilew, self.tileh
+        height = self.size[1]
+
+        # DOC> 与格子对齐的画布,行号r从房间顶部往下计算(r = height - 1 - y),溢出区域的行号为负数
+        x0, x1 = left // tilew, -(-right // tilew)
+        r0, r1 = (top - self.marginh) // tileh, -(-(bottom - self.marginh) // tileh)
+        canvas = np.zeros(((r1 - r0) * tileh, (x1 - x0) * tilew, 4), dtype=np.uint8)
+        empty = True
+        for storage in self.layers:
+            # DOC> 额外读取左侧与下方的格子,这些格子中的瓦片可能溢出到画布中
+            block = self._read(storage, x0 - self.reachx, height - r1 - self.reachy, x1, height - r0)
+            if not block.any():
+                continue
+            self._composite(canvas, block[:, ::-1].T, empty)
+            empty = False
+
+        ox, oy = x0 * tilew, self.marginh + r0 * tileh
+        return canvas[top - oy:bottom - oy, left - ox:right - ox]
+
+    def _composite(self, canvas: np.ndarray, ids: np.ndarray, empty:bool) -> None:
+        '''将一个层级合成到画布中,ids为(行, 列)排列的瓦片id,比画布多出左侧reachx列与下方reachy行'''
+
+        lookup, stack, opaque, reachx, reachy = self.tiles.stack()
+        tilew, tileh = self.tilew, self.tileh
+        rows, cols = canvas.shape[0] // tileh, canvas.shape[1] // tilew
+        kx = self.reachx
+        ids = np.where(ids < len(lookup), ids, 0)
+
+        # DOC> 超出格子尺寸的瓦片以及被它们向右溢出覆盖的格子需要在普通的格子之后按照顺序绘制
+        rx = reachx[ids]
+        late = (rx > 0) | (reachy[ids] > 0)
+        for j in range(1, kx + 1):
+            late[:, j:] |= rx[:, :-j] >= j
+        late &= ids != 0
+
+        # DOC> 普通的格子: 完全不透明的瓦片直接覆盖,其余的瓦片取出对应的画布区域混合之后写回
+        index = lookup[ids[:rows, kx:]]
+        index[late[:rows, kx:]] = 0
+        cells = canvas.reshape(rows, tileh, cols, tilew, 4).transpose(0, 2, 1, 3, 4)
+        solid = (index != 0) if empty else opaque[index]
+        if empty and tilew < 16:
+            # DOC> 瓦片很小时按掩码逐格写入的开销很大,画布为空时可以直接整块写入(索引0为透明瓦片)
+            cells[...] = stack[index]
+        elif solid.any():
+            cells[solid] = stack[index[solid]]
+        translucent = (index != 0) & ~solid
+        if translucent.any():
+            dst = cells[translucent]
+            blend(dst, stack[index[translucent]])
+            cells[translucent] = dst
+
+        # DOC> 按照从上往下的顺序逐行绘制,没有向右溢出的行中瓦片互不重叠,一次性混合,否则逐个混合
+        rs, xs = np.nonzero(late)
+        if len(rs) == 0:
+            return
+        columns, column_stack = self.tiles.columns(self.reachy)
+        starts = np.flatnonzero(np.r_[True, rs[1:] != rs[:-1], True])
+        for a, b in zip(starts[:-1].tolist(), starts[1:].tolist()):
+            r, row = int(rs[a]), xs[a:b]
+            tileIds = ids[r, row]
+            if (rx[r, row] > 0).any() or not columns[tileIds].all():
+                for x in row.tolist():
+                    self._blend_tile(canvas, self.tiles.images[int(ids[r, x])], (x - kx) * tilew, (r + 1) * tileh)
+                continue
+            inside = (row >= kx) & (row < kx + cols)
+            height = column_stack.shape[1]
+            top = (r + 1) * tileh - height
+            y0, y1 = max(top, 0), min(top + height, canvas.shape[0])
+            if not inside.any() or y0 >= y1:
+                continue
+            strip = canvas[y0:y1].reshape(y1 - y0, cols, tilew, 4)
+            cx = row[inside] - kx
+            dst = strip[:, cx]
+            blend(dst, column_stack[columns[tileIds[inside]], y0 - top:y1 - top].transpose(1, 0, 2, 3))
+            strip[:, cx] = dst
+
+    @staticmethod
+    def _blend_tile(canvas: np.ndarray, image: np.ndarray, px:int, bottom:int) -> None:
+        '''将一块瓦片以左下角(px, bottom)对齐混合到画布中'''
+
+        h, w = canvas.shape[:2]
+        ih, iw = image.shape[:2]
+        py = bottom - ih
+        x0, y0, x1, y1 = max(px, 0), max(py, 0), min(px + iw, w), min(py + ih, h)
+        if x0 < x1 and y0 < y1:
+            blend(canvas[y0:y1, x0:x1], image[y0 - py:y1 - py, x0 - px:x1 - px])
+
+
+class PngWriter:
+    '''增量PNG编码器,图像按照从上往下的顺序逐段写入,内存占用只与每次写入的行数有关\n
+    每一行使用Up滤波(与上一行逐字节相减),像素风格的图像在纵向上重复较多,压缩效果明显好于不滤波'''
+
+    SIGNATURE = b"\x89PNG\r\n\x1a\n"
+
+    def __init__(self, file, width:int, height:int, compresslevel=6, chunksize=1 << 20):
+        '''@param file 以二进制方式打开的文件
+        @param width, height 图像尺寸
+        @param compresslevel zlib的压缩等级
+        @param chunksize 压缩数据积累到多少字节时写出一个IDAT块'''
+
+        if width <= 0 or height <= 0:
+            raise ValueError("PNG图像的尺寸必须大于0")
+        self.file = file
+        self.width, self.height = width, height
+        self.chunksize = chunksize
+        self.rows = 0
+        self.previous = np.zeros(width * 4, dtype=np.uint8)
+        self.compressor = zlib.compressobj(compresslevel)
+        self.pending = list()
+        self.pendingSize = 0
+
+        file.write(self.SIGNATURE)
+        # DOC> 8位RGBA,默认压缩方式与滤波方式,不交错
+        self._chunk(b"IHDR", struct.pack(">IIBBBBB", width, height, 8, 6, 0, 0, 0))
+
+    def _chunk(self, kind:bytes, data:bytes) -> None:
+        self.file.write(struct.pack(">I", len(data)))
+        self.file.write(kind)
+        self.file.write(data)
+        self.file.write(struct.pack(">I", zlib.crc32(data, zlib.crc32(kind)) & 0xffffffff))
+
+    def _emit(self, data:bytes, force=False) -> None:
+        if len(data) > 0:
+            self.pending.append(data)
+            self.pendingSize += len(data)
+        if self.pendingSize >= self.chunksize or (force and self.pendingSize > 0):
+            self._chunk(b"IDAT", b"".join(self.pending))
+            self.pending.clear()
+            self.pendingSize = 0
+
+    def write(self, rows: np.ndarray) -> None:
+        '''写入若干行,rows为非预乘alpha的RGBA数组(h, width, 4)'''
+
+        h = rows.shape[0]
+        if rows.shape[1:] != (self.width, 4):
+            raise ValueError("写入的行与图像宽度不一致")
+        if self.rows + h > self.height:
+            raise ValueError("写入的行数超过了图像高度")
+        flat = rows.reshape(h, self.width * 4)
+        data = np.empty((h, self.width * 4 + 1), dtype=np.uint8)
+        data[:, 0] = 2
+        np.subtract(flat[1:], flat[:-1], out=data[1:, 1:])
+        np.subtract(flat[0], self.previous, out=data[0, 1:])
+        self.previous = flat[-1].copy()
+        self.rows += h
+        self._emit(self.compressor.compress(data))
+
+    def close(self) -> None:
+        '''写入剩余的压缩数据与IEND块'''
+
+        if self.rows != self.height:
+            raise ValueError(f"图像只写入了{self.rows}行,需要{self.height}行")
+        self._emit(self.compressor.flush(), True)
+        self._chunk(b"IEND", b"")
+
+
+def _unfilter(raw:bytes, width:int, height:int, bpp:int) -> np.ndarray:
+    '''还原PNG的逐行滤波,返回(height, width * bpp)的数组,Sub与Up滤波按行向量化,Average与Paeth逐字节计算'''
+
+    stride = width * bpp
+    data = np.frombuffer(raw, dtype=np.uint8)[:height * (stride + 1)].reshape(height, stride + 1)
+    out = np.zeros((height, stride), dtype=np.uint8)
+    previous = np.zeros(stride, dtype=np.uint8)
+    for y in range(height):
+        kind, line = data[y, 0], data[y, 1:]
+        if kind == 0:
+            out[y] = line
+        elif kind == 1:
+            out[y] = np.cumsum(line.reshape(width, bpp), axis=0, dtype=np.uint8).ravel()
+        elif kind == 2:
+            out[y] = line + previous
+        elif kind in (3, 4):
+            cur, up = line.tolist(), previous.tolist()
+            for i in range(stride):
+                a = cur[i - bpp] if i >= bpp else 0
+                b = up[i]
+                if kind == 3:
+                    cur[i] = (cur[i] + (a + b) // 2) & 0xff
+                    continue
+                c = up[i - bpp] if i >= bpp else 0
+                pa, pb, pc = abs(b - c), abs(a - c), abs(a + b - 2 * c)
+                cur[i] = (cur[i] + (a if pa <= pb and pa <= pc else b if pb <= pc else c)) & 0xff
+            out[y] = cur
+        else:
+            raise ValueError(f"未知的PNG滤波类型:{kind}")
+        previous = out[y]
+    return out
+
+def read_png(filepath:str) -> np.ndarray:
+    '''不依赖Qt读取PNG文件,返回预乘alpha的RGBA数组(h, w, 4)\n
+    支持8位的灰度、RGB、调色板、灰度+alpha以及RGBA图像,不支持16位与隔行扫描的图像'''
+
+    with open(filepath, "rb") as f:
+        data = f.read()
+    if data[:8] != PngWriter.SIGNATURE:
+        raise ValueError(f"{filepath}不是PNG文件")
+    pos, header, palette, transparency, idat = 8, None, None, None, list()
+    while pos + 8 <= len(data):
+        length, kind = struct.unpack(">I4s", data[pos:pos + 8])
+        body = data[pos + 8:pos + 8 + length]
+        pos += length + 12
+        if kind == b"IHDR":
+            header = struct.unpack(">IIBBBBB", body)
+        elif kind == b"PLTE":
+            palette = np.frombuffer(body, dtype=np.uint8).reshape(-1, 3)
+        elif kind == b"tRNS":
+            transparency = body
+        elif kind == b"IDAT":
+            idat.append(body)
+        elif kind == b"IEND":
+            break
+    if header is None:
+        raise ValueError(f"{filepath}缺少IHDR")
+    width, height, depth, color, _, _, interlace = header
+    channels = {0:1, 2:3, 3:1, 4:2, 6:4}.get(color)
+    if depth != 8 or interlace != 0 or channels is None:
+        raise ValueError(f"{filepath}:只支持8位非隔行扫描的PNG图像")
+    pixels = _unfilter(zlib.decompress(b"".join(idat)), width, height, channels).reshape(height, width, channels)
+
+    image = np.empty((height, width, 4), dtype=np.uint8)
+    if color == 3:
+        if palette is None:
+            raise ValueError(f"{filepath}缺少PLTE")
+        alpha = np.full(len(palette), 255, dtype=np.uint8)
+        if transparency is not None:
+            alpha[:len(transparency)] = np.frombuffer(transparency, dtype=np.uint8)[:len(palette)]
+        image[..., :3] = palette[pixels[..., 0]]
+        image[..., 3] = alpha[pixels[..., 0]]
+    else:
+        gray = color in (0, 4)
+        image[..., :3] = pixels[..., :1] if gray else pixels[..., :3]
+        image[..., 3] = pixels[..., -1] if color in (4, 6) else 255
+        if transparency is not None and color in (0, 2):
+            # DOC> tRNS中的颜色为16位,8位图像只使用低字节
+            key = np.frombuffer(transparency, dtype=">u2").astype(np.uint8)
+            image[(pixels == key).all(axis=-1), 3] = 0
+
+    # DOC> 与QImage相同的预乘方式: round(c * a / 255)
+    alpha = image[..., 3:4].astype(np.uint16)
+    image[..., :3] = (image[..., :3] * alpha + 127) // 255
+    return image
+
+def export_image(compositor: RoomCompositor, filepath:str, strip=256, compresslevel=6, progress=None) -> None:
+    '''将房间合成为PNG图像并保存\n
+    按照strip像素高的条带逐段合成并写入PNG编码器,峰值内存只与一个条带的大小有关,与图像尺寸无关,
+    图像先写入临时文件,全部完成后才会替换目标文件
+    @param progress 每写入一个条带之后调用progress(已写入的行数, 总行数),在其中抛出异常可以中止导出'''
+
+    with utils.atomic_open(filepath, "wb") as file:
+        writer = PngWriter(file, compositor.width, compositor.height, compresslevel)
+        for top in range(0, compositor.height, strip):
+            bottom = min(top + strip, compositor.height)
+            writer.write(unpremultiply(compositor.render(0, top, compositor.width, bottom)))
+            if progress != None:
+                progress(bottom, compositor.height)
+        writer.close()
@@ -0,0 +1,201 @@
+# 编辑历史
+# 每一次操作被记录为一组差异补丁,每个补丁只覆盖一个层级中被修改的包围盒,
+# 修改比较密集时以包围盒内的两个稠密数组(修改前/修改后)存储,否则只存储被修改格子的索引与新旧数值,
+# 所有操作占用的内存总量受到预算限制,超出预算时最早的操作会被丢弃
+
+import numpy as np
+
+from EditorChunk import ChunkedTilemap
+
+
+class Patch:
+    '''一个层级的差异补丁'''
+
+    def __init__(self, layer:str, x0:int, y0:int, shape:tuple, old:np.ndarray, new:np.ndarray, index=None):
+        '''@param layer 层级名
+        @param x0, y0 包围盒左下角的坐标
+        @param shape 包围盒的尺寸(w, h)
+        @param old, new 稠密形式时为包围盒大小的二维数组,稀疏形式时为一维数组
+        @param index 稀疏形式时被修改格子在包围盒中的展开索引,稠密形式时为None'''
+
+        self.layer = layer
+        self.x0, self.y0 = x0, y0
+        self.shape = shape
+        self.old = old
+        self.new = new
+        self.index = index
+
+    @property
+    def rect(self) -> tuple:
+        '''包围盒(x0, y0, x1, y1),不包含x1, y1'''
+
+        return self.x0, self.y0, self.x0 + self.shape[0], self.y0 + self.shape[1]
+
+    @property
+    def nbytes(self) -> int:
+        size = self.old.nbytes + self.new.nbytes
+        return size if self.index is None else size + self.index.nbytes
+
+    def apply(self, storage: ChunkedTilemap, undo:bool) -> None:
+        '''将补丁写入层级,undo为True时写入修改前的数据'''
+
+        values = self.old if undo else self.new
+        if self.index is None:
+            storage.write_block(self.x0, self.y0, values)
+        else:
+            xs, ys = np.unravel_index(self.index, self.shape)
+            storage.put(xs + self.x0, ys + self.y0, values)
+
+    @staticmethod
+    def diff(layer:str, storage: ChunkedTilemap, xs:np.ndarray, ys:np.ndarray, old:np.ndarray, new:np.ndarray) -> "Patch":
+        '''根据按照时间顺序记录的一组写入操作生成补丁,storage为写入完成之后的层级\n
+        同一个格子被写入多次时,取第一次写入前的数值与最后一次写入的数值,最终没有变化的格子会被忽略'''
+
+        if len(xs) == 0:
+            return None
+        key = xs * storage.height + ys
+        _, first = np.unique(key, return_index=True)
+        _, last = np.unique(key[::-1], return_index=True)
+        last = len(key) - 1 - last
+        changed = old[first] != new[last]
+        if not changed.any():
+            return None
+        first, last = first[changed], last[changed]
+        xs, ys = xs[first], ys[first]
+        x0, y0 = int(xs.min()), int(ys.min())
+        shape = (int(xs.max()) - x0 + 1, int(ys.max()) - y0 + 1)
+        count, area = len(xs), shape[0] * shape[1]
+
+        # DOC> 稠密形式占用2*area个数值,稀疏形式占用3*count个数值
+        if 2 * area <= 3 * count:
+            after = storage.read_block(x0, y0, x0 + shape[0], y0 + shape[1])
+            before = after.copy()
+            before[xs - x0, ys - y0] = old[first]
+            return Patch(layer, x0, y0, shape, before, after)
+        index = np.ravel_multi_index((xs - x0, ys - y0), shape).astype(np.int32)
+        return Patch(layer, x0, y0, shape, old[first].astype(storage.dtype), new[last].astype(storage.dtype), index)
+
+
+class _Action:
+    '''一次操作,在操作进行时记录所有的写入,操作结束后合并为每个层级一个补丁'''
+
+    def __init__(self):
+        self.records = dict()
+        self.patches = list()
+
+    def record(self, layer:str, xs, ys, old, new):
+        self.records.setdefault(layer, list()).append((xs, ys, old, new))
+
+    def close(self, resolve) -> None:
+        for layer, records in self.records.items():
+            xs, ys, old, new = (np.concatenate([np.atleast_1d(np.asarray(r[i], dtype=np.int64)) for r in records]) for i in range(4))
+            patch = Patch.diff(layer, resolve(layer), xs, ys, old, new)
+            if patch != None:
+                self.patches.append(patch)
+        self.records = None
+
+    @property
+    def nbytes(self) -> int:
+        return sum(patch.nbytes for patch in self.patches)
+
+
+class History:
+    '''撤销/重做历史'''
+
+    def __init__(self, resolve, budget=64 * 1024 * 1024):
+        '''@param resolve 根据层级名返回对应ChunkedTilemap的函数
+        @param budget 所有历史记录最多占用的字节数'''
+
+        self.resolve = resolve
+        self.budget = budget
+        self.undoStack = list()
+        self.redoStack = list()
+        self.nbytes = 0
+        self._action = None
+        self._depth = 0
+
+    @property
+    def canUndo(self) -> bool:
+        return len(self.undoStack) > 0
+
+    @property
+    def canRedo(self) -> bool:
+        return len(self.redoStack) > 0
+
+    def begin(self) -> None:
+        '''开始一次操作,begin与end可以嵌套,只有最外层的操作会成为一条历史记录'''
+
+        if self._depth == 0:
+            self._action = _Action()
+        self._depth += 1
+
+    def end(self) -> None:
+        '''结束一次操作'''
+
+        if self._depth == 0:
+            return
+        self._depth -= 1
+        if self._depth > 0:
+            return
+        action, self._action = self._action, None
+        action.close(self.resolve)
+        if len(action.patches) == 0:
+            return
+        self.undoStack.append(action)
+        self.nbytes += action.nbytes
+        for dropped in self.redoStack:
+            self.nbytes -= dropped.nbytes
+        self.redoStack.clear()
+        self._evict()
+
+    def record(self, layer:str, xs, ys, old, new) -> None:
+        '''记录一组写入,xs, ys, old, new可以是数值或者一维数组,不在操作中时单独成为一条历史记录'''
+
+        if self._depth == 0:
+            self.begin()
+            self._action.record(layer, xs, ys, old, new)
+            self.end()
+        else:
+            self._action.record(layer, xs, ys, old, new)
+
+    def _evict(self) -> None:
+        '''超出预算时丢弃最早的历史记录,至少保留最近的一条'''
+
+        while self.nbytes > self.budget and len(self.undoStack) > 1:
+            self.nbytes -= self.undoStack.pop(0).nbytes
+
+    def undo(self) -> list:
+        '''撤销最近的一次操作,返回被写入的补丁列表'''
+
+        self.finish()
+        if not self.canUndo:
+            return []
+        action = self.undoStack.pop()
+        for patch in reversed(action.patches):
+            patch.apply(self.resolve(patch.layer), True)
+        self.redoStack.append(action)
+        return action.patches
+
+    def redo(self) -> list:
+        '''重做最近一次被撤销的操作,返回被写入的补丁列表'''
+
+        self.finish()
+        if not self.canRedo:
+            return []
+        action = self.redoStack.pop()
+        for patch in action.patches:
+            patch.apply(self.resolve(patch.layer), False)
+        self.undoStack.append(action)
+        return action.patches
+
+    def finish(self) -> None:
+        '''强制结束所有未结束的操作'''
+
+        while self._depth > 0:
+            self.end()
+
+    def clear(self) -> None:
+        self.finish()
+        self.undoStack.clear()
+        self.redoStack.clear()
+        self.nbytes = 0
@@ -0,0 +1,131 @@
+# 后台任务
+# 导出等耗时的操作在线程池中运行,任务开始之前在主线程中为房间创建写时复制的快照并把瓦片图像转换为NumPy数组,
+# 工作线程只访问快照与数组,不接触任何QObject,因此任务运行期间仍然可以继续编辑房间,
+# 工作线程将进度与结果放入队列,主线程定时取出并发出信号,与TileLoader的做法一致
+
+from PyQt5.QtCore import *
+
+import time
+import queue
+import traceback
+
+
+class JobCancelled(Exception):
+    '''任务被取消时由进度回调抛出,用于中止工作函数'''
+
+
+class _JobTask(QRunnable):
+    '''在工作线程中运行任务的工作函数'''
+
+    def __init__(self, job):
+        super().__init__()
+        self.setAutoDelete(False)
+        self.job = job
+
+    def run(self):
+        job = self.job
+        try:
+            if job.isCancelled:
+                raise JobCancelled()
+            job.work(job.report)
+        except JobCancelled:
+            job.events.put(("cancelled",))
+        except Exception as e:
+            traceback.print_exc()
+            job.events.put(("failed", f"{type(e).__name__}: {e}"))
+        else:
+            job.events.put(("finished",))
+
+
+class BackgroundJob(QObject):
+    '''一个后台任务,work(progress)在工作线程中运行\n
+    work需要周期性地调用progress(已完成的数量, 总数量),任务被取消之后progress会抛出JobCancelled'''
+
+    progress = pyqtSignal(int, int)
+    '''已完成的数量与总数量'''
+
+    finished = pyqtSignal(float)
+    '''任务完成,参数为耗时(秒)'''
+
+    cancelled = pyqtSignal()
+    '''任务被取消,工作函数已经退出'''
+
+    failed = pyqtSignal(str)
+    '''任务失败,参数为错误信息'''
+
+    def __init__(self, title:str, work, pool=None, interval=50):
+        '''@param title 任务名称,用于显示进度
+        @param work 工作函数,只能访问与主线程隔离的数据
+        @param interval 主线程检查任务进度的时间间隔(毫秒)'''
+
+        super().__init__(None)
+        self.title = title
+        self.work = work
+        self.pool = pool or QThreadPool.globalInstance()
+        self.events = queue.Queue()
+        self.task = _JobTask(self)
+        self._cancelRequested = False
+        self.done = False
+        self.started = None
+
+        self.timer = QTimer(self)
+        self.timer.setInterval(interval)
+        self.timer.timeout.connect(self._drain)
+
+    @property
+    def isCancelled(self) -> bool:
+        return self._cancelRequested
+
+    def start(self) -> None:
+        self.started = time.perf_counter()
+        self.pool.start(self.task)
+        self.timer.start()
+
+    def cancel(self) -> None:
+        '''请求取消任务,工作函数在下一次报告进度时退出'''
+
+        self._cancelRequested = True
+
+    def report(self, done:int, total:int) -> None:
+        '''工作线程中的进度回调,只保留最新的进度,由主线程定时取出'''
+
+        if self._cancelRequested:
+            raise JobCancelled()
+        self.events.put(("progress", done, total))
+
+    def _drain(self) -> None:
+        '''定时回调,在主线程中处理工作线程发出的事件,进度只发出最新的一次'''
+
+        latest = None
+        while True:
+            try:
+                event = self.events.get_nowait()
+            except queue.Empty:
+                break
+            if event[0] == "progress":
+                latest = event
+            else:
+                if latest != None and event[0] == "finished":
+                    self.progress.emit(latest[1], latest[2])
+                self._finish(event)
+                return
+        if latest != None and not self._cancelRequested:
+            self.progress.emit(latest[1], latest[2])
+
+    def _finish(self, event:tuple) -> None:
+        self.timer.stop()
+        self.done = True
+        if event[0] == "finished":
+            self.finished.emit(time.perf_counter() - self.started)
+        elif event[0] == "cancelled":
+            self.cancelled.emit()
+        else:
+            self.failed.emit(event[1])
+
+    def wait(self) -> None:
+        '''阻塞直到任务结束并在当前线程中发出结束信号,用于退出程序或者脚本中'''
+
+        while not self.done:
+            event = self.events.get()
+            if event[0] != "progress":
+                self._finish(event)
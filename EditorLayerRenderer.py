@@ -0,0 +1,190 @@
+# 层级渲染器
+# 以分块为单位渲染层级,每个已分配的分块只对应一个场景Item,分块的绘制结果由Qt缓存,
+# 当分块中的瓦片发生变化时只重绘被修改的格子
+
+from PyQt5.QtWidgets import *
+from PyQt5.QtCore import *
+from PyQt5.QtGui import *
+
+import numpy as np
+
+from EditorChunk import ChunkedTilemap
+from EditorTileAtlas import TileAtlas
+
+
+class ChunkItem(QGraphicsItem):
+    '''一个分块的渲染Item,绘制分块中所有的瓦片'''
+
+    def __init__(self, renderer, key:tuple):
+        super().__init__(renderer)
+        self.renderer = renderer
+        self.key = key
+        self.setFlag(QGraphicsItem.ItemUsesExtendedStyleOption, True)
+        self.setZValue(-key[1])
+        self.relocate()
+        self.applyCacheMode(renderer.scene())
+
+    def applyCacheMode(self, scene):
+        '''使用场景的缓存模式(由视图的渲染配置决定)'''
+
+        self.setCacheMode(getattr(scene, "itemCacheMode", QGraphicsItem.DeviceCoordinateCache))
+
+    def itemChange(self, change, value):
+        if change == QGraphicsItem.ItemSceneHasChanged and value is not None:
+            self.applyCacheMode(value)
+        return super().itemChange(change, value)
+
+    def relocate(self):
+        '''根据分块坐标与瓦片溢出的边距重新计算Item的位置'''
+
+        self.prepareGeometryChange()
+        self.setPos(self.renderer.chunkScenePos(self.key))
+
+    def boundingRect(self) -> QRectF:
+        return self.renderer.chunkRect
+
+    def paint(self, painter: QPainter, option: QStyleOptionGraphicsItem, widget=None):
+        r = self.renderer
+        chunk = r.storage.chunks.get(self.key)
+        if chunk is None:
+            return
+        exposed = option.exposedRect
+        size = r.chunksize
+
+        # DOC> 根据暴露的区域计算需要重绘的格子范围,分块的行号从上往下计算
+        x0 = max(0, int((exposed.left() - r.marginw) // r.tilew))
+        x1 = min(size, int(exposed.right() // r.tilew) + 1)
+        row0 = max(0, int((exposed.top() - r.marginh) // r.tileh))
+        row1 = min(size, int(exposed.bottom() // r.tileh) + 1)
+        if x0 >= x1 or row0 >= row1:
+            return
+        ly0, ly1 = size - row1, size - row0
+        lx, ly = np.nonzero(chunk[x0:x1, ly0:ly1])
+        if len(lx) == 0:
+            return
+        lx += x0
+        ly += ly0
+        order = np.lexsort((lx, -ly))
+        r.paintCells(painter, lx[order], ly[order], chunk[lx[order], ly[order]])
+
+
+class LayerRenderer(QGraphicsItem):
+    '''层级渲染器,管理一个层级所有分块的渲染Item\n
+    自身不绘制任何内容,只作为所有分块Item的父节点,因此可以直接用于控制层级的可见性与层级顺序'''
+
+    def __init__(self, storage: ChunkedTilemap, tilesize:tuple, origin:QPointF, atlas: TileAtlas):
+        '''@param storage 层级的分块存储
+        @param tilesize 瓦片尺寸
+        @param origin 房间坐标(0, 0)的格子左上角的场景坐标
+        @param atlas 瓦片图集'''
+
+        super().__init__(None)
+        self.setFlag(QGraphicsItem.ItemHasNoContents, True)
+        self.storage = storage
+        self.chunksize = storage.chunksize
+        self.tilew, self.tileh = tilesize
+        self.origin = QPointF(origin)
+        self.atlas = atlas
+        self.marginw, self.marginh = 0, 0
+        self.chunkRect = QRectF()
+        self.items = dict()
+        self.dirty = dict()
+        self._updateChunkRect()
+
+    def boundingRect(self) -> QRectF:
+        return QRectF()
+
+    def paint(self, painter, option, widget=None):
+        pass
+
+    def _updateChunkRect(self):
+        size = self.chunksize
+        self.chunkRect = QRectF(0, 0, size * self.tilew + self.marginw, size * self.tileh + self.marginh)
+
+    def chunkScenePos(self, key:tuple) -> QPointF:
+        '''分块Item左上角的场景坐标'''
+
+        size = self.chunksize
+        top = key[1] * size + size - 1
+        return self.origin + QPointF(key[0] * size * self.tilew, -top * self.tileh - self.marginh)
+
+    def setMargin(self, marginw:int, marginh:int):
+        '''设置瓦片向右和向上溢出格子的最大距离,所有分块需要重新绘制'''
+
+        if (marginw, marginh) == (self.marginw, self.marginh):
+            return
+        self.marginw, self.marginh = marginw, marginh
+        self._updateChunkRect()
+        for item in self.items.values():
+            item.relocate()
+            item.update()
+
+    def paintCells(self, painter: QPainter, lx:np.ndarray, ly:np.ndarray, tileIds:np.ndarray):
+        '''在分块的坐标系中绘制一组格子,格子需要按照从上到下从左到右的顺序排列'''
+
+        bottoms = self.marginh + (self.chunksize - ly) * self.tileh
+        self.atlas.paint(painter, (lx * self.tilew).tolist(), bottoms.tolist(), tileIds.tolist())
+
+    def markDirty(self, x:int, y:int):
+        '''标记一个格子需要重绘'''
+
+        self.markRect(x, y, x + 1, y + 1)
+
+    def markRect(self, x0:int, y0:int, x1:int, y1:int):
+        '''标记一个矩形区域(不包含x1, y1)需要重绘'''
+
+        if x1 <= x0 or y1 <= y0:
+            return
+        size = self.chunksize
+        for cx in range(x0 // size, (x1 - 1) // size + 1):
+            for cy in range(y0 // size, (y1 - 1) // size + 1):
+                lx0, ly0 = max(x0 - cx * size, 0), max(y0 - cy * size, 0)
+                lx1, ly1 = min(x1 - cx * size, size), min(y1 - cy * size, size)
+                cell = QRectF(lx0 * self.tilew, (size - ly1) * self.tileh, (lx1 - lx0) * self.tilew + self.marginw, (ly1 - ly0) * self.tileh + self.marginh)
+                rect = self.dirty.get((cx, cy))
+                self.dirty[(cx, cy)] = cell if rect is None else rect.united(cell)
+
+    def markCells(self, xs:np.ndarray, ys:np.ndarray):
+        '''标记一组格子需要重绘,每个分块只标记其中被修改格子的包围盒'''
+
+        if len(xs) == 0:
+            return
+        size = self.chunksize
+        xs, ys = np.asarray(xs), np.asarray(ys)
+        keys = (xs // size) * (self.storage.height // size + 1) + ys // size
+        order = np.argsort(keys, kind="stable")
+        keys, xs, ys = keys[order], xs[order], ys[order]
+        starts = np.flatnonzero(np.r_[True, keys[1:] != keys[:-1]])
+        x0s, x1s = np.minimum.reduceat(xs, starts), np.maximum.reduceat(xs, starts) + 1
+        y0s, y1s = np.minimum.reduceat(ys, starts), np.maximum.reduceat(ys, starts) + 1
+        for rect in zip(x0s.tolist(), y0s.tolist(), x1s.tolist(), y1s.tolist()):
+            self.markRect(*rect)
+
+    def markChunks(self, keys):
+        '''标记一组分块需要整块重绘'''
+
+        for key in keys:
+            self.dirty[key] = self.chunkRect
+
+    def markAll(self):
+        '''标记所有分块需要重绘'''
+
+        for key in set(self.items) | set(self.storage.chunks):
+            self.dirty[key] = self.chunkRect
+
+    def flush(self):
+        '''重绘所有被标记的分块,创建新分配分块的Item并移除已经被回收分块的Item'''
+
+        for key, rect in self.dirty.items():
+            item = self.items.get(key)
+            if key in self.storage.chunks:
+                if item is None:
+                    self.items[key] = ChunkItem(self, key)
+                else:
+                    item.update(rect)
+            elif item is not None:
+                self.items.pop(key)
+                item.setParentItem(None)
+                if item.scene() is not None:
+                    item.scene().removeItem(item)
+        self.dirty.clear()
@@ -10,10 +10,16 @@ from Euclid.EuclidGraphicsView import *
 from Editor import *
 from EditorData import ProjectData, Tile
 from EditorRoomBuffer import RoomDrawingBuffer
+from EditorModel import RoomBuffer, save_room_file
+from EditorBrush import Brush
+from EditorRoomManager import RoomManager, RoomEntry, room_scenerect
+from EditorExport import TileImages, RoomCompositor, export_image
+from EditorJobs import BackgroundJob
 from EditorTools import *
 
 import qtutils
-import utils
+import EditorRoomFile
+import numpy as np
 
 class RoomCreatorHelper(EuclidWindow):
     '''房间创建器辅助工具'''
@@ -63,6 +69,9 @@ class EditorMapWindow(EuclidWindow):
     '''用于编辑单个房间\n
     根据层级管理原则,任何被MapWindow创建的单位都由MapWindow来负责,不允许下级对象越界访问MapWindow的上级对象'''
 
+    brushCreated = pyqtSignal(object)
+    '''从选框中创建了一个新的笔刷(EditorBrush.Brush)'''
+
     def __init__(self, parent=None):
         super().__init__(parent=parent, title="编辑器")
         #DOC> 创建提示符
@@ -71,6 +80,7 @@ class EditorMapWindow(EuclidWindow):
         self.btn_pen = EuclidButton(text="铅笔", callback=lambda:self.switch_tool(self.pentool))
         self.btn_eraser = EuclidButton(text="橡皮", callback=lambda:self.switch_tool(self.erasertool))
         self.btn_marquee = EuclidButton(text="选框", callback=lambda:self.switch_tool(self.marqueetool))
+        self.btn_fill = EuclidButton(text="填充", callback=lambda:self.switch_tool(self.filltool))
         
         #DOC> 创建GraphicsView和GraphicsScene
         self.view = EditorView()
@@ -79,6 +89,13 @@ class EditorMapWindow(EuclidWindow):
         self.view.onRelease.connect(self.onRelease)
         self.view.onLeave.connect(self.onLeave)
         self.view.onEnter.connect(self.onEnter)
+        self.view.viewportChanged.connect(self.on_view_viewportChanged)
+
+        # DOC> 视口变化之后延迟更新需要显示的房间,连续滚动时只更新一次
+        self.viewportTimer = QTimer(self)
+        self.viewportTimer.setSingleShot(True)
+        self.viewportTimer.setInterval(30)
+        self.viewportTimer.timeout.connect(self.update_viewport)
 
         #DOC> 创建LayerList和Button
         self.layerList = EditorListBox()
@@ -87,20 +104,29 @@ class EditorMapWindow(EuclidWindow):
         self.btn_createroom = EuclidButton(text="新建房间", callback=self.trycreateroom)
         self.btn_exportdata = EuclidButton(text="导出地图数据", callback=self.export_current_room)
         self.btn_exportimage = EuclidButton(text="导出地图图片", callback=self.export_room_image)
+        self.btn_cancelexport = EuclidButton(text="取消导出", callback=self.cancel_jobs)
+
+        # DOC> 导出任务在独立的线程池中依次运行,不占用载入瓦片的全局线程池
+        self.jobPool = QThreadPool(self)
+        self.jobPool.setMaxThreadCount(1)
+        self.jobs = list()
         
         #DOC> 建立布局
         self.addh(self.message, 150, 20)
         self.addh(self.btn_pen, 50, 20)
         self.addh(self.btn_eraser, 50, 20)
         self.addh(self.btn_marquee, 50, 20)
+        self.addh(self.btn_fill, 50, 20)
         self.addv_calch(self.layerList, 80, (1.0, -60))
         self.addh_calc(self.view, (1.0, -90), (1.0, -60))
         self.addv(self.btn_createroom)
         self.addh(self.btn_exportimage)
         self.addh(self.btn_exportdata)
+        self.addh(self.btn_cancelexport)
 
         #DOC> 其他初始化设置
         self.disable()
+        self.btn_cancelexport.disable()
         self.tool = FakeTool()
         self.last_tool = FakeTool()
         self.pentool = None
@@ -110,8 +136,10 @@ class EditorMapWindow(EuclidWindow):
         self.emptyTool = None
         self.movetool = None
         self.marqueetool = None
+        self.filltool = None
         self.project = None
         self.roomBuffer = None
+        self.rooms = None
 
     def initproject(self, project: ProjectData):
         '''根据给定的工程文件来初始化GraphicsScene'''
@@ -124,6 +152,14 @@ class EditorMapWindow(EuclidWindow):
         )
         self.view.setScene(self.scene)
         self.create_tools(self.view, self.scene, project)
+        if self.rooms != None:
+            self.rooms.clear()
+        self.rooms = RoomManager(self.scene, project.tilesize, project.tileManager.atlas, self.helper)
+        self.roomBuffer = None
+        self.layerList.clear()
+        self.project.tileChoosed.connect(self.on_project_tileChoosed)
+        self.project.tileRemoved.connect(self.on_project_tileRemoved)
+        self.project.tileUsage = self.tile_usage
         self.enable()
 
     # WARN> 关于绘图工具
@@ -137,6 +173,7 @@ class EditorMapWindow(EuclidWindow):
         self.marqueetool = MarqueeTool(view, scene, self.helper)
         self.copytool = CopyTool(view, scene, self.helper)
         self.pickertool = TilePickerTool(view, scene, self.helper)
+        self.filltool = FillTool(view, scene, self.helper)
         self.movetool = MoveTool(view, scene, self.helper)
 
         # DOC> 房间创建器
@@ -147,6 +184,16 @@ class EditorMapWindow(EuclidWindow):
         EuclidWindow.setOnTop(self.roomhelper)
         self.roomhelper.hide()
         self.roomTool.onSizeChanged.connect(self.roomhelper.receive)
+
+        # DOC> 链接所有的槽函数|所有槽函数必须在MapWindow中定义
+        self.pentool.strokeMoved.connect(self.on_pentool_strokeMoved)
+        self.erasertool.strokeMoved.connect(self.on_erasertool_strokeMoved)
+        self.copytool.clicked.connect(self.on_copytool_clicked)
+        self.copytool.rightClicked.connect(self.on_copytool_rightClicked)
+        self.pickertool.clicked.connect(self.on_pickertool_clicked)
+        self.movetool.clicked.connect(self.on_movetool_clicked)
+        self.movetool.rightClicked.connect(self.on_movetool_rightClicked)
+        self.filltool.clicked.connect(self.on_filltool_clicked)
         
     def switch_tool(self, tool: ITool, ignore_type=False) -> bool:
         '''更换当前正在使用的工具
@@ -191,18 +238,8 @@ class EditorMapWindow(EuclidWindow):
         self.message.setText(self.tool.name)
 
     def trycreateroom(self):
-        '''尝试创建一个新的房间'''
+        '''尝试创建一个新的房间,已有的房间会保留在世界中'''
 
-        if self.roomBuffer != None:
-            if not self.roomBuffer.room.hasSaved:
-                button = qtutils.question_withcancel(None, "创建房间","当前房间未保存,是否保存数据?")
-                if button == QMessageBox.Ok:
-                    self.roomBuffer.save(self.project)
-                    self.roomBuffer = None
-                elif button == QMessageBox.No:
-                    self.roomBuffer.clear()
-                elif button == QMessageBox.Cancel:
-                    return
         self.btn_createroom.disable()
         self.usetool(self.roomTool)
         self.roomhelper.show()
@@ -220,40 +257,91 @@ class EditorMapWindow(EuclidWindow):
 
         #DOC> 检查数据是否有效
         if self.roomhelper.isRoomValid:
-            # 开始创建房间
-            self.roomBuffer = RoomDrawingBuffer(
-                self.project.tilesize,
-                self.roomhelper.roomRect,
-                self.roomhelper.roomtilesize,
-                self.roomhelper.roomtilepos,
-                self.view, 
-                self.scene, 
-                self.helper)
-            # DOC> 渲染层级信息
-            self.layerList.clear()
-            for name in self.roomBuffer.room.layers:
-                self.layerList.add(name)
-            self.layerList.clearSelection()
-            self.on_project_tileChoosed(self.project.currentTile)
-
-            # DOC> 链接所有的槽函数|所有槽函数必须在MapWindow中定义
-            self.project.tileChoosed.connect(self.on_project_tileChoosed)
-            self.project.tileRemoved.connect(self.on_project_tileRemoved)
-
-            self.pentool.drawMoved.connect(self.on_pentool_drawMoved)
-            self.erasertool.drawMoved.connect(self.on_erasertool_drawMoved)
-            self.copytool.clicked.connect(self.on_copytool_clicked)
-            self.copytool.rightClicked.connect(self.on_copytool_rightClicked)
-            self.pickertool.clicked.connect(self.on_pickertool_clicked)
-            self.movetool.clicked.connect(self.on_movetool_clicked)
-            self.movetool.rightClicked.connect(self.on_movetool_rightClicked)
-
-            self.cancelcreateroom()
+            # DOC> 房间以框选范围的左下角为起点,不论框选时的拖动方向
+            size = self.roomhelper.roomtilesize
+            rect = self.roomhelper.roomRect.normalized()
+            pos = (int(rect.left() // self.project.tilew), int(round(rect.bottom() / self.project.tileh)))
+            if size[0] <= 0 or size[1] <= 0:
+                qtutils.information(None, "创建房间", "房间尺寸无效")
+            elif self.rooms.overlaps(pos, size):
+                qtutils.information(None, "创建房间", "房间与已有的房间重叠")
+            else:
+                self.activate_room(self.rooms.add(RoomBuffer(size, pos)))
+                self.cancelcreateroom()
         else:
             qtutils.information(None, "创建房间", "房间尺寸无效")
 
+    def load_room(self, room: RoomBuffer):
+        '''载入一个已有的房间数据,房间以左下角为起点放置在room.pos处'''
+
+        self.activate_room(self.rooms.add(room))
+        self.view.centerOn(room_scenerect(room.pos, room.size, self.project.tilesize).center())
+
+    def activate_room(self, entry: RoomEntry):
+        '''将世界中的一个房间设置为当前编辑的房间,之前编辑的房间交还给房间管理器显示\n
+        每个房间的撤销/重做历史在切换时被保留'''
+
+        if self.roomBuffer != None:
+            active = self.rooms.active
+            if active != None:
+                active.history = self.roomBuffer.history
+            self.roomBuffer.clear()
+            self.roomBuffer = None
+        room = self.rooms.setActive(entry)
+        roomBuffer = RoomDrawingBuffer(
+            self.project.tilesize,
+            room_scenerect(room.pos, room.size, self.project.tilesize),
+            room.size,
+            room.pos,
+            self.view,
+            self.scene,
+            self.helper,
+            self.project.tileManager.atlas,
+            self.project.tileManager.tilesById,
+            room)
+        if entry.history != None:
+            roomBuffer.history = entry.history
+        roomBuffer.register_used_tiles()
+        self.use_roombuffer(roomBuffer)
+        self.update_viewport()
+
+    def update_viewport(self):
+        '''根据视口的可见范围显示或者卸载房间'''
+
+        if self.rooms != None:
+            self.rooms.update_viewport(self.view.visibleSceneRect())
+
+    def refresh_tiles(self, tiles:list):
+        '''一组瓦片的图像加载完成之后重新登记到当前房间中'''
+
+        if self.rooms != None:
+            self.rooms.refresh(set(tile.tileId for tile in tiles))
+        if self.roomBuffer is None:
+            return
+        self.roomBuffer.register_tiles([(tile.tileId, tile.pixmap) for tile in tiles])
+        brush = self.roomBuffer.current_brush
+        if brush != None:
+            if any(brush.contains(tile.tileId) for tile in tiles):
+                self.choose_brush(brush)
+            return
+        current = self.project.currentTile
+        if current != None and current in tiles:
+            self.on_project_tileChoosed(current)
+
+    def use_roombuffer(self, roomBuffer: RoomDrawingBuffer):
+        '''将一个房间设置为当前编辑的房间'''
+
+        self.roomBuffer = roomBuffer
+        # DOC> 渲染层级信息
+        self.layerList.clear()
+        for name in self.roomBuffer.room.layers:
+            self.layerList.add(name)
+        self.layerList.clearSelection()
+        self.on_project_tileChoosed(self.project.currentTile)
+
     def export_room_image(self):
-        '''将当前房间作为一张图导出'''
+        '''将当前房间作为一张图导出,超出格子的瓦片溢出的部分同样会被导出\n
+        瓦片图像在主线程中转换为数组,房间数据使用快照,合成与编码在后台任务中进行'''
 
         if self.roomBuffer is None:
             qtutils.information(None, "导出地图图片", "当前没有建立房间")
@@ -261,37 +349,99 @@ class EditorMapWindow(EuclidWindow):
         filepath = qtutils.savefile("导出地图数据",filter="png文件(*.png)")
         if filepath is None:
             return
-        tilew, tileh = self.roomBuffer.tilesize
-        buffer = QPixmap(self.roomBuffer.room.width * tilew, self.roomBuffer.room.height * tileh)
-        buffer.fill(QColor("#00000000"))
-        painter = QPainter()
-        painter.begin(buffer)
-        for layer, tilemap in self.roomBuffer.room.layers.items():
-            for pos, tile in tilemap.tilemap.items():
-                if tile is None:
-                    continue
-                painter.drawPixmap(pos[0] * tilew, buffer.height() - pos[1] * tileh, tilew, tileh, tile.pixmap())
-        painter.end()
-        buffer.save(filepath)
+        tiles = TileImages.from_atlas(self.roomBuffer.atlas, self.roomBuffer.tilesize)
+        compositor = RoomCompositor.from_room(self.roomBuffer.room.snapshot(), tiles)
+        self.start_job(BackgroundJob("导出地图图片", lambda progress:export_image(compositor, filepath, progress=progress), self.jobPool))
 
     def export_current_room(self):
-        '''打印选框中的数据'''
+        '''将当前房间的快照在后台任务中存储为JSON或者二进制文件'''
 
         if self.roomBuffer is None:
             qtutils.information(None, "导出地图数据", "当前没有建立房间")
-        else:
-            filepath = qtutils.savefile("导出地图数据")
-            if filepath != None:
-                obj = self.project.json
-                obj.setdefault("room", self.roomBuffer.room.json)
-                utils.save_json(obj, filepath)
+            return
+        filepath = qtutils.savefile("导出地图数据", filter=f"json文件(*.json);;房间二进制文件(*{EditorRoomFile.EXTENSION})")
+        if filepath is None:
+            return
+        project = self.project.json
+        room = self.roomBuffer.room.snapshot()
+        self.start_job(BackgroundJob("导出地图数据", lambda progress:save_room_file(filepath, project, room, progress), self.jobPool))
+
+    def start_job(self, job: BackgroundJob) -> None:
+        '''开始一个后台任务,任务的进度显示在消息提示符中'''
+
+        job.progress.connect(lambda done, total:self.output(f"{job.title} {done * 100 // max(total, 1)}%"))
+        job.finished.connect(lambda seconds:self._end_job(job, f"{job.title}完成({seconds:.1f}s)"))
+        job.cancelled.connect(lambda:self._end_job(job, f"{job.title}已取消"))
+        job.failed.connect(lambda error:self._end_job(job, f"{job.title}失败", error))
+        self.jobs.append(job)
+        self.btn_cancelexport.enable()
+        self.output(f"{job.title}...")
+        job.start()
+
+    def _end_job(self, job: BackgroundJob, message:str, error=None) -> None:
+        if job in self.jobs:
+            self.jobs.remove(job)
+        if len(self.jobs) == 0:
+            self.btn_cancelexport.disable()
+        self.output(message)
+        if error != None:
+            qtutils.information(None, job.title, f"文件保存失败\n{error}")
+
+    def cancel_jobs(self) -> None:
+        '''取消所有正在运行以及等待中的后台任务'''
+
+        for job in self.jobs:
+            job.cancel()
+
+    def shutdown_jobs(self) -> None:
+        '''退出之前取消所有后台任务并等待它们结束,未完成的文件不会覆盖目标文件'''
+
+        for job in list(self.jobs):
+            job.cancel()
+            job.wait()
 
     def choose_tile(self, tileId:int, pixmap:QPixmap):
         '''分离出来主要是因为选取瓦片的方式不止从瓦片库选择一种，还可以用滴灌来选取'''
 
         self.pentool.tileId = tileId
         self.pentool.indicator.setPixmap(pixmap)
+        self.pentool.indicator.setOffset(0, 0)
         self.roomBuffer.current_tile = (tileId, pixmap)
+        self.roomBuffer.current_brush = None
+
+    def choose_brush(self, brush: Brush):
+        '''使用一个多格笔刷绘制,铅笔的指示器显示笔刷的预览图'''
+
+        if self.roomBuffer is None:
+            return
+        if brush.isSingleTile:
+            tile = self.project.findTile(int(brush.data[0, 0]))
+            if tile != None:
+                self.choose_tile(tile.tileId, tile.pixmap)
+            return
+        self.pentool.tileId = 0
+        self.pentool.indicator.setPixmap(brush.preview(self.project.tileManager.atlas, self.project.tilesize))
+        self.pentool.indicator.setOffset(brush.previewOffset)
+        self.roomBuffer.current_brush = brush
+
+    def create_brush(self) -> bool:
+        '''将选框中的数据创建为笔刷并开始使用该笔刷'''
+
+        npdata = self.roomBuffer.read_marquee(self.marqueetool.entrygridpos, self.marqueetool.endgridpos)
+        if npdata is None:
+            return False
+        brush = Brush(f"{npdata.shape[0]}x{npdata.shape[1]}", npdata)
+        self.choose_brush(brush)
+        self.brushCreated.emit(brush)
+        self.switch_tool(self.pentool)
+        return True
+
+    def tile_usage(self, tileId:int) -> int:
+        '''瓦片在世界中所有房间里被使用的次数'''
+
+        if self.rooms is None:
+            return 0
+        return self.rooms.usage_count(tileId)
 
     @property
     def lastTool(self):
@@ -301,17 +451,31 @@ class EditorMapWindow(EuclidWindow):
     @pyqtSlot(Tile)
     def on_project_tileChoosed(self, tile: Tile) -> None:
         '''当瓦片被重新选择时,执行该函数'''
-        if tile != None:
+        if tile != None and self.roomBuffer != None:
             self.choose_tile(tile.tileId, tile.pixmap)
 
     @pyqtSlot(Tile)
     def on_project_tileRemoved(self, tile: Tile) -> None:
         '''当瓦片被移除时,执行该函数'''
 
-        if self.roomBuffer.current_tile[0] == tile.tileId:
+        if self.rooms != None:
+            self.rooms.clear_tile(tile.tileId)
+        if self.roomBuffer is None:
+            return
+        if self.roomBuffer.current_tile != None and self.roomBuffer.current_tile[0] == tile.tileId:
             self.roomBuffer.current_tile = None
         if self.pentool.tileId == tile.tileId:
             self.pentool.indicator.setPixmap(self.pentool.defaultpixmap)
+        # DOC> 笔刷与笔刷盒共享,笔刷盒可能已经擦除了被移除的瓦片,因此总是刷新指示器
+        brush = self.roomBuffer.current_brush
+        if brush != None:
+            brush.replace(tile.tileId)
+            if len(brush.tileIds) == 0:
+                self.roomBuffer.current_brush = None
+                self.pentool.indicator.setPixmap(self.pentool.defaultpixmap)
+                self.pentool.indicator.setOffset(0, 0)
+            else:
+                self.choose_brush(brush)
         self.roomBuffer.clear_tile(tile.tileId)
 
     @pyqtSlot(str)
@@ -330,13 +494,26 @@ class EditorMapWindow(EuclidWindow):
             item = self.layerList.fetch(name)
             restyle(item.button, EUCLID_BUTTON if value else EUCLID_BUTTON_RED)
 
-    @pyqtSlot(QPointF, QPoint)
-    def on_pentool_drawMoved(self, scenepos:QPointF, gridpos:QPoint):
-        self.roomBuffer.drawpoint(scenepos, gridpos)
+    @pyqtSlot()
+    def on_view_viewportChanged(self):
+        if not self.viewportTimer.isActive():
+            self.viewportTimer.start()
 
-    @pyqtSlot(QPointF, QPoint)
-    def on_erasertool_drawMoved(self, scenepos:QPointF, gridpos:QPoint):
-        self.roomBuffer.erasepoint(scenepos, gridpos)
+    @pyqtSlot(QPoint, QPoint)
+    def on_pentool_strokeMoved(self, gridpos_from:QPoint, gridpos_to:QPoint):
+        if self.roomBuffer != None:
+            self.roomBuffer.drawline(gridpos_from, gridpos_to)
+
+    @pyqtSlot(QPoint, QPoint)
+    def on_erasertool_strokeMoved(self, gridpos_from:QPoint, gridpos_to:QPoint):
+        if self.roomBuffer != None:
+            self.roomBuffer.eraseline(gridpos_from, gridpos_to)
+
+    @pyqtSlot(QPoint, bool)
+    def on_filltool_clicked(self, gridpos:QPoint, fillAll:bool):
+        if self.roomBuffer != None:
+            count = self.roomBuffer.fill(gridpos, self.filltool.connectivity, fillAll)
+            self.output(f"{self.filltool.connectivity}连通填充:{count}格")
 
     @pyqtSlot(QPoint)
     def on_copytool_clicked(self, gridpos:QPoint):
@@ -349,9 +526,9 @@ class EditorMapWindow(EuclidWindow):
     @pyqtSlot(QPointF, QPoint)
     def on_pickertool_clicked(self, scenepos:QPointF, pos_snapped: QPoint):
         if self.roomBuffer != None:
-            item = self.roomBuffer.readpoint(scenepos, pos_snapped)
-            if item != None:
-                self.choose_tile(item.tileId, item.pixmap())
+            tile_info = self.roomBuffer.readpoint(scenepos, pos_snapped)
+            if tile_info != None:
+                self.choose_tile(*tile_info)
 
     @pyqtSlot(QPoint)
     def on_movetool_clicked(self, gridpos: QPoint):
@@ -367,12 +544,22 @@ class EditorMapWindow(EuclidWindow):
             self.switch_tool(self.lastTool)        
 
     def receiveKeyEvent(self, event: QKeyEvent) -> None:
-        if event.key() == Qt.Key_B:
+        if event.key() == Qt.Key_B and event.modifiers() & Qt.ControlModifier:
+            # DOC> 在选框工具中按下Ctrl+B将选框中的数据创建为笔刷
+            if self.tool is self.marqueetool:
+                self.create_brush()
+        elif event.key() == Qt.Key_B:
             self.switch_tool(self.pentool)
         elif event.key() == Qt.Key_E:
             self.switch_tool(self.erasertool)
         elif event.key() == Qt.Key_R:
             self.switch_tool(self.marqueetool)
+        elif event.key() == Qt.Key_G:
+            # DOC> 已经在使用填充工具时再次按下G切换连通方式
+            if self.tool is self.filltool:
+                self.output(f"{self.filltool.name}({self.filltool.toggleConnectivity()}连通)")
+            else:
+                self.switch_tool(self.filltool)
         elif event.key() == Qt.Key_C and event.modifiers() & Qt.ControlModifier:
             if self.tool is self.marqueetool:
                 valid, rect = self.roomBuffer.try_copydata(self.marqueetool.entrygridpos, self.marqueetool.endgridpos)
@@ -385,6 +572,15 @@ class EditorMapWindow(EuclidWindow):
                 if valid:
                     self.movetool.indicator.setRect(rect)
                     self.switch_tool(self.movetool)
+        elif event.key() == Qt.Key_Z and event.modifiers() & Qt.ControlModifier:
+            if self.roomBuffer != None:
+                if event.modifiers() & Qt.ShiftModifier:
+                    self.roomBuffer.redo()
+                else:
+                    self.roomBuffer.undo()
+        elif event.key() == Qt.Key_Y and event.modifiers() & Qt.ControlModifier:
+            if self.roomBuffer != None:
+                self.roomBuffer.redo()
         elif event.key() == Qt.Key_Shift:
             self.switch_tool(self.pickertool)
 
@@ -407,6 +603,15 @@ class EditorMapWindow(EuclidWindow):
 
     def onClick(self, event:QMouseEvent, isMovingScene:bool):
         '''isMovingScene标记了当前的鼠标移动操作是否是移动场景而非绘制'''
+        # DOC> 点击另一个房间时切换当前编辑的房间,这次点击不会交给工具
+        if self.rooms != None and self.tool.toolType >= 0 and isMovingScene and event.button() == Qt.LeftButton:
+            entry = self.rooms.at(self.helper.gridpos(self.view.mapToScene(event.pos())))
+            if entry != None and entry.roomId != self.rooms.activeId:
+                self.activate_room(entry)
+                return
+        # DOC> 按下到松开之间的所有绘制合并为一条历史记录
+        if self.roomBuffer != None:
+            self.roomBuffer.begin_action()
         self.tool.onClick(event, isMovingScene)
 
     def onMove(self, event: QMouseEvent):
@@ -415,4 +620,6 @@ class EditorMapWindow(EuclidWindow):
 
     def onRelease(self, event: QMouseEvent):
         '''鼠标松开时,通知工具'''
-        self.tool.onRelease(event)
\ No newline at end of file
+        self.tool.onRelease(event)
+        if self.roomBuffer != None:
+            self.roomBuffer.end_action()
\ No newline at end of file
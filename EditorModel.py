@@ -0,0 +1,555 @@
+# 地图数据核心模块
+# 瓦片、瓦片库、瓦片id分配、工程、房间与层级数据以及它们的序列化,只依赖NumPy与标准库,不需要QApplication,
+# 可以在脚本、工作进程以及基准测试中直接使用,编辑器中的Qt类(EditorData.Tile/TileManager/ProjectData)是这里的子类,
+# 只额外负责图像、图集、缩略图与信号,瓦片的QPixmap在第一次被访问时才会创建
+
+import os
+import json
+import numpy as np
+
+import utils
+import EditorRoomFile
+from EditorChunk import ChunkedTilemap
+
+
+# WARN> 关于瓦片
+class Tile:
+    '''单块瓦片数据,只记录瓦片的文件路径,不包含图像'''
+
+    def __init__(self, tileId:int, tileName:str, filepath:str, refcount=1):
+        '''初始化单块瓦片数据'''
+
+        self.tileId = tileId
+        self.tileName = tileName
+        self.filepath = filepath
+        self.refcount = refcount
+
+        # 编辑器认为瓦片可以直接作为笔刷来绘画
+        self.brushdata = np.array([[tileId]])
+
+    @property
+    def json(self):
+        '''将该瓦片的数据转换为JSON结构'''
+
+        return {
+            "id":self.tileId,
+            "name":self.tileName,
+            "filepath":self.filepath,
+            "refcount":self.refcount
+        }
+
+class TileLib:
+    '''描述一个瓦片库/一个瓦片库可以具有多个瓦片但每个瓦片只会有一个'''
+
+    def __init__(self, libid, name):
+        '''创建一个瓦片库'''
+
+        self.name = name
+        self.libid = libid
+        self.tiles = list()
+        self.tileIds = set()
+
+    def add(self, tile:Tile) -> bool:
+        '''增加瓦片数据'''
+
+        if tile.tileId in self.tileIds:
+            return False
+        self.tileIds.add(tile.tileId)
+        self.tiles.append(tile)
+        return True
+
+    def remove(self, index:int) -> Tile:
+        '''根据给定的索引来删除瓦片数据,并返回该瓦片'''
+
+        if index >= 0 and index < len(self.tiles):
+            tile = self.tiles[index]
+            tile.refcount -= 1
+            self.tiles.remove(tile)
+            self.tileIds.remove(tile.tileId)
+            return tile
+        return None
+
+    def clear_tiles(self):
+        '''所有的瓦片引用数减一,如果瓦片引用数为0,则准备删除该瓦片'''
+
+        output = list()
+        self.tileIds.clear()
+        for tile in self.tiles:
+            tile.refcount -= 1
+            if tile.refcount == 0:
+                output.append(tile)
+        return output
+
+class TileRegistry:
+    '''瓦片与瓦片库的管理以及瓦片id的分配\n
+    tileType与libType决定创建的瓦片与瓦片库的类型,添加与删除瓦片时调用_tile_added/_tile_removed,
+    编辑器的TileManager通过它们维护图集与缩略图'''
+
+    tileType = Tile
+    libType = TileLib
+
+    def __init__(self, tilesize=(12, 12)):
+        '''管理所有的瓦片'''
+
+        self.counter = utils.Counter(entry=1)
+        self.tilesize = tuple(tilesize)
+
+        # DOC> 瓦片名 > 瓦片实体
+        self.tiles = dict()
+        # DOC> 瓦片id > 瓦片实体, 与self.tiles保持同步, 用于根据房间中的瓦片id直接找到瓦片
+        self.tilesById = dict()
+
+        self.libs = list()
+        self.libCounter = utils.Counter(entry=1)
+        self.currentlib = None
+        self.hasSaved = True
+
+    def _tile_added(self, tile:Tile) -> None:
+        '''一块新的瓦片被创建之后调用'''
+
+    def _tile_removed(self, tile:Tile) -> None:
+        '''一块瓦片被删除之后调用'''
+
+    def findLib(self, name) -> tuple:
+        '''根据名称找到目标库'''
+
+        for i, lib in enumerate(self.libs):
+            if lib.name == name:
+                return i, lib
+        return -1, None
+
+    def indexLib(self, index:int) -> TileLib:
+        '''根据索引找到一个库'''
+
+        if index >= 0 and index < len(self.libs):
+            return self.libs[index]
+        return None
+
+    def set_current_lib(self, name:str) -> TileLib:
+        '''设置当前的瓦片库'''
+
+        index, lib = self.findLib(name)
+        if lib != None:
+            self.currentlib = lib
+            return self.currentlib
+        return None
+
+    def findTile(self, tileId:int) -> Tile:
+        '''根据瓦片id找到瓦片,不存在时返回None'''
+
+        return self.tilesById.get(tileId)
+
+    def createLib(self):
+        '''新建一个瓦片的库/该库会成为当前被选中的库'''
+
+        libid = self.libCounter.next_id
+        name = f"新建库{libid}"
+        self.currentlib = self.libType(libid, name)
+        self.libs.append(self.currentlib)
+        return self.currentlib
+
+    def removeLib(self, index) -> list:
+        '''删除目标瓦片库,返回被彻底删除的瓦片\n
+        是否有地图数据引用了库中的瓦片由Project.remove_lib检查,这里只负责删除'''
+
+        lib = self.libs[index]
+        tiles = lib.clear_tiles()
+        self.libCounter.recycle(lib.libid)
+        self.libs.remove(lib)
+
+        for tile in tiles:
+            self.tiles.pop(tile.tileName)
+            self.tilesById.pop(tile.tileId, None)
+            self.counter.recycle(tile.tileId)
+            self._tile_removed(tile)
+        return tiles
+
+    def removeTile(self, tile: Tile):
+        '''删除单块瓦片\n
+        是否有地图数据引用了这块瓦片由Project.remove_tile检查,这里只负责删除'''
+
+        self.counter.recycle(tile.tileId)
+        self.tiles.pop(tile.tileName)
+        self.tilesById.pop(tile.tileId, None)
+        self._tile_removed(tile)
+
+    def create(self, file:str):
+        '''根据给定的文件创建一个新的瓦片数据并加入当前的瓦片库,同名的瓦片只增加引用数'''
+
+        if file is None or not os.path.exists(file):
+            return False
+        try:
+            name = utils.parseNameFromPath(file)
+            if name in self.tiles:
+                tile = self.tiles[name]
+                tile.refcount += 1
+                self.currentlib.add(tile)
+                return True
+            # DOC> 不限制瓦片的大小
+            tile = self.tileType(self.counter.next_id, name, file)
+            self.tiles.setdefault(tile.tileName, tile)
+            self.tilesById.setdefault(tile.tileId, tile)
+            self._tile_added(tile)
+            self.currentlib.add(tile)
+            return True
+        except:
+            return False
+
+    @property
+    def json(self):
+        '''将所有的瓦片转换为一个JSON数据,它将以查找表的形式存在,通过瓦片Id查找瓦片名称,并且该数据还会记录自身的回收列表情况'''
+
+        tiles = {
+            "counter":self.counter.json,
+            "tiles":[v.json for v in self.tiles.values()]
+        }
+        _libs = dict()
+        for lib in self.libs:
+            _libs.setdefault(lib.name, {"tiles":[_.tileId for _ in lib.tiles],"libId":lib.libid})
+        return {
+            "tiles":tiles,
+            "libs":{
+                "counter":self.libCounter.json,
+                "libs":_libs
+            }
+        }
+
+    def _load_json(self, obj:dict) -> tuple:
+        '''从json数据中恢复瓦片与瓦片库,返回(创建的瓦片, 无法恢复的瓦片数量),瓦片的图像由子类负责载入'''
+
+        jsonTile = obj["tiles"]
+        missingCount = 0
+        created = list()
+        self.counter.load_json(jsonTile["counter"])
+        for tileinfo in jsonTile["tiles"]:
+            try:
+                tmp = self.tileType(tileinfo["id"], tileinfo["name"], tileinfo["filepath"], tileinfo["refcount"])
+                self.tiles.setdefault(tmp.tileName, tmp)
+                self.tilesById.setdefault(tmp.tileId, tmp)
+                created.append(tmp)
+            except:
+                missingCount += 1
+
+        jsonLib = obj["libs"]
+        self.libCounter.load_json(jsonLib["counter"])
+        for name, lib in jsonLib["libs"].items():
+            tmp = self.libType(lib["libId"], name)
+            for tileId in lib["tiles"]:
+                tile = self.tilesById.get(tileId)
+                if tile != None:
+                    tmp.add(tile)
+            self.libs.append(tmp)
+            self.currentlib = tmp
+        return created, missingCount
+
+    def load_json(self, obj:dict) -> int:
+        '''从json数据中恢复瓦片与瓦片库,返回无法恢复的瓦片数量'''
+
+        return self._load_json(obj)[1]
+
+
+class Project:
+    '''工程数据:瓦片尺寸以及所有的瓦片'''
+
+    def __init__(self, tilesize=(12, 12), tileManager=None):
+        '''@param tileManager 瓦片管理器,为None时创建一个TileRegistry'''
+
+        self.tilesize = tuple(tilesize)
+        self.tilew, self.tileh = tilesize
+        self.tileManager = TileRegistry(tilesize) if tileManager is None else tileManager
+
+        # DOC> 查询瓦片被地图引用次数的函数 tileId > int, 由地图编辑器在载入工程时设置
+        self.tileUsage = None
+
+    @staticmethod
+    def load_json(data:dict) -> tuple:
+        '''从工程的JSON数据中恢复工程,返回(工程, 无法恢复的瓦片数量),不读取瓦片图像'''
+
+        project = Project(tuple(data["tilesize"]))
+        missingCount = project.tileManager.load_json(data["tileManager"])
+        return project, missingCount
+
+    def usage(self, tileId:int) -> int:
+        '''瓦片被地图引用的次数'''
+
+        return 0 if self.tileUsage is None else self.tileUsage(tileId)
+
+    def remove_tile(self, lib:TileLib, index:int) -> tuple:
+        '''从瓦片库中删除一块瓦片,返回(是否删除, 被彻底删除的瓦片或者None)\n
+        瓦片只存在于该库中并且仍然被地图引用时不予删除'''
+
+        if index < 0 or index >= len(lib.tiles):
+            return False, None
+        target = lib.tiles[index]
+        if target.refcount <= 1 and self.usage(target.tileId) > 0:
+            return False, None
+        tile = lib.remove(index)
+        if tile.refcount == 0:
+            self.tileManager.removeTile(tile)
+            return True, tile
+        return True, None
+
+    def lib_usage(self, lib:TileLib) -> dict:
+        '''删除瓦片库时会被彻底删除但仍然被地图引用的瓦片 Tile > 被引用的次数'''
+
+        output = dict()
+        for tile in lib.tiles:
+            if tile.refcount <= 1:
+                count = self.usage(tile.tileId)
+                if count > 0:
+                    output[tile] = count
+        return output
+
+    def remove_lib(self, index:int) -> tuple:
+        '''删除一个瓦片库,返回(是否删除, 被彻底删除的瓦片列表)\n
+        与remove_tile相同,库中只存在于该库并且仍然被地图引用的瓦片会阻止删除,避免这些瓦片id被回收之后分配给新的瓦片'''
+
+        lib = self.tileManager.indexLib(index)
+        if lib is None or len(self.lib_usage(lib)) > 0:
+            return False, list()
+        return True, self.tileManager.removeLib(index)
+
+    @property
+    def json(self):
+        return {
+            "tileManager":self.tileManager.json,
+            "tilesize":[self.tilew, self.tileh]
+        }
+
+    def findTile(self, tileId:int) -> Tile:
+        '''根据瓦片id找到瓦片,不存在时返回None'''
+
+        return self.tileManager.findTile(tileId)
+
+
+# WARN> 关于房间
+class TilemapBuffer:
+    '''编辑时的Tilemap数据'''
+
+    def __init__(self,name:str,size:tuple):
+        '''创建一个新的Tilemap,瓦片id存储在分块稀疏存储中'''
+
+        self.name = name
+        self.width,self.height = size
+        self._tilemap = ChunkedTilemap(size)
+
+    @property
+    def json(self):
+        '''将层级数据转换为JSON数据,结构为[[x, y, tileId], ...]'''
+
+        return self._tilemap.tolist()
+
+    def load_json(self, cells:list) -> None:
+        '''从JSON数据[[x, y, tileId], ...]中批量恢复层级数据'''
+
+        self._tilemap = ChunkedTilemap.from_cells((self.width, self.height), cells)
+
+    def show(self):
+        '''打印地图数据'''
+
+        print(np.flip(self._tilemap.to_dense().transpose(1, 0), 0))
+
+class RoomBuffer:
+    '''编辑时房间数据'''
+
+    def __init__(self, size:tuple, pos=(0, 0)):
+        '''创建一个新的房间数据
+        @param pos 房间在场景中的网格坐标'''
+
+        self.size = tuple(size)
+        self.pos = tuple(pos)
+        self.width, self.height = size
+        self.layers = {}
+        self.layers.setdefault("Background",TilemapBuffer("Background", size))
+        self.layers.setdefault("Base", TilemapBuffer("Base", size))
+        self.layers.setdefault("Scaff", TilemapBuffer("Scaff", size))
+        self.layers.setdefault("Decorator", TilemapBuffer("Decorator", size))
+        self.__saved = False
+
+        # DOC> 房间被卸载时层级数据被打包为紧凑的数组,层级名 > ChunkedTilemap.pack()的结果
+        self.__packed = None
+        # DOC> 打包时统计的层级名 > {瓦片id:使用次数},卸载期间查询使用次数时不需要解包
+        self.__packedUsage = None
+
+    @property
+    def isPacked(self) -> bool:
+        return self.__packed is not None
+
+    def pack(self) -> None:
+        '''卸载房间:将所有层级打包为紧凑的数组并释放分块存储,访问层级数据之前需要调用unpack'''
+
+        if self.__packed is not None:
+            return
+        self.__packed = {name:value._tilemap.pack() for name, value in self.layers.items()}
+        self.__packedUsage = dict()
+        for name, packed in self.__packed.items():
+            counts = np.bincount(packed["data"].ravel())
+            ids = np.flatnonzero(counts[1:]) + 1
+            self.__packedUsage[name] = dict(zip(ids.tolist(), counts[ids].tolist()))
+        for value in self.layers.values():
+            value._tilemap = None
+
+    def unpack(self) -> None:
+        '''重新载入被打包的层级数据'''
+
+        if self.__packed is None:
+            return
+        for name, value in self.layers.items():
+            value._tilemap = ChunkedTilemap.unpack(self.size, self.__packed[name])
+        self.__packed = None
+        self.__packedUsage = None
+
+    def _storages(self) -> dict:
+        '''层级名 > ChunkedTilemap,房间被卸载时返回从打包数据临时恢复的分块存储,房间本身保持卸载的状态'''
+
+        if self.__packed is None:
+            return {name:value._tilemap for name, value in self.layers.items()}
+        return {name:ChunkedTilemap.unpack(self.size, packed) for name, packed in self.__packed.items()}
+
+    def snapshot(self) -> "RoomBuffer":
+        '''创建房间当前数据的快照,每个层级通过ChunkedTilemap.snapshot与房间共享分块(写时复制)\n
+        快照用于后台任务,之后对房间的编辑不会影响快照中的数据,被卸载的房间直接从打包数据创建快照,不会被解包'''
+
+        room = RoomBuffer(self.size, self.pos)
+        room.layers = dict()
+        for name, storage in self._storages().items():
+            tilemap = TilemapBuffer(name, self.size)
+            tilemap._tilemap = storage.snapshot() if self.__packed is None else storage
+            room.layers[name] = tilemap
+        return room
+
+    @property
+    def json(self):
+        '''将房间数据转换为JSON数据'''
+
+        layers = dict()
+        for name, storage in self._storages().items():
+            layers.setdefault(name, storage.tolist())
+        return {
+            "size":[self.width, self.height],
+            "pos":list(self.pos),
+            "layers":layers
+        }
+
+    def json_stream(self, progress=None) -> dict:
+        '''与json相同的结构,但层级数据以utils.JsonStream的形式按分块逐段生成,用于流式存储
+        @param progress 每生成一段数据之后调用progress(已生成的格子数, 总格子数),在其中抛出异常可以中止存储'''
+
+        storages = self._storages()
+        total = sum(storage.count_nonzero() for storage in storages.values())
+        done = 0
+        def parts(storage: ChunkedTilemap):
+            nonlocal done
+            for cells in storage.iter_cells():
+                yield cells
+                done += len(cells)
+                if progress != None:
+                    progress(done, total)
+
+        return {
+            "size":[self.width, self.height],
+            "pos":list(self.pos),
+            "layers":{name:utils.JsonStream(parts(storage)) for name, storage in storages.items()}
+        }
+
+    def used_tiles(self) -> np.ndarray:
+        '''所有层级中使用到的瓦片id(升序,不包含0)'''
+
+        if self.__packed is not None:
+            ids = set().union(*self.__packedUsage.values())
+            return np.array(sorted(ids), dtype=np.int64)
+        ids = set()
+        for tilemap in self.layers.values():
+            ids.update(tilemap._tilemap.used_ids())
+        return np.array(sorted(ids), dtype=np.int64)
+
+    def usage(self, tileId:int) -> dict:
+        '''某种瓦片在每个层级中的使用次数,层级名 > 次数,不包含没有使用该瓦片的层级'''
+
+        if self.__packed is not None:
+            return {name:usage[tileId] for name, usage in self.__packedUsage.items() if tileId in usage}
+        out = dict()
+        for name, tilemap in self.layers.items():
+            count = tilemap._tilemap.usage_count(tileId)
+            if count > 0:
+                out[name] = count
+        return out
+
+    def usage_count(self, tileId:int) -> int:
+        '''某种瓦片在所有层级中的使用次数'''
+
+        return sum(self.usage(tileId).values())
+
+    def clear_tile(self, tileId:int) -> dict:
+        '''擦除所有层级中的某种瓦片,返回层级名 > 被擦除的坐标(xs, ys),房间被卸载时直接修改打包的数据'''
+
+        out = dict()
+        if self.__packed is not None:
+            for name, packed in self.__packed.items():
+                if self.__packedUsage[name].pop(tileId, None) != None:
+                    packed["data"][packed["data"] == tileId] = 0
+            return out
+        for name, tilemap in self.layers.items():
+            xs, ys = tilemap._tilemap.where(tileId)
+            if len(xs) > 0:
+                tilemap._tilemap.put(xs, ys, 0)
+                out[name] = xs, ys
+        return out
+
+    def save_binary(self, project:dict, filepath:str, progress=None) -> None:
+        '''将工程数据与房间数据存储为二进制文件
+        @param progress 与EditorRoomFile.save_binary相同'''
+
+        EditorRoomFile.save_binary(filepath, project, self.size, self._storages(), {"pos":list(self.pos)}, progress)
+        self.__saved = True
+
+    @staticmethod
+    def load_json(obj:dict):
+        '''从JSON数据中恢复房间,JSON结构与RoomBuffer.json一致'''
+
+        room = RoomBuffer(obj["size"], obj.get("pos", (0, 0)))
+        for name, cells in obj["layers"].items():
+            tilemap = TilemapBuffer(name, room.size)
+            tilemap.load_json(cells)
+            room.layers[name] = tilemap
+        return room
+
+    @staticmethod
+    def load_binary(filepath:str) -> tuple:
+        '''从二进制文件中读取房间,数据区一次读入内存,返回(工程数据, 房间)'''
+
+        project, info, layers = EditorRoomFile.load_binary(filepath)
+        room = RoomBuffer(info["size"], info.get("pos", (0, 0)))
+        for name, storage in layers.items():
+            tilemap = TilemapBuffer(name, room.size)
+            tilemap._tilemap = storage
+            room.layers[name] = tilemap
+        room.__saved = True
+        return project, room
+
+    @property
+    def hasSaved(self):
+        return self.__saved
+
+
+def load_room_file(filepath:str) -> tuple:
+    '''读取导出的房间文件(JSON或者房间二进制文件),返回(工程的JSON数据, RoomBuffer)'''
+
+    if EditorRoomFile.is_binary_file(filepath):
+        return RoomBuffer.load_binary(filepath)
+    data = json.loads(utils.read(filepath))
+    if "room" not in data:
+        raise ValueError(f"{filepath}中不包含房间数据")
+    room = RoomBuffer.load_json(data.pop("room"))
+    return data, room
+
+def save_room_file(filepath:str, project:dict, room:RoomBuffer, progress=None) -> None:
+    '''将工程的JSON数据与房间存储为导出的房间文件,根据扩展名选择JSON或者二进制格式
+    @param progress 与RoomBuffer.json_stream/save_binary相同'''
+
+    if filepath.endswith(EditorRoomFile.EXTENSION):
+        room.save_binary(project, filepath, progress)
+        return
+    obj = dict(project)
+    obj["room"] = room.json_stream(progress)
+    utils.save_json(obj, filepath)
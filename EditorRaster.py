@@ -0,0 +1,96 @@
+# 栅格算法
+# 绘制工具使用的格子级算法,全部基于NumPy实现并且不依赖Qt
+
+import numpy as np
+
+
+def bresenham(x0:int, y0:int, x1:int, y1:int) -> tuple:
+    '''计算从(x0, y0)到(x1, y1)的线段经过的所有格子(包含两个端点),返回(xs, ys)\n
+    结果与逐步迭代的Bresenham算法一致,但一次性计算所有的点'''
+
+    dx, dy = abs(x1 - x0), abs(y1 - y0)
+    sx, sy = (1 if x1 >= x0 else -1), (1 if y1 >= y0 else -1)
+    if dx == 0 and dy == 0:
+        return np.array([x0], dtype=np.int64), np.array([y0], dtype=np.int64)
+    # DOC> 沿主轴逐格前进,副轴的偏移量为 round(t * 副轴长度 / 主轴长度)
+    if dx >= dy:
+        t = np.arange(dx + 1, dtype=np.int64)
+        return x0 + sx * t, y0 + sy * ((2 * t * dy + dx) // (2 * dx))
+    t = np.arange(dy + 1, dtype=np.int64)
+    return x0 + sx * ((2 * t * dx + dy) // (2 * dy)), y0 + sy * t
+
+def runs(match:np.ndarray) -> tuple:
+    '''找到match(bool二维数组)每一列中所有连续为True的段,返回(xs, y0s, y1s),不包含y1,按照(x, y0)排序'''
+
+    w, h = match.shape
+    padded = np.zeros((w, h + 2), dtype=np.int8)
+    padded[:, 1:-1] = match
+    d = np.diff(padded, axis=1)
+    xs, y0s = np.nonzero(d == 1)
+    _, y1s = np.nonzero(d == -1)
+    return xs, y0s, y1s
+
+def flood_fill(match:np.ndarray, x:int, y:int, connectivity=4) -> np.ndarray:
+    '''扫描线填充,match为可以被填充的格子(bool二维数组),返回与(x, y)连通的区域(bool二维数组)\n
+    先一次性找到每一列中所有连续的可填充段,相邻两列中相互重叠的段视为连通,
+    然后从(x, y)所在的段开始在段之间进行深度优先搜索,耗时只与段的数量有关
+    @param connectivity 4或者8,为8时斜向相邻的格子也视为连通'''
+
+    if connectivity not in (4, 8):
+        raise ValueError("connectivity只能是4或者8")
+    w, h = match.shape
+    region = np.zeros((w, h), dtype=bool)
+    if not match[x, y]:
+        return region
+    xs, y0s, y1s = runs(match)
+    extend = 1 if connectivity == 8 else 0
+
+    # DOC> 将(列, 行)编码为一个有序的键,在下一列中二分查找与每一段重叠的段[first, last)
+    stride = h + 3
+    keys0 = xs * stride + y0s + 1
+    keys1 = xs * stride + y1s + 1
+    first = np.searchsorted(keys1, (xs + 1) * stride + y0s + 1 - extend, side="right")
+    last = np.searchsorted(keys0, (xs + 1) * stride + y1s + 1 + extend, side="left")
+    last = np.maximum(first, last)
+    counts = last - first
+    src = np.repeat(np.arange(len(xs)), counts)
+    dst = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts) + np.repeat(first, counts)
+
+    # DOC> 无向邻接表(CSR)
+    a, b = np.concatenate((src, dst)), np.concatenate((dst, src))
+    order = np.argsort(a, kind="stable")
+    indptr = np.searchsorted(a[order], np.arange(len(xs) + 1)).tolist()
+    indices = b[order].tolist()
+
+    seed = int(np.searchsorted(keys0, x * stride + y + 1, side="right")) - 1
+    visited = bytearray(len(xs))
+    visited[seed] = 1
+    stack = [seed]
+    while len(stack) > 0:
+        r = stack.pop()
+        for n in indices[indptr[r]:indptr[r + 1]]:
+            if not visited[n]:
+                visited[n] = 1
+                stack.append(n)
+
+    # DOC> 用差分数组一次性还原所有被访问的段
+    hit = np.frombuffer(bytes(visited), dtype=np.uint8).astype(bool)
+    delta = np.zeros((w, h + 1), dtype=np.int32)
+    np.add.at(delta, (xs[hit], y0s[hit]), 1)
+    np.add.at(delta, (xs[hit], y1s[hit]), -1)
+    region[:] = np.cumsum(delta, axis=1)[:, :h] > 0
+    return region
+
+def stamp(block:np.ndarray, data:np.ndarray, xs:np.ndarray, ys:np.ndarray) -> None:
+    '''沿着一组位置在block中依次盖章,data中为0的格子是透明的\n
+    (xs[i], ys[i])为第i个印章左下角在block中的坐标,超出block的部分被裁剪,每个印章只进行一次带掩码的赋值'''
+
+    w, h = data.shape
+    bw, bh = block.shape
+    mask = data != 0
+    for x, y in zip(np.asarray(xs).tolist(), np.asarray(ys).tolist()):
+        x0, y0 = max(x, 0), max(y, 0)
+        x1, y1 = min(x + w, bw), min(y + h, bh)
+        if x0 >= x1 or y0 >= y1:
+            continue
+        np.copyto(block[x0:x1, y0:y1], data[x0 - x:x1 - x, y0 - y:y1 - y], where=mask[x0 - x:x1 - x, y0 - y:y1 - y])
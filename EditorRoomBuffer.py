@@ -6,93 +6,26 @@ import numpy as np
 from Euclid.EuclidGraphicsView import *
 from EditorTools import *
 from Editor import *
-
-class TileItem(QGraphicsPixmapItem):
-    '''瓦片Item'''
-
-    def __init__(self, tileId:int, pixmap:QPixmap):
-        super().__init__(pixmap, None)
-        self.tileId = tileId
-
-    def resetTile(self, tileId:int, pixmap:QPixmap):
-        '''重设tile'''
-
-        self.tileId = tileId
-        self.setPixmap(pixmap)
-
-
-class TilemapBuffer:
-    '''编辑时的Tilemap数据'''
-
-    def __init__(self,name:str,size:tuple):
-        '''创建一个新的TileItem索引器用于表示一个Tilemap'''
-
-        self.name = name
-        self.width,self.height = size
-        self.tilemap = dict()
-        for x in range(size[0]):
-            for y in range(size[1]):
-                self.tilemap.setdefault((x, y), None)
-        self._tilemap = np.zeros(size, dtype=np.int32)
-
-    @property
-    def json(self):
-        '''将层级数据转换为JSON数据,结构为'''
-
-        output = []
-        for x in range(self.width):
-            for y in range(self.height):
-                v = self._tilemap[x, y]
-                if v != 0:output.append([x, y, int(self._tilemap[x, y])])
-        return output
-
-    def show(self):
-        '''打印地图数据'''
-
-        print(np.flip(self._tilemap.transpose(1, 0), 0))
-
-class RoomBuffer:
-    '''编辑时房间数据'''
-
-    def __init__(self, size:tuple):
-        '''创建一个新的房间数据'''
-
-        self.size = size
-        self.width, self.height = size
-        self.layers = {}
-        self.layers.setdefault("Background",TilemapBuffer("Background", size))
-        self.layers.setdefault("Base", TilemapBuffer("Base", size))
-        self.layers.setdefault("Scaff", TilemapBuffer("Scaff", size))
-        self.layers.setdefault("Decorator", TilemapBuffer("Decorator", size))
-        self.__saved = False
-
-    @property
-    def json(self):
-        '''将房间数据转换为JSON数据'''
-
-        layers = dict()
-        for name, value in self.layers.items():
-            layers.setdefault(name, value.json)
-        return {
-            "size":[self.width, self.height],
-            "layers":layers
-        }
-
-    @property
-    def hasSaved(self):
-        return self.__saved
+from EditorModel import TilemapBuffer, RoomBuffer
+from EditorLayerRenderer import LayerRenderer
+from EditorTileAtlas import TileAtlas
+from EditorHistory import History
+from EditorRaster import bresenham, flood_fill, stamp
 
 class RoomDrawingBuffer:
     '''保存一组房间渲染数据,当保存该数据时,会将其写入到房间管理器,在编辑状态时,只与该房间交互
     该数据并不是常驻数据,当需要一个新的drawingBuffer的时候直接重新创建即可'''
 
-    def __init__(self, tilesize:tuple, sourceRect:QRectF, roomtilesize, roomtilepos, view: EditorView, scene: EuclidSceneGrid, helper: ToolHelper):
+    def __init__(self, tilesize:tuple, sourceRect:QRectF, roomtilesize, roomtilepos, view: EditorView, scene: EuclidSceneGrid, helper: ToolHelper, atlas: TileAtlas, tiles:dict, room=None):
         '''存储一组房间的渲染数据
         @param tilesize 瓦片大小
-        @param sourceRect 房间原始的RectF'''
+        @param sourceRect 房间原始的RectF
+        @param atlas 瓦片管理器的图集,所有层级通过图集渲染
+        @param tiles 瓦片管理器的瓦片id > 瓦片索引,用于根据瓦片id找到瓦片的图像
+        @param room 已有的房间数据,为None时创建一个空房间'''
 
         self.tilesize = tilesize
-        self.room = RoomBuffer(roomtilesize)
+        self.room = RoomBuffer(roomtilesize, roomtilepos) if room is None else room
 
         self.sourceRect = sourceRect
 
@@ -105,13 +38,20 @@ class RoomDrawingBuffer:
         self.scene = scene
         self.helper = helper
 
+        self.atlas = atlas
+        self.tiles = tiles
+        # DOC> 瓦片id > QPixmap, 已经登记到当前房间的瓦片图像,用于计算层级的溢出边距
+        self.pixmaps = dict()
         self.layers = dict()
+        origin = QPointF(self.roomPoint.x() * tilesize[0], self.roomPoint.y() * tilesize[1])
         idx = 0
-        for k in self.room.layers:
-            layer = QGraphicsItemGroup()
+        for k, tilemap in self.room.layers.items():
+            layer = LayerRenderer(tilemap._tilemap, tilesize, origin, self.atlas)
             self.layers.setdefault(k, layer)
             self.scene.addItem(layer)
             layer.setZValue(idx)
+            layer.markAll()
+            layer.flush()
             idx += 1
 
         self.border = helper.createbox(EditorColor.EYECATCH_COLOR_CYAN, style=Qt.DashLine)
@@ -121,8 +61,18 @@ class RoomDrawingBuffer:
         self.sourceRect.setY(self.sourceRect.y() - self.tilesize[1])
 
 
-        # DOC> 编辑时临时数据信息
+        # DOC> 撤销/重做历史,所有对层级的写入都会被记录
+        self.history = History(lambda name:self.room.layers[name]._tilemap)
+
+        # DOC> 笔画绘制时场景每帧最多刷新一次
+        self.flushTimer = QTimer()
+        self.flushTimer.setSingleShot(True)
+        self.flushTimer.setInterval(16)
+        self.flushTimer.timeout.connect(self.flush)
+
+        # DOC> 编辑时临时数据信息,current_brush为多格笔刷(EditorBrush.Brush),不为None时铅笔使用笔刷绘制
         self.current_tile = None
+        self.current_brush = None
         self.__current_tilemap = None
         self.__current_group = None
         self.__layer_choosed = False
@@ -145,33 +95,229 @@ class RoomDrawingBuffer:
         gridpos_relative.setY(-gridpos_relative.y())
         return gridpos_relative + self.roomPointMinusOne
 
-    def _force_draw_point(self, pos:tuple, scenepos:QPointF, tile_info:tuple):
-        '''强制在某个点绘制一块瓦片'''
-
-        data = self.__current_tilemap.tilemap[pos]
-        tileId, pixmap = tile_info
-        if data is None:
-            item = TileItem(tileId, pixmap)
-            item.setPos(scenepos + QPointF(0, self.tilesize[1] - pixmap.height()))
-            self.__current_tilemap.tilemap[pos] = item
-            self.__current_tilemap._tilemap[pos[0], pos[1]] = tileId
-            self.__current_group.addToGroup(item)
-        elif data.tileId != tileId:
-            self.__current_tilemap._tilemap[pos[0], pos[1]] = tileId
-            data.resetTile(tileId, pixmap)
-
-    def _force_erase_point(self, pos:tuple):
-        '''强制擦除一个点的数据'''
-
-        data = self.__current_tilemap.tilemap[pos]
-        if data != None:
-            self.__current_tilemap.tilemap[pos] = None
-            self.__current_tilemap._tilemap[pos[0], pos[1]] = 0
-            self.__current_group.removeFromGroup(data)
+    def pixmap(self, tileId:int) -> QPixmap:
+        '''根据瓦片id获取瓦片图像'''
+
+        tile = self.tiles.get(tileId)
+        return None if tile is None else tile.pixmap
+
+    def register_used_tiles(self):
+        '''登记房间中所有被使用的瓦片'''
+
+        infos = list()
+        for tileId in self.room.used_tiles().tolist():
+            pixmap = self.pixmap(tileId)
+            if pixmap != None:
+                infos.append((tileId, pixmap))
+        self.register_tiles(infos)
+
+    def register_tile(self, tileId:int, pixmap:QPixmap):
+        '''登记瓦片的渲染数据,如果瓦片超出了格子的范围则调整所有层级的溢出边距\n
+        只有溢出边距变大时才重绘所有分块,否则只重绘使用了该瓦片的分块'''
+
+        if self.pixmaps.get(tileId) is pixmap:
+            return
+        self.pixmaps[tileId] = pixmap
+        if tileId not in self.atlas:
+            self.atlas.add(tileId, pixmap)
+        marginw = max(0, pixmap.width() - self.tilesize[0])
+        marginh = max(0, pixmap.height() - self.tilesize[1])
+        for layer in self.layers.values():
+            if marginw > layer.marginw or marginh > layer.marginh:
+                layer.setMargin(max(layer.marginw, marginw), max(layer.marginh, marginh))
+                layer.markAll()
+            else:
+                layer.markChunks(layer.storage.usage.get(tileId, ()))
+
+    def register_tiles(self, tile_infos:list):
+        '''批量登记瓦片的渲染数据[(tileId, pixmap), ...]并立即重绘'''
+
+        for tileId, pixmap in tile_infos:
+            self.register_tile(tileId, pixmap)
+        for layer in self.layers.values():
+            layer.flush()
+
+    def _write_diff(self, x0:int, y0:int, before:np.ndarray, after:np.ndarray) -> int:
+        '''将一个矩形区域从before改写为after,(x0, y0)为区域左下角,返回发生变化的格子数量\n
+        只有数值不同的格子会被写入、记录到历史中并标记为需要重绘,不会立即刷新场景'''
+
+        cx, cy = np.nonzero(before != after)
+        if len(cx) == 0:
+            return 0
+        old, new = before[cx, cy], after[cx, cy]
+        cx += x0
+        cy += y0
+        self.__current_tilemap._tilemap.put(cx, cy, new)
+        self.history.record(self.__current_tilemap.name, cx, cy, old, new)
+        self.__current_group.markCells(cx, cy)
+        return len(cx)
+
+    def _write_points(self, xs:np.ndarray, ys:np.ndarray, tileId:int) -> int:
+        '''将一组格子批量写入当前层级,超出房间范围的格子被忽略,返回发生变化的格子数量\n
+        写入会被记录到历史中,被修改的格子标记为需要重绘,但不会立即刷新场景'''
+
+        storage = self.__current_tilemap._tilemap
+        inside = (xs >= 0) & (ys >= 0) & (xs < storage.width) & (ys < storage.height)
+        xs, ys = xs[inside], ys[inside]
+        old = storage.take(xs, ys)
+        changed = old != tileId
+        if not changed.any():
+            return 0
+        xs, ys, old = xs[changed], ys[changed], old[changed]
+        storage.put(xs, ys, tileId)
+        self.history.record(self.__current_tilemap.name, xs, ys, old, np.full(len(xs), tileId))
+        self.__current_group.markCells(xs, ys)
+        return len(xs)
+
+    def _stroke(self, gridpos_from:QPoint, gridpos_to:QPoint, tileId:int) -> None:
+        '''将两个网格坐标之间的线段作为一次写入,场景在下一帧刷新'''
+
+        x0, y0 = self.abspos2relative(gridpos_from)
+        x1, y1 = self.abspos2relative(gridpos_to)
+        xs, ys = bresenham(x0, y0, x1, y1)
+        if self._write_points(xs, ys, tileId) > 0 and not self.flushTimer.isActive():
+            self.flushTimer.start()
+
+    def _stamp(self, gridpos_from:QPoint, gridpos_to:QPoint, brush) -> int:
+        '''沿着两个网格坐标之间的线段逐格盖章,笔刷的左上角对齐线段上的格子,返回发生变化的格子数量\n
+        先读取整条线段所覆盖的矩形区域,在区域中依次盖章之后只将发生变化的格子写回层级'''
+
+        x0, y0 = self.abspos2relative(gridpos_from)
+        x1, y1 = self.abspos2relative(gridpos_to)
+        xs, ys = bresenham(x0, y0, x1, y1)
+        w, h = brush.size
+        ys = ys - h + 1
+        storage = self.__current_tilemap._tilemap
+        bx0, by0 = max(0, int(xs.min())), max(0, int(ys.min()))
+        bx1, by1 = min(storage.width, int(xs.max()) + w), min(storage.height, int(ys.max()) + h)
+        if bx0 >= bx1 or by0 >= by1:
+            return 0
+        before = storage.read_block(bx0, by0, bx1, by1)
+        block = before.copy()
+        stamp(block, brush.data, xs - bx0, ys - by0)
+        count = self._write_diff(bx0, by0, before, block)
+        if count > 0 and not self.flushTimer.isActive():
+            self.flushTimer.start()
+        return count
+
+    def drawline(self, gridpos_from:QPoint, gridpos_to:QPoint):
+        '''铅笔工具的笔画回调函数,绘制两次鼠标事件之间的线段'''
+
+        if not self.__layer_choosed:
+            return
+        if self.current_brush != None:
+            for tileId in self.current_brush.tileIds:
+                pixmap = self.pixmap(tileId)
+                if pixmap != None:
+                    self.register_tile(tileId, pixmap)
+            self._stamp(gridpos_from, gridpos_to, self.current_brush)
+        elif self.current_tile != None:
+            tileId, pixmap = self.current_tile
+            self.register_tile(tileId, pixmap)
+            self._stroke(gridpos_from, gridpos_to, tileId)
+
+    def eraseline(self, gridpos_from:QPoint, gridpos_to:QPoint):
+        '''橡皮工具的笔画回调函数,擦除两次鼠标事件之间的线段'''
+
+        if self.__layer_choosed:
+            self._stroke(gridpos_from, gridpos_to, 0)
+
+    def fill(self, gridpos:QPoint, connectivity=4, fillAll=False) -> int:
+        '''从网格坐标gridpos开始用当前瓦片进行填充,返回被填充的格子数量
+        @param connectivity 4连通或者8连通
+        @param fillAll 为True时填充当前层级中所有与起点瓦片相同的格子,而不只是相连的区域'''
+
+        if not self.__layer_choosed or self.current_tile is None:
+            return 0
+        x, y = self.abspos2relative(gridpos)
+        storage = self.__current_tilemap._tilemap
+        if x < 0 or y < 0 or x >= storage.width or y >= storage.height:
+            return 0
+        tileId, pixmap = self.current_tile
+        target = storage.get(x, y)
+        if target == tileId:
+            return 0
+
+        # DOC> 只读取已分配的分块与起点所覆盖的范围并向外扩展一格,范围之外都是未分配的空白格子,
+        # DOC> 扩展出的一圈空白格子与范围之外的区域连通情况相同,被填充到时整块填充范围之外对应的一侧
+        x0, y0, x1, y1 = x, y, x + 1, y + 1
+        extent = storage.extent()
+        if extent != None:
+            x0, y0 = min(x0, extent[0]), min(y0, extent[1])
+            x1, y1 = max(x1, extent[2]), max(y1, extent[3])
+        x0, y0 = max(x0 - 1, 0), max(y0 - 1, 0)
+        x1, y1 = min(x1 + 1, storage.width), min(y1 + 1, storage.height)
+        match = storage.read_block(x0, y0, x1, y1) == target
+        region = match if fillAll else flood_fill(match, x - x0, y - y0, connectivity)
+        xs, ys = np.nonzero(region)
+        self.register_tile(tileId, pixmap)
+        # DOC> 范围之内与范围之外的写入合并为一条历史记录
+        self.history.begin()
+        count = self._write_points(xs + x0, ys + y0, tileId)
+
+        if target == 0:
+            w, h = storage.width, storage.height
+            outside = (
+                (x0 > 0 and region[0, :].any(), (0, 0, x0, h)),
+                (x1 < w and region[-1, :].any(), (x1, 0, w, h)),
+                (y0 > 0 and region[:, 0].any(), (x0, 0, x1, y0)),
+                (y1 < h and region[:, -1].any(), (x0, y1, x1, h)),
+            )
+            for reached, (sx0, sy0, sx1, sy1) in outside:
+                if reached:
+                    before = np.zeros((sx1 - sx0, sy1 - sy0), dtype=storage.dtype)
+                    count += self._write_diff(sx0, sy0, before, np.full_like(before, tileId))
+        self.history.end()
+        self.flush()
+        return count
+
+    def flush(self):
+        '''刷新所有层级中被标记的区域'''
+
+        self.flushTimer.stop()
+        for layer in self.layers.values():
+            layer.flush()
+
+    def begin_action(self):
+        '''开始一次可以被撤销的操作(例如一笔绘制),操作中的所有写入合并为一条历史记录\n
+        上一次操作没有正常结束时(例如没有收到鼠标松开的事件)先将其结束'''
+
+        self.history.finish()
+        self.history.begin()
+
+    def end_action(self):
+        '''结束一次操作,笔画中尚未刷新的区域立即刷新'''
+
+        self.history.end()
+        if self.flushTimer.isActive():
+            self.flush()
+
+    def _apply_patches(self, patches:list):
+        '''撤销/重做之后重绘补丁覆盖的区域'''
+
+        for patch in patches:
+            self.layers[patch.layer].markRect(*patch.rect)
+        for layer in self.layers.values():
+            layer.flush()
+
+    def undo(self) -> bool:
+        '''撤销最近的一次操作'''
+
+        patches = self.history.undo()
+        self._apply_patches(patches)
+        return len(patches) > 0
+
+    def redo(self) -> bool:
+        '''重做最近一次被撤销的操作'''
+
+        patches = self.history.redo()
+        self._apply_patches(patches)
+        return len(patches) > 0
 
     def clear(self):
         '''销毁当前房间的渲染数据'''
 
+        self.flushTimer.stop()
         self.scene.removeItem(self.border)
         for name,layer in self.layers.items():
             self.scene.removeItem(layer)
@@ -219,51 +365,69 @@ class RoomDrawingBuffer:
                     return True, QRectF(0, 0, shapex * self.tilesize[0], shapey * self.tilesize[1])
         return False,None
  
+    def read_marquee(self, p1: QPoint, p2: QPoint) -> np.ndarray:
+        '''读取选框中当前层级的数据,选框无效或者其中没有瓦片时返回None'''
+
+        if self.__current_tilemap != None:
+            valid, p1, p2 = self.test_marqueebox(p1, p2)
+            if valid:
+                npdata = self.__current_tilemap._tilemap[p1[0]:p2[0], p1[1]:p2[1]]
+                if npdata.any():
+                    return npdata
+        return None
+
     def _try_copydata_readtiles(self, data:np.ndarray, border_entry_point:tuple) -> dict:
         '''读取一个范围内所有存储的瓦片信息'''
 
         out = {}
-        entrypoint = np.array(border_entry_point)
-        for _pos in np.vstack(np.where(data != 0)).transpose(1,0):
-            pos = tuple(_pos + entrypoint)
-            item = self.__current_tilemap.tilemap[pos]
-            out.setdefault(item.tileId, (item.tileId, item.pixmap()))
+        for tileId in np.unique(data[data != 0]).tolist():
+            out.setdefault(tileId, (tileId, self.pixmap(tileId)))
         return out
 
     def drawpoint(self, scene_pos:QPointF, grid_pos:QPoint):
-        '''铅笔工具绘制回调函数'''
+        '''在单个格子中绘制当前瓦片并立即刷新'''
 
-        if self.__layer_choosed and self.current_tile != None:
-            if self.sourceRect.contains(scene_pos):
-                pos = self.abspos2relative(grid_pos)
-                self._force_draw_point(pos, scene_pos, self.current_tile)
+        self.drawline(grid_pos, grid_pos)
+        self.flush()
 
     def erasepoint(self, scenepos:QPointF, gridpos:QPoint):
-        '''擦除回调函数'''
+        '''擦除单个格子并立即刷新'''
 
-        if self.__layer_choosed and self.sourceRect.contains(scenepos):
-            pos = self.abspos2relative(gridpos)
-            self._force_erase_point(pos)
+        self.eraseline(gridpos, gridpos)
+        self.flush()
 
     def readpoint(self, scenepos:QPointF, gridpos: QPoint):
-        '''读取目标位置的瓦片'''
+        '''读取目标位置的瓦片,返回(tileId, pixmap)'''
 
         if self.__layer_choosed and self.sourceRect.contains(scenepos):
             pos = self.abspos2relative(gridpos)
-            return self.__current_tilemap.tilemap.get(pos)
-
-    def _paste_data(self, gridpos_relative:tuple, npdata:np.ndarray, tileinfos:tuple):
-
-        roompoint = QPointF(self.roomPoint.x() * self.tilesize[0], self.roomPoint.y() * self.tilesize[1])
-        for x in range(npdata.shape[0]):
-            for y in range(npdata.shape[1]):
-                _gridpos_relative = x + gridpos_relative[0], y + gridpos_relative[1]
-                scenepos_relative = QPointF(_gridpos_relative[0] * self.tilesize[0], -_gridpos_relative[1] * self.tilesize[1]) + roompoint
-                tileId = npdata[x, y]
-                if tileId == 0:
-                    self._force_erase_point(_gridpos_relative)
-                else:
-                    self._force_draw_point(_gridpos_relative, scenepos_relative, tileinfos[tileId])
+            tileId = self.__current_tilemap._tilemap.get(*pos)
+            if tileId != 0 and tileId in self.tiles:
+                return tileId, self.pixmap(tileId)
+
+    def _paste_data(self, gridpos_relative:tuple, npdata:np.ndarray, tileinfos:dict, source=None) -> int:
+        '''将npdata整块写入到gridpos_relative处(为0的格子会被擦除),返回发生变化的格子数量
+        @param source 移动数据时原选框的左下角坐标,原选框中不被目标区域覆盖的部分会被擦除\n
+        先在原选框与目标区域的包围盒中计算写入之后的结果,然后只写入数值发生变化的格子'''
+
+        w, h = npdata.shape
+        x0, y0 = gridpos_relative
+        bx0, by0, bx1, by1 = x0, y0, x0 + w, y0 + h
+        if source != None:
+            bx0, by0 = min(bx0, source[0]), min(by0, source[1])
+            bx1, by1 = max(bx1, source[0] + w), max(by1, source[1] + h)
+        before = self.__current_tilemap._tilemap.read_block(bx0, by0, bx1, by1)
+        after = before.copy()
+        if source != None:
+            after[source[0] - bx0:source[0] - bx0 + w, source[1] - by0:source[1] - by0 + h] = 0
+        after[x0 - bx0:x0 - bx0 + w, y0 - by0:y0 - by0 + h] = npdata
+
+        for tileId, pixmap in tileinfos.values():
+            if pixmap != None:
+                self.register_tile(tileId, pixmap)
+        count = self._write_diff(bx0, by0, before, after)
+        self.__current_group.flush()
+        return count
 
     def paste_copied_data(self, gridpos_abs_qt: QPoint) -> None:
         '''在复制工具的当前位置粘贴被复制的数据'''
@@ -289,34 +453,24 @@ class RoomDrawingBuffer:
         # 检查目标方块是否处于房间范围内
         p2 = gridpos_relative[0] + npdata.shape[0], gridpos_relative[1] + npdata.shape[1]
         if self.test_borderinroom(gridpos_relative, p2):
-            # 优先清空之前的数据，然后复制新的数据，这么做是为了放置要复制的区域有可能与新区域产生交叉
-            for x in range(npdata.shape[0]):
-                for y in range(npdata.shape[1]):
-                    _gridpos_relative = x + self.__marquee_pos[0], y + self.__marquee_pos[1]
-                    self._force_erase_point(_gridpos_relative)
-            self._paste_data(gridpos_relative, npdata, tiledicts)
+            # 清空之前的数据与绘制新的数据在同一次写入中完成,两个区域交叉时以新的数据为准
+            self._paste_data(gridpos_relative, npdata, tiledicts, self.__marquee_pos)
+            self.__marquee_pos = gridpos_relative
             return True
         return False
 
-    def _clear_tile_in_layer(self, tileId:int, tilemap: TilemapBuffer) -> None:
-        '''删除所有为目标瓦片的瓦片'''
-
-        source = np.copy(tilemap._tilemap)
-        for _pos in np.vstack(np.where(source == tileId)).transpose(1, 0):
-            pos = _pos[0], _pos[1]
-            tilemap._tilemap[pos[0], pos[1]] = 0
-            item = tilemap.tilemap[pos]
-            tilemap.tilemap[pos] = None
-            yield item
-
     def clear_tile(self, tileId):
         '''删除所有层级中瓦片id为目标id的瓦片'''
 
         if tileId == 0:return
-        for layer_name,tilemap in self.room.layers.items():
+        # DOC> 被删除瓦片的id会被回收给新的瓦片,历史记录中的旧id已经失效,因此删除瓦片无法撤销并会清空历史
+        self.history.clear()
+        # DOC> 通过反向索引只访问包含该瓦片的分块
+        for layer_name, (xs, ys) in self.room.clear_tile(tileId).items():
             layerGroup = self.layers[layer_name]
-            for item in self._clear_tile_in_layer(tileId, tilemap):
-                layerGroup.removeFromGroup(item)
+            layerGroup.markCells(xs, ys)
+            layerGroup.flush()
+        self.pixmaps.pop(tileId, None)
 
     def setLayerVisible(self, name:str) -> bool:
         '''set if layer visible if layer is not visible, otherwise 
@@ -0,0 +1,145 @@
+# 房间二进制文件
+# 文件结构:
+#   MAGIC(8字节) | 版本号(uint32) | 清单长度(uint32) | 清单(UTF-8 JSON) | 对齐填充 | 分块数据
+# 清单中记录工程数据、房间尺寸以及每个层级的分块目录,分块数据为连续存放的小端int32数组,
+# 每个分块的形状为(chunksize, chunksize),读取时整个数据区一次读入内存,不需要逐格解析
+
+import json
+import struct
+import numpy as np
+
+import utils
+from EditorChunk import ChunkedTilemap, CHUNK_SIZE
+
+MAGIC = b"MEDROOM\0"
+VERSION = 1
+ALIGNMENT = 64
+DTYPE = np.dtype("<i4")
+EXTENSION = ".mroom"
+
+
+def is_binary_file(filepath:str) -> bool:
+    '''根据文件头判断一个文件是否为房间二进制文件'''
+
+    try:
+        with open(filepath, "rb") as f:
+            return f.read(len(MAGIC)) == MAGIC
+    except OSError:
+        return False
+
+def _header(manifest:dict) -> bytes:
+    '''生成文件头与清单,并根据对齐要求计算数据区的起点'''
+
+    fixed = len(MAGIC) + 8
+    body = json.dumps(manifest, ensure_ascii=False).encode("utf-8")
+    # DOC> 清单中记录了数据区的起点,起点本身的位数会影响清单长度,因此在数据区起点稳定之前反复计算
+    while True:
+        offset = fixed + len(body)
+        offset += (-offset) % ALIGNMENT
+        if manifest.get("dataOffset") == offset:
+            break
+        manifest["dataOffset"] = offset
+        body = json.dumps(manifest, ensure_ascii=False).encode("utf-8")
+    head = MAGIC + struct.pack("<II", VERSION, len(body)) + body
+    return head + b"\0" * (offset - len(head))
+
+def save_binary(filepath:str, project:dict, size:tuple, layers:dict, extra=None, progress=None) -> None:
+    '''将工程数据与房间层级存储为二进制文件
+    @param project 工程的JSON数据
+    @param size 房间尺寸
+    @param layers 层级名 > ChunkedTilemap
+    @param extra 房间的其他JSON数据
+    @param progress 每写入一批分块之后调用progress(已写入的分块数, 总分块数),在其中抛出异常可以中止存储'''
+
+    chunksize = None
+    table = dict()
+    ordered = list()
+    for name, storage in layers.items():
+        if chunksize is None:
+            chunksize = storage.chunksize
+        elif chunksize != storage.chunksize:
+            raise ValueError("所有层级的分块尺寸必须一致")
+        entries = list()
+        for key in sorted(storage.chunks):
+            entries.append([key[0], key[1], storage.counts[key]])
+            ordered.append(storage.chunks[key])
+        table[name] = entries
+
+    manifest = {
+        "project":project,
+        "room":dict(extra or {}, size=list(size), chunksize=chunksize or CHUNK_SIZE, layers=table),
+    }
+    head = _header(manifest)
+
+    # DOC> 先写入临时文件再替换,存储失败或者被取消时不会破坏原有的文件
+    with utils.atomic_open(filepath, "wb") as f:
+        f.write(head)
+        for index, chunk in enumerate(ordered):
+            f.write(np.ascontiguousarray(chunk, dtype=DTYPE).tobytes())
+            if progress != None and (index + 1) % 1024 == 0:
+                progress(index + 1, len(ordered))
+        if progress != None:
+            progress(len(ordered), len(ordered))
+
+def read_manifest(filepath:str) -> dict:
+    '''只读取二进制文件的清单'''
+
+    with open(filepath, "rb") as f:
+        if f.read(len(MAGIC)) != MAGIC:
+            raise ValueError(f"{filepath}不是房间二进制文件")
+        version, length = struct.unpack("<II", f.read(8))
+        if version > VERSION:
+            raise ValueError(f"不支持的房间文件版本:{version}")
+        return json.loads(f.read(length).decode("utf-8"))
+
+def load_binary(filepath:str) -> tuple:
+    '''读取二进制文件,返回(工程数据, 房间数据, 层级名 > ChunkedTilemap)\n
+    数据区一次读入内存,分块是该数组的视图,读取之后文件不再被占用,可以直接存储回同一个路径'''
+
+    manifest = read_manifest(filepath)
+    room = manifest["room"]
+    size = tuple(room["size"])
+    chunksize = room["chunksize"]
+    count = sum(len(entries) for entries in room["layers"].values())
+    data = None
+    if count > 0:
+        # DOC> 不使用np.memmap,被映射的文件在Windows上无法被os.replace覆盖
+        data = np.fromfile(filepath, dtype=DTYPE, count=count * chunksize * chunksize, offset=manifest["dataOffset"])
+        if data.size != count * chunksize * chunksize:
+            raise ValueError(f"{filepath}的分块数据不完整")
+        data = data.reshape(count, chunksize, chunksize)
+
+    layers = dict()
+    index = 0
+    for name, entries in room["layers"].items():
+        storage = ChunkedTilemap(size, chunksize=chunksize)
+        for cx, cy, nonzero in entries:
+            storage.chunks[(cx, cy)] = data[index]
+            storage.counts[(cx, cy)] = nonzero
+            index += 1
+        layers[name] = storage
+    return manifest["project"], room, layers
+
+def json_to_binary(obj:dict, filepath:str) -> None:
+    '''将导出的JSON数据(工程数据+"room")转换为二进制文件'''
+
+    project = dict(obj)
+    room = project.pop("room")
+    size = tuple(room["size"])
+    layers = dict()
+    for name, cells in room["layers"].items():
+        layers[name] = ChunkedTilemap.from_cells(size, cells)
+    extra = {k:v for k, v in room.items() if k not in ("size", "layers")}
+    save_binary(filepath, project, size, layers, extra)
+
+def binary_to_json(filepath:str) -> dict:
+    '''将二进制文件转换为导出格式的JSON数据(工程数据+"room")'''
+
+    project, room, layers = load_binary(filepath)
+    obj = dict(project)
+    extra = {k:v for k, v in room.items() if k not in ("size", "layers", "chunksize")}
+    _layers = dict()
+    for name, storage in layers.items():
+        _layers[name] = storage.tolist()
+    obj["room"] = dict(extra, size=list(room["size"]), layers=_layers)
+    return obj
@@ -0,0 +1,296 @@
+# 房间管理器
+# 世界中的所有房间以网格坐标存放,并通过均匀网格空间索引进行范围查询,
+# 只有与视口相交的房间才会创建场景对象,离开视口的房间会被移出场景并打包为紧凑的数组,
+# 当前正在编辑的房间由RoomDrawingBuffer负责渲染,不会被管理器卸载
+
+from PyQt5.QtWidgets import *
+from PyQt5.QtCore import *
+from PyQt5.QtGui import *
+
+import math
+
+from Editor import EditorColor
+from EditorTools import ToolHelper
+from EditorTileAtlas import TileAtlas
+from EditorLayerRenderer import LayerRenderer
+from EditorRoomBuffer import RoomBuffer
+import utils
+
+
+def room_rect(pos:tuple, size:tuple) -> tuple:
+    '''房间覆盖的网格范围(x0, y0, x1, y1),不包含x1, y1\n
+    房间以pos为左下角向上延伸,因此覆盖的网格行为[pos.y - h, pos.y)'''
+
+    return pos[0], pos[1] - size[1], pos[0] + size[0], pos[1]
+
+def room_scenerect(pos:tuple, size:tuple, tilesize:tuple) -> QRectF:
+    '''房间在场景中的范围,与RoomDrawingBuffer的sourceRect一致(高度为负数)'''
+
+    tilew, tileh = tilesize
+    return QRectF(pos[0] * tilew, pos[1] * tileh, size[0] * tilew, -size[1] * tileh)
+
+
+class RoomView:
+    '''不在编辑中的房间的场景对象:房间边框以及每个层级的渲染器'''
+
+    def __init__(self, room: RoomBuffer, scene: QGraphicsScene, tilesize:tuple, atlas: TileAtlas, helper: ToolHelper):
+        self.room = room
+        self.scene = scene
+        self.tilesize = tilesize
+        self.atlas = atlas
+
+        origin = QPointF(room.pos[0] * tilesize[0], room.pos[1] * tilesize[1])
+        self.layers = list()
+        for idx, tilemap in enumerate(room.layers.values()):
+            layer = LayerRenderer(tilemap._tilemap, tilesize, origin, atlas)
+            layer.setZValue(idx)
+            scene.addItem(layer)
+            self.layers.append(layer)
+
+        self.border = helper.createbox(EditorColor.SLIENT_COLOR_PURPLE, style=Qt.DashLine)
+        self.border.setRect(room_scenerect(room.pos, room.size, tilesize))
+        scene.addItem(self.border)
+        self.refresh()
+
+    def refresh(self) -> None:
+        '''根据房间中使用的瓦片重新计算溢出边距并重绘所有分块'''
+
+        marginw, marginh = 0, 0
+        for tileId in self.room.used_tiles().tolist():
+            w, h = self.atlas.size(tileId)
+            marginw = max(marginw, w - self.tilesize[0])
+            marginh = max(marginh, h - self.tilesize[1])
+        for layer in self.layers:
+            layer.setMargin(marginw, marginh)
+            layer.markAll()
+            layer.flush()
+
+    def clear(self) -> None:
+        '''将房间的所有对象移出场景'''
+
+        for layer in self.layers:
+            self.scene.removeItem(layer)
+        self.scene.removeItem(self.border)
+        self.layers.clear()
+
+
+class RoomEntry:
+    '''世界中的一个房间'''
+
+    def __init__(self, roomId:int, room: RoomBuffer):
+        self.roomId = roomId
+        self.room = room
+        self.rect = room_rect(room.pos, room.size)
+        # DOC> 房间处于视口中并且不在编辑时的场景对象
+        self.view = None
+        # DOC> 切换编辑房间时保留的撤销/重做历史
+        self.history = None
+
+    def intersects(self, rect:tuple) -> bool:
+        x0, y0, x1, y1 = self.rect
+        return x0 < rect[2] and rect[0] < x1 and y0 < rect[3] and rect[1] < y1
+
+    def contains(self, x:int, y:int) -> bool:
+        x0, y0, x1, y1 = self.rect
+        return x0 <= x < x1 and y0 <= y < y1
+
+
+class RoomManager(QObject):
+    '''管理世界中的所有房间'''
+
+    def __init__(self, scene: QGraphicsScene, tilesize:tuple, atlas: TileAtlas, helper: ToolHelper, cellsize=64, budget=8):
+        '''@param cellsize 空间索引中每个格子的边长(瓦片单位)
+        @param budget 每一帧最多为多少个房间创建场景对象,其余的房间在之后的帧中逐步创建'''
+
+        super().__init__(None)
+        self.scene = scene
+        self.tilesize = tilesize
+        self.atlas = atlas
+        self.helper = helper
+        self.cellsize = cellsize
+        self.budget = budget
+
+        self.counter = utils.Counter()
+        self.entries = dict()
+        # DOC> 空间索引 (bx, by) > {roomId, ...}
+        self.grid = dict()
+        self.activeId = None
+        # DOC> 当前视口(网格坐标,已经向外扩展)以及需要显示的房间
+        self.viewport = None
+        self.visible = set()
+        self.pending = list()
+
+        self.timer = QTimer(self)
+        self.timer.setInterval(0)
+        self.timer.timeout.connect(self._build_pending)
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+    def __iter__(self):
+        return iter(self.entries.values())
+
+    @property
+    def active(self) -> RoomEntry:
+        return self.entries.get(self.activeId)
+
+    def _cells(self, rect:tuple):
+        '''遍历与网格范围相交的所有空间索引格子'''
+
+        size = self.cellsize
+        for bx in range(rect[0] // size, (rect[2] - 1) // size + 1):
+            for by in range(rect[1] // size, (rect[3] - 1) // size + 1):
+                yield bx, by
+
+    def query(self, rect:tuple) -> list:
+        '''返回与网格范围(x0, y0, x1, y1)相交的所有房间'''
+
+        ids = set()
+        for cell in self._cells(rect):
+            ids.update(self.grid.get(cell, ()))
+        return [self.entries[roomId] for roomId in ids if self.entries[roomId].intersects(rect)]
+
+    def at(self, gridpos: QPoint) -> RoomEntry:
+        '''返回包含网格坐标gridpos的房间,不存在时返回None'''
+
+        x, y = gridpos.x(), gridpos.y()
+        for roomId in self.grid.get((x // self.cellsize, y // self.cellsize), ()):
+            entry = self.entries[roomId]
+            if entry.contains(x, y):
+                return entry
+        return None
+
+    def overlaps(self, pos:tuple, size:tuple) -> bool:
+        '''测试一个新的房间是否会与已有的房间重叠'''
+
+        return len(self.query(room_rect(pos, size))) > 0
+
+    def add(self, room: RoomBuffer) -> RoomEntry:
+        '''将一个房间加入世界'''
+
+        entry = RoomEntry(self.counter.next_id, room)
+        self.entries[entry.roomId] = entry
+        for cell in self._cells(entry.rect):
+            self.grid.setdefault(cell, set()).add(entry.roomId)
+        if self.viewport != None:
+            self.update_viewport()
+        return entry
+
+    def remove(self, roomId:int) -> RoomBuffer:
+        '''将一个房间移出世界'''
+
+        entry = self.entries.pop(roomId)
+        for cell in self._cells(entry.rect):
+            ids = self.grid.get(cell)
+            ids.discard(roomId)
+            if len(ids) == 0:
+                self.grid.pop(cell)
+        self._hide(entry)
+        self.visible.discard(roomId)
+        if self.activeId == roomId:
+            self.activeId = None
+        self.counter.recycle(roomId)
+        return entry.room
+
+    def setActive(self, entry: RoomEntry) -> RoomBuffer:
+        '''将一个房间设置为当前编辑的房间,返回其房间数据,之前编辑的房间按照视口重新显示'''
+
+        previous = self.active
+        self.activeId = None if entry is None else entry.roomId
+        if entry != None:
+            self._hide(entry)
+            entry.room.unpack()
+        if self.viewport != None:
+            self.update_viewport()
+            if previous != None and previous is not entry and previous.roomId not in self.visible:
+                previous.room.pack()
+        return None if entry is None else entry.room
+
+    def _show(self, entry: RoomEntry) -> None:
+        if entry.view is None:
+            entry.room.unpack()
+            entry.view = RoomView(entry.room, self.scene, self.tilesize, self.atlas, self.helper)
+
+    def _hide(self, entry: RoomEntry) -> None:
+        if entry.view != None:
+            entry.view.clear()
+            entry.view = None
+
+    def update_viewport(self, rect=None) -> None:
+        '''根据视口(场景坐标)更新需要显示的房间\n
+        视口向四周扩展半个视口,离开扩展范围的房间立即被移出场景并打包,进入范围的房间由近到远逐帧创建'''
+
+        if rect != None:
+            tilew, tileh = self.tilesize
+            x0, y0 = math.floor(rect.left() / tilew), math.floor(rect.top() / tileh)
+            x1, y1 = math.ceil(rect.right() / tilew), math.ceil(rect.bottom() / tileh)
+            mx, my = (x1 - x0) // 2 + 1, (y1 - y0) // 2 + 1
+            self.viewport = (x0 - mx, y0 - my, x1 + mx, y1 + my)
+        if self.viewport is None:
+            return
+
+        entries = [entry for entry in self.query(self.viewport) if entry.roomId != self.activeId]
+        visible = set(entry.roomId for entry in entries)
+        for roomId in self.visible - visible:
+            entry = self.entries.get(roomId)
+            if entry != None and roomId != self.activeId:
+                self._hide(entry)
+                entry.room.pack()
+        self.visible = visible
+
+        cx, cy = (self.viewport[0] + self.viewport[2]) / 2, (self.viewport[1] + self.viewport[3]) / 2
+        def distance(entry: RoomEntry) -> float:
+            x0, y0, x1, y1 = entry.rect
+            return max(x0 - cx, cx - x1, 0) + max(y0 - cy, cy - y1, 0)
+        self.pending = sorted((entry for entry in entries if entry.view is None), key=distance, reverse=True)
+        self._build_pending()
+
+    def _build_pending(self) -> None:
+        '''为一批等待显示的房间创建场景对象'''
+
+        for _ in range(min(self.budget, len(self.pending))):
+            entry = self.pending.pop()
+            if entry.roomId in self.visible and entry.roomId in self.entries:
+                self._show(entry)
+        if len(self.pending) > 0:
+            self.timer.start()
+        else:
+            self.timer.stop()
+
+    def usage_count(self, tileId:int) -> int:
+        '''某种瓦片在所有房间中的使用次数'''
+
+        return sum(entry.room.usage_count(tileId) for entry in self.entries.values())
+
+    def clear_tile(self, tileId:int) -> None:
+        '''从所有不在编辑中的房间中擦除某种瓦片并丢弃它们的撤销/重做历史\n
+        被删除瓦片的id会被回收给新的瓦片,即使房间当前没有使用该瓦片,历史记录中也可能保存着这个id'''
+
+        for entry in self.entries.values():
+            if entry.roomId == self.activeId:
+                continue
+            entry.history = None
+            if entry.room.usage_count(tileId) > 0:
+                entry.room.clear_tile(tileId)
+                if entry.view != None:
+                    entry.view.refresh()
+
+    def refresh(self, tileIds:set) -> None:
+        '''一组瓦片的图像发生变化之后重绘使用了这些瓦片的房间'''
+
+        for entry in self.entries.values():
+            if entry.view != None and any(entry.room.usage_count(tileId) > 0 for tileId in tileIds):
+                entry.view.refresh()
+
+    def clear(self) -> None:
+        '''移除所有的房间'''
+
+        self.timer.stop()
+        self.pending.clear()
+        for entry in self.entries.values():
+            self._hide(entry)
+        self.entries.clear()
+        self.grid.clear()
+        self.visible.clear()
+        self.activeId = None
+        self.counter = utils.Counter()
@@ -0,0 +1,106 @@
+# 缩略图缓存
+# 瓦片面板中的每个label都需要一张缩放后的瓦片图像,缩放结果以(瓦片id, label尺寸)为键缓存起来,
+# 内存中的缓存按照最近最少使用的顺序淘汰,磁盘缓存是可选的,设置folder之后缩略图会以png的形式存放在该目录中,
+# 同一个目录可能被多个工程共用,因此磁盘缓存的文件名中包含源文件路径的哈希值
+
+from PyQt5.QtCore import *
+from PyQt5.QtGui import *
+
+import os
+import glob
+import hashlib
+from collections import OrderedDict
+
+
+def scale_thumbnail(picture: QPixmap, size:tuple) -> QPixmap:
+    '''按照label的尺寸缩放图像,竖长的图像以高度为准,其他的以宽度为准'''
+
+    if picture.height() > picture.width():
+        return picture.scaledToHeight(size[1])
+    return picture.scaledToWidth(size[0])
+
+
+class ThumbnailCache:
+    '''缩略图缓存'''
+
+    def __init__(self, capacity=4096, folder=None):
+        '''@param capacity 内存中最多缓存的缩略图数量
+        @param folder 磁盘缓存的目录,为None时不使用磁盘缓存'''
+
+        self.capacity = capacity
+        self.folder = folder
+
+        # DOC> (key, w, h) > (原图的cacheKey, 缩略图), 按照使用顺序排列,最近使用的在最后
+        self.items = OrderedDict()
+
+    def _diskpath(self, key, size:tuple, source:str) -> str:
+        '''磁盘缓存的路径,不同工程中id相同但源文件不同的瓦片使用不同的文件'''
+
+        digest = hashlib.sha1(os.path.normcase(os.path.abspath(source or "")).encode("utf-8")).hexdigest()[:16]
+        return os.path.join(self.folder, f"{key}_{digest}_{size[0]}x{size[1]}.png")
+
+    def _load_disk(self, key, size:tuple, source:str) -> QPixmap:
+        '''读取磁盘缓存,缓存比源文件旧时视为无效'''
+
+        if self.folder is None:
+            return None
+        path = self._diskpath(key, size, source)
+        try:
+            if source != None and os.path.getmtime(path) < os.path.getmtime(source):
+                return None
+        except OSError:
+            return None
+        pixmap = QPixmap(path)
+        return None if pixmap.isNull() else pixmap
+
+    def _save_disk(self, key, size:tuple, source:str, thumbnail: QPixmap) -> None:
+        if self.folder is None:
+            return
+        try:
+            os.makedirs(self.folder, exist_ok=True)
+            thumbnail.save(self._diskpath(key, size, source))
+        except OSError:
+            pass
+
+    def get(self, key, picture: QPixmap, size:tuple, source=None) -> QPixmap:
+        '''获取picture的缩略图
+        @param key 缓存键,一般为瓦片id
+        @param picture 原图,原图发生变化(cacheKey不同)时缓存失效
+        @param size label的尺寸
+        @param source 原图的文件路径,用于判断磁盘缓存是否过期'''
+
+        index = (key, size[0], size[1])
+        stamp = picture.cacheKey()
+        entry = self.items.get(index)
+        if entry != None and entry[0] == stamp:
+            self.items.move_to_end(index)
+            return entry[1]
+
+        thumbnail = self._load_disk(key, size, source)
+        if thumbnail is None:
+            if picture.isNull():
+                # DOC> 原图尚未加载并且没有磁盘缓存,不进行缓存
+                return picture
+            thumbnail = scale_thumbnail(picture, size)
+            self._save_disk(key, size, source, thumbnail)
+
+        self.items[index] = (stamp, thumbnail)
+        self.items.move_to_end(index)
+        while len(self.items) > self.capacity:
+            self.items.popitem(last=False)
+        return thumbnail
+
+    def discard(self, key) -> None:
+        '''删除某个键的所有缩略图,瓦片被删除之后id会被回收,需要同时清除缓存'''
+
+        for index in [_ for _ in self.items if _[0] == key]:
+            self.items.pop(index)
+        if self.folder != None:
+            for path in glob.glob(os.path.join(glob.escape(self.folder), f"{key}_*.png")):
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+
+    def clear(self) -> None:
+        self.items.clear()
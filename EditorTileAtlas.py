@@ -0,0 +1,148 @@
+# 瓦片图集
+# 将瓦片管理器中所有的瓦片打包到一张或者少量几张图集页中,并记录瓦片id到图集子区域的查找表,
+# 渲染时同一张图集页上的所有瓦片可以通过一次QPainter.drawPixmapFragments完成绘制
+
+from PyQt5.QtCore import *
+from PyQt5.QtGui import *
+
+
+class AtlasPage:
+    '''图集页,使用货架算法(shelf packing)从上到下逐行放置瓦片'''
+
+    def __init__(self, size:tuple):
+        self.width, self.height = size
+        self.pixmap = QPixmap(*size)
+        self.pixmap.fill(Qt.transparent)
+
+        # DOC> 当前货架的起点与高度
+        self.shelfx = 0
+        self.shelfy = 0
+        self.shelfh = 0
+
+        # DOC> (w, h) > [QRect], 被删除的瓦片留下的空位,相同尺寸的瓦片可以直接复用
+        self.freeRects = dict()
+
+    def allocate(self, w:int, h:int) -> QRect:
+        '''分配一块w*h的区域,如果空间不足则返回None'''
+
+        slots = self.freeRects.get((w, h))
+        if slots:
+            return slots.pop()
+        if w > self.width or h > self.height:
+            return None
+        if self.shelfx + w > self.width:
+            self.shelfy += self.shelfh
+            self.shelfx, self.shelfh = 0, 0
+        if self.shelfy + h > self.height:
+            return None
+        rect = QRect(self.shelfx, self.shelfy, w, h)
+        self.shelfx += w
+        self.shelfh = max(self.shelfh, h)
+        return rect
+
+    def release(self, rect: QRect):
+        '''回收一块区域'''
+
+        self.freeRects.setdefault((rect.width(), rect.height()), list()).append(rect)
+
+    def blit(self, rect: QRect, pixmap: QPixmap, padding:int):
+        '''将瓦片绘制到图集页的指定区域,并将瓦片边缘的像素向外扩展padding个像素,
+        避免缩放绘制时采样到相邻瓦片的像素'''
+
+        painter = QPainter(self.pixmap)
+        painter.setCompositionMode(QPainter.CompositionMode_Source)
+        painter.fillRect(rect.adjusted(-padding, -padding, padding, padding), Qt.transparent)
+        for dx in range(-padding, padding + 1):
+            for dy in range(-padding, padding + 1):
+                if dx != 0 or dy != 0:
+                    painter.drawPixmap(rect.topLeft() + QPoint(dx, dy), pixmap)
+        painter.drawPixmap(rect.topLeft(), pixmap)
+        painter.end()
+
+
+class TileAtlas:
+    '''瓦片图集,管理所有的图集页以及瓦片id > (图集页, 子区域)的查找表'''
+
+    def __init__(self, pagesize=(1024, 1024), padding=1):
+        self.pagesize = pagesize
+        self.padding = padding
+        self.pages = list()
+
+        # DOC> 瓦片id > (图集页索引, QRectF)
+        self.rects = dict()
+
+    def __contains__(self, tileId:int) -> bool:
+        return tileId in self.rects
+
+    def add(self, tileId:int, pixmap: QPixmap) -> bool:
+        '''将瓦片打包到图集中,如果瓦片已经存在则更新其图像'''
+
+        if pixmap is None or pixmap.isNull():
+            return False
+        w, h = pixmap.width(), pixmap.height()
+        if tileId in self.rects:
+            index, rect = self.rects[tileId]
+            if rect.width() == w and rect.height() == h:
+                self.pages[index].blit(rect.toRect(), pixmap, self.padding)
+                return True
+            self.remove(tileId)
+
+        p = self.padding
+        for index, page in enumerate(self.pages):
+            slot = page.allocate(w + 2 * p, h + 2 * p)
+            if slot is not None:
+                break
+        else:
+            # DOC> 超过图集页尺寸的瓦片单独占用一页
+            page = AtlasPage((max(w + 2 * p, self.pagesize[0]), max(h + 2 * p, self.pagesize[1])))
+            self.pages.append(page)
+            index, slot = len(self.pages) - 1, page.allocate(w + 2 * p, h + 2 * p)
+        rect = slot.adjusted(p, p, -p, -p)
+        page.blit(rect, pixmap, p)
+        self.rects[tileId] = (index, QRectF(rect))
+        return True
+
+    def remove(self, tileId:int) -> None:
+        '''从图集中删除瓦片,瓦片占用的区域留给之后的瓦片使用'''
+
+        info = self.rects.pop(tileId, None)
+        if info is not None:
+            index, rect = info
+            p = self.padding
+            self.pages[index].release(rect.toRect().adjusted(-p, -p, p, p))
+
+    def clear(self) -> None:
+        self.pages.clear()
+        self.rects.clear()
+
+    def rect(self, tileId:int) -> QRectF:
+        info = self.rects.get(tileId)
+        return None if info is None else info[1]
+
+    def size(self, tileId:int) -> tuple:
+        '''瓦片的尺寸(w, h)'''
+
+        info = self.rects.get(tileId)
+        if info is None:
+            return 0, 0
+        return int(info[1].width()), int(info[1].height())
+
+    def paint(self, painter: QPainter, xs, bottoms, tileIds) -> None:
+        '''以底部对齐的方式绘制一组瓦片,(xs[i], bottoms[i])为第i块瓦片的左下角坐标,瓦片严格按照给定的顺序绘制\n
+        连续位于同一张图集页中的瓦片合并为一次drawPixmapFragments调用,图集页改变时先绘制之前的瓦片,
+        因此相互重叠的溢出瓦片即使位于不同的图集页,叠放顺序也与逐块绘制相同'''
+
+        page, frags = None, list()
+        for x, bottom, tileId in zip(xs, bottoms, tileIds):
+            info = self.rects.get(tileId)
+            if info is None:
+                continue
+            index, rect = info
+            if index != page:
+                if len(frags) > 0:
+                    painter.drawPixmapFragments(frags, self.pages[page].pixmap)
+                page, frags = index, list()
+            center = QPointF(x + rect.width() / 2, bottom - rect.height() / 2)
+            frags.append(QPainter.PixmapFragment.create(center, rect))
+        if len(frags) > 0:
+            painter.drawPixmapFragments(frags, self.pages[page].pixmap)
@@ -0,0 +1,126 @@
+# 瓦片图像加载器
+# 打开工程时在线程池中将瓦片文件解码为QImage,主线程定时分批将QImage转换为QPixmap并打包到图集中,
+# QPixmap只能在主线程中创建,因此解码与转换被拆分到两个阶段
+
+from PyQt5.QtCore import *
+from PyQt5.QtGui import *
+
+import queue
+
+
+class _DecodeTask(QRunnable):
+    '''在工作线程中解码一组瓦片文件'''
+
+    def __init__(self, loader, tiles:list):
+        super().__init__()
+        self.setAutoDelete(False)
+        self.loader = loader
+        self.tiles = tiles
+
+    def run(self):
+        for tile in self.tiles:
+            if self.loader.cancelled:
+                return
+            self.loader.results.put((tile, QImage(tile.filepath)))
+
+
+class TileLoader(QObject):
+    '''瓦片图像加载器,瓦片对象预先创建,图像解码完成后才会被赋予pixmap并加入图集'''
+
+    progress = pyqtSignal(int, int)
+    '''已经完成的瓦片数量与瓦片总数'''
+
+    tilesLoaded = pyqtSignal(list)
+    '''一批瓦片的图像已经可以使用'''
+
+    finished = pyqtSignal(int)
+    '''所有瓦片处理完毕,参数为丢失的瓦片文件数量'''
+
+    def __init__(self, atlas, batch=64, interval=15, pool=None):
+        '''@param atlas 瓦片图集,瓦片加载完成后加入图集
+        @param batch 主线程每次最多转换的瓦片数量
+        @param interval 主线程转换的时间间隔(毫秒)'''
+
+        super().__init__(None)
+        self.atlas = atlas
+        self.batch = batch
+        self.pool = pool or QThreadPool.globalInstance()
+        self.results = queue.Queue()
+        self.tasks = list()
+        self.cancelled = False
+        self.total = 0
+        self.done = 0
+        self.missingCount = 0
+
+        self.timer = QTimer(self)
+        self.timer.setInterval(interval)
+        self.timer.timeout.connect(self._drain)
+
+    @property
+    def isFinished(self) -> bool:
+        return self.done >= self.total
+
+    def start(self, tiles:list):
+        '''开始在线程池中解码给定的瓦片'''
+
+        self.total = len(tiles)
+        # DOC> 每个线程分到若干个任务,避免单个任务过大时其他线程空闲
+        count = min(self.total, self.pool.maxThreadCount() * 4)
+        for i in range(count):
+            task = _DecodeTask(self, tiles[i::count])
+            self.tasks.append(task)
+            self.pool.start(task)
+        self.timer.start()
+
+    def cancel(self):
+        '''停止加载,已经在解码中的瓦片会被丢弃'''
+
+        self.cancelled = True
+        self.timer.stop()
+
+    def _accept(self, tile, image: QImage) -> None:
+        '''在主线程中将解码结果转换为QPixmap'''
+
+        self.done += 1
+        if image.isNull():
+            self.missingCount += 1
+            return
+        tile.pixmap = QPixmap.fromImage(image)
+        self.atlas.add(tile.tileId, tile.pixmap)
+
+    def _drain(self) -> None:
+        '''定时回调,转换一批已经解码完成的瓦片'''
+
+        tiles = list()
+        while len(tiles) < self.batch:
+            try:
+                tile, image = self.results.get_nowait()
+            except queue.Empty:
+                break
+            self._accept(tile, image)
+            if not image.isNull():
+                tiles.append(tile)
+        self._emit(tiles)
+
+    def _emit(self, tiles:list) -> None:
+        if self.cancelled:
+            return
+        if len(tiles) > 0:
+            self.tilesLoaded.emit(tiles)
+        self.progress.emit(self.done, self.total)
+        if self.isFinished and self.timer.isActive():
+            self.timer.stop()
+            self.tasks.clear()
+            self.finished.emit(self.missingCount)
+
+    def wait(self) -> int:
+        '''阻塞直到所有瓦片加载完成,返回丢失的瓦片文件数量'''
+
+        tiles = list()
+        while not self.isFinished and not self.cancelled:
+            tile, image = self.results.get()
+            self._accept(tile, image)
+            if not image.isNull():
+                tiles.append(tile)
+        self._emit(tiles)
+        return self.missingCount
@@ -21,6 +21,7 @@ class EditorTileWindow(EuclidWindow):
         self.tileContainer = EditorLabelContainer(labelSize=labelSize)
         self.tileContainer.setObjectName("EditorTileBox")
         self.tileContainer.onLabelChoosed.connect(self.choosetile)
+        self.tileContainer.describe = self.describe
 
         self.tileliblist = EditorListBox()
         self.tileliblist.elemButtonClicked.connect(self.removelib)
@@ -47,6 +48,7 @@ class EditorTileWindow(EuclidWindow):
         设置所有部件的回调函数,以及渲染工程中的瓦片库信息'''
 
         self.project = project
+        self.tileContainer.thumbnails = project.tileManager.thumbnails
         self.tileContainer.clear()
         self.tileliblist.clear()
         for lib in self.project.tileManager.libs:
@@ -54,6 +56,15 @@ class EditorTileWindow(EuclidWindow):
         if project.tileManager.currentlib != None:
             self.tileContainer.render(project.tileManager.currentlib.render_infos)
 
+    def refresh_tiles(self, tiles:list) -> None:
+        '''一组瓦片的图像加载完成之后刷新当前瓦片库中对应的label'''
+
+        if self.project is None or self.project.tileManager.currentlib is None:return
+        tileIds = set(tile.tileId for tile in tiles)
+        for index, tile in enumerate(self.project.tileManager.currentlib.tiles):
+            if tile.tileId in tileIds:
+                self.tileContainer.update_label(index, tile.render_info)
+
     def addlib(self) -> None:
         '''追加一个新的瓦片库'''
 
@@ -70,8 +81,13 @@ class EditorTileWindow(EuclidWindow):
 
         if self.project is None:return
         index, lib = self.project.tileManager.findLib(name)
-        if lib != None and qtutils.question(None,"删除瓦片库",f"是否确认删除库:{lib.name}"):
-            self.project.tileManager.removeLib(index)
+        if lib is None:return
+        used = self.project.lib_usage(lib)
+        if len(used) > 0:
+            qtutils.information(None, "删除瓦片库", f"瓦片库<{lib.name}>中有{len(used)}块瓦片在房间中被使用了{sum(used.values())}次,无法删除")
+            return
+        if qtutils.question(None,"删除瓦片库",f"是否确认删除库:{lib.name}"):
+            self.project.removelib(index)
             self.tileliblist.takeItem(index)
             libidx = self.tileliblist.currentRow()
             if libidx < 0:
@@ -112,12 +128,29 @@ class EditorTileWindow(EuclidWindow):
             if len(failedlist) > 0:
                 qtutils.information(None, "导入瓦片", f"{len(failedlist)}个文件导入失败")
 
-    def removetile(self, index:int) -> None:
-        '''从当前瓦片库中删除一张选中的瓦片
+    def removetile(self, index=None) -> None:
+        '''从当前瓦片库中删除一张选中的瓦片,index为None时删除当前选中的瓦片
         NOTE> 该函数需要与编辑器通过工程文件进行联动'''
 
-        if self.project is None:return
-        self.tileContainer.render(self.project.removetile(index))
+        if self.project is None or self.project.tileManager.currentlib is None:return
+        if index is None:
+            index = self.tileContainer.choosedIndex
+        tiles = self.project.tileManager.currentlib.tiles
+        if index < 0 or index >= len(tiles):
+            return
+        tile = tiles[index]
+        infos = self.project.removetile(index)
+        if infos is None:
+            qtutils.information(None, "删除瓦片", f"瓦片<{tile.tileName}>在房间中被使用了{self.project.usage(tile.tileId)}次,无法删除")
+            return
+        self.tileContainer.render(infos)
+
+    def describe(self, info:tuple) -> str:
+        '''label的提示信息,显示瓦片名以及被房间使用的次数'''
+
+        if self.project is None or len(info) < 3:
+            return info[0]
+        return f"{info[0]}\n使用次数:{self.project.usage(info[2])}"
 
     def choosetile(self, index:int) -> None:
         '''当前瓦片被选中的时候执行该回调函数
@@ -17,6 +17,7 @@ class ToolType:
     MARQUEE = 3
     COPY = 4
     MOVE = 5
+    FILL = 6
     ROOMCREATOR = -1
     TILE_PICKER = -2
 
@@ -241,7 +242,8 @@ class RoomCreatorTool(ITool):
 
 class PenTool(ITool):
 
-    drawMoved = pyqtSignal(QPointF, QPoint)
+    strokeMoved = pyqtSignal(QPoint, QPoint)
+    '''笔画经过的线段(上一次的网格坐标, 当前的网格坐标),按下鼠标时两个坐标相同'''
 
     def __init__(self, view: EditorView, scene: EuclidSceneGrid, helper: ToolHelper):
         super().__init__(view, scene, "铅笔", ToolType.PEN, helper)
@@ -250,17 +252,20 @@ class PenTool(ITool):
         self.tileId = 0
         self.indicator = QGraphicsPixmapItem(self.defaultpixmap)
         self.indicator.setZValue(100)
+        self.lastgridpos = None
 
     def __draw(self, event:QMouseEvent):
-        '''点击或者拖动时发送绘制请求'''
+        '''点击或者拖动时发送绘制请求,鼠标停留在同一个格子中时不重复发送'''
 
         scenepos,gridpos = self.compute_positions(event)
         self.indicator.setPos(scenepos)
-        if self.canDraw:
-            self.drawMoved.emit(scenepos, gridpos)
+        if self.canDraw and gridpos != self.lastgridpos:
+            self.strokeMoved.emit(gridpos if self.lastgridpos is None else self.lastgridpos, gridpos)
+            self.lastgridpos = gridpos
 
     def onClick(self, event: QMouseEvent, isNotMoving: bool):
         super().onClick(event, isNotMoving)
+        self.lastgridpos = None
         self.__draw(event)
 
     def onMove(self, event: QMouseEvent):
@@ -272,22 +277,26 @@ class PenTool(ITool):
 
 class EraserTool(ITool):
 
-    drawMoved = pyqtSignal(QPointF, QPoint)
+    strokeMoved = pyqtSignal(QPoint, QPoint)
+    '''笔画经过的线段(上一次的网格坐标, 当前的网格坐标),按下鼠标时两个坐标相同'''
 
     def __init__(self, view: EditorView, scene: EuclidSceneGrid, helper: ToolHelper):
         super().__init__(view, scene, "橡皮", ToolType.EARSE, helper)
         self.indicator.setZValue(101)
+        self.lastgridpos = None
 
     def __draw(self, event:QMouseEvent):
-        '''点击或者拖动时发送绘制请求'''
+        '''点击或者拖动时发送绘制请求,鼠标停留在同一个格子中时不重复发送'''
 
         scenepos,gridpos = self.compute_positions(event)
         self.indicator.setPos(scenepos)
-        if self.canDraw:
-            self.drawMoved.emit(scenepos, gridpos)
+        if self.canDraw and gridpos != self.lastgridpos:
+            self.strokeMoved.emit(gridpos if self.lastgridpos is None else self.lastgridpos, gridpos)
+            self.lastgridpos = gridpos
 
     def onClick(self, event: QMouseEvent, isNotMoving: bool):
         super().onClick(event, isNotMoving)
+        self.lastgridpos = None
         self.__draw(event)
 
     def onMove(self, event: QMouseEvent):
@@ -408,6 +417,39 @@ class MoveTool(ITool):
         super().onRelease(event)
 
 
+class FillTool(ITool):
+    '''填充工具,将与点击位置相连并且瓦片相同的区域填充为当前瓦片'''
+
+    clicked = pyqtSignal(QPoint, bool)
+    '''点击的网格坐标,以及是否填充房间中所有相同的瓦片(按住Ctrl点击)'''
+
+    def __init__(self, view: EditorView, scene: EuclidSceneGrid, helper: ToolHelper):
+        super().__init__(view, scene, "填充", ToolType.FILL, helper, EditorColor.EYECATCH_COLOR_CYAN)
+        self.indicator.setZValue(103)
+        # DOC> 4连通或者8连通
+        self.connectivity = 4
+
+    def toggleConnectivity(self) -> int:
+        '''在4连通与8连通之间切换'''
+
+        self.connectivity = 8 if self.connectivity == 4 else 4
+        return self.connectivity
+
+    def onClick(self, event: QMouseEvent, isNotMoving:bool):
+        super().onClick(event, isNotMoving)
+        scenepos, gridpos = self.compute_positions(event)
+        self.indicator.setPos(scenepos)
+        if self.canDraw:
+            self.clicked.emit(gridpos, bool(event.modifiers() & Qt.ControlModifier))
+
+    def onMove(self, event: QMouseEvent):
+        super().onMove(event)
+        scenepos,gridpos = self.compute_positions(event)
+        self.indicator.setPos(scenepos)
+
+    def onRelease(self, event: QMouseEvent):
+        super().onRelease(event)
+
 class TilePickerTool(ITool):
 
     clicked = pyqtSignal(QPointF, QPoint)
@@ -4,6 +4,7 @@ from PyQt5.QtCore import *
 
 from Euclid.Euclid import *
 import math
+from collections import OrderedDict
 
 
 class Zoom:
@@ -30,6 +31,51 @@ class Zoom:
                 return self.zoom_clamp,self.zoomout_factor
         return False,None
 
+class RenderProfile:
+    '''视图的渲染质量/性能配置'''
+
+    def __init__(self, name, title, updateMode, renderHints, cacheMode=QGraphicsView.CacheNone, optimizationFlags=0, itemCacheMode=QGraphicsItem.DeviceCoordinateCache):
+        ''' @name: 配置名
+        @title: 在菜单中显示的名称
+        @updateMode: 视口的更新模式,决定场景变化之后重绘视口中的哪些区域
+        @renderHints: 视图的渲染提示
+        @cacheMode: 视图的缓存模式,缓存背景时平移视图不需要重绘网格
+        @optimizationFlags: 视图的优化选项
+        @itemCacheMode: 场景中启用了缓存的Item使用的缓存模式'''
+
+        self.name = name
+        self.title = title
+        self.updateMode = updateMode
+        self.renderHints = renderHints
+        self.cacheMode = cacheMode
+        self.optimizationFlags = optimizationFlags
+        self.itemCacheMode = itemCacheMode
+
+# DOC> 预设的渲染配置,括号中为Benchmark/bench_viewport.py测得的鼠标移动延迟(1400x900视口,缩放1.0/2.0,平均值)
+# DOC> 高质量: 每次变化都重绘整个视口,并且开启全部抗锯齿与平滑缩放,与之前的默认设置一致,每次移动重绘约126万像素 (2.8ms/23ms)
+RENDER_QUALITY = RenderProfile("quality", "高质量",
+    QGraphicsView.FullViewportUpdate,
+    QPainter.Antialiasing|QPainter.HighQualityAntialiasing|QPainter.TextAntialiasing|QPainter.SmoothPixmapTransform)
+# DOC> 均衡: 由Qt根据变化区域的大小决定重绘的方式,保留线条抗锯齿,缓存背景网格 (0.11ms/0.23ms)
+RENDER_BALANCED = RenderProfile("balanced", "均衡",
+    QGraphicsView.SmartViewportUpdate,
+    QPainter.Antialiasing|QPainter.TextAntialiasing,
+    QGraphicsView.CacheBackground)
+# DOC> 像素: 只重绘变化的区域,不进行抗锯齿与平滑缩放,分块以瓦片原始分辨率缓存并以最近邻的方式缩放,适合像素风格的瓦片,分块的缓存占用不随缩放增加 (0.10ms/0.09ms)
+RENDER_PIXEL = RenderProfile("pixel", "像素",
+    QGraphicsView.MinimalViewportUpdate,
+    QPainter.TextAntialiasing,
+    QGraphicsView.CacheBackground,
+    QGraphicsView.DontAdjustForAntialiasing,
+    QGraphicsItem.ItemCoordinateCache)
+# DOC> 性能: 以所有变化区域的包围盒重绘,关闭所有渲染提示并且不再保存绘制状态 (0.10ms/0.23ms)
+RENDER_PERFORMANCE = RenderProfile("performance", "性能",
+    QGraphicsView.BoundingRectViewportUpdate,
+    QPainter.RenderHints(),
+    QGraphicsView.CacheBackground,
+    QGraphicsView.DontAdjustForAntialiasing|QGraphicsView.DontSavePainterState)
+RENDER_PROFILES = [RENDER_QUALITY, RENDER_BALANCED, RENDER_PIXEL, RENDER_PERFORMANCE]
+
 class EuclidSceneGrid(QGraphicsScene):
     '''提供一个用于绘制背景板的场景'''
 
@@ -40,10 +86,18 @@ class EuclidSceneGrid(QGraphicsScene):
         size = (32000,32000),
         cellsize = (16, 16),
         lcellsize = 10,
+        minCellPixels = 4,
+        maxTextureSize = 512,
+        textureSize = 256,
+        cacheSize = 4,
         parent = None):
-        ''' 初始化基本的参数,并绘制完整的场景网格线
+        ''' 初始化基本的参数,网格以纹理的形式按照缩放级别缓存
         @cellsize: 一个小的格子的尺寸
-        @lcellsize: 一个大的格子的边长是多少个小格子'''
+        @lcellsize: 一个大的格子的边长是多少个小格子
+        @minCellPixels: 格子在屏幕上小于多少像素时不再绘制这一级的网格线
+        @maxTextureSize: 一个大格子在屏幕上超过多少像素时直接绘制网格线而不使用纹理
+        @textureSize: 纹理的最小边长(像素),纹理中包含足够多的大格子以达到这个尺寸
+        @cacheSize: 最多缓存多少个缩放级别的纹理'''
 
         super().__init__(parent=parent)
         self.size = size
@@ -51,36 +105,87 @@ class EuclidSceneGrid(QGraphicsScene):
         self.setBackgroundBrush(bgcolor)                                                # 设置背景笔刷色彩
         self.cellw,self.cellh = cellsize                                                        # 网格尺寸
         self.largeCellW,self.largeCellH = self.cellw * lcellsize, self.cellh * lcellsize
+        self.lcellsize = lcellsize
         self.pen_lt = QPen(ltcolor, 0.5)
         self.pen_hv = QPen(hvcolor, 0.8)
+        self.pen_axis = QPen(QColor("#00ffa5"))
+        self.minCellPixels = minCellPixels
+        self.maxTextureSize = maxTextureSize
+        self.textureSize = textureSize
+        self.cacheSize = cacheSize
+        # DOC> 启用了缓存的Item使用的缓存模式,由视图的渲染配置决定
+        self.itemCacheMode = QGraphicsItem.DeviceCoordinateCache
+        # DOC> (x方向缩放, y方向缩放) > (纹理, 场景中的宽度, 高度), 最近使用的在最后
+        self.gridCache = OrderedDict()
 
-    def drawBackground(self,painter,rect):
-        '''绘制背景'''
-        super().drawBackground(painter,rect)
-        lines = list()
-        l = int(math.floor(rect.left()))
-        r = int(math.ceil(rect.right()))
-        t = int(math.floor(rect.top()))
-        b = int(math.ceil(rect.bottom()))
+    def grid_texture(self,sx,sy):
+        '''获取某个缩放级别的网格纹理,返回(纹理, 纹理在场景中的宽度, 高度),格子太小时返回None\n
+        纹理以设备像素绘制,包含若干个完整的大格子,并且多出一个像素与下一块纹理重叠,避免舍入产生缝隙'''
 
-        left = l - (l % self.cellw)
-        top = t - (t % self.cellh)
-        for x in range(left,r,self.cellw):
-            lines.append(QLine(x,t,x,b))
-        for y in range(top,b,self.cellh):
-            lines.append(QLine(l,y,r,y))
-        painter.setPen(self.pen_lt)
-        painter.drawLines(*lines)
+        key = (round(sx, 6), round(sy, 6))
+        if key in self.gridCache:
+            self.gridCache.move_to_end(key)
+            return self.gridCache[key]
 
-        lines = list()
-        left = l - (l % self.largeCellW)
-        top = t - (t % self.largeCellH)
-        for x in range(left,r,self.largeCellW):
-            lines.append(QLine(x,t,x,b))
-        for y in range(top,b,self.largeCellH):
-            lines.append(QLine(l,y,r,y))
-        painter.setPen(self.pen_hv)
-        painter.drawLines(*lines)
+        texture = None
+        cx, cy = self.largeCellW * sx, self.largeCellH * sy
+        if cx >= self.minCellPixels and cy >= self.minCellPixels:
+            kx, ky = math.ceil(self.textureSize / cx), math.ceil(self.textureSize / cy)
+            tw, th = math.ceil(kx * cx) + 1, math.ceil(ky * cy) + 1
+            image = QImage(tw, th, QImage.Format_ARGB32_Premultiplied)
+            image.fill(Qt.transparent)
+            painter = QPainter(image)
+            if self.cellw * sx >= self.minCellPixels and self.cellh * sy >= self.minCellPixels:
+                self._paint_texture_lines(painter, self.pen_lt, kx * cx, ky * cy, tw, th, kx * self.lcellsize, ky * self.lcellsize, (sx + sy) / 2)
+            self._paint_texture_lines(painter, self.pen_hv, kx * cx, ky * cy, tw, th, kx, ky, (sx + sy) / 2)
+            painter.end()
+            texture = (QPixmap.fromImage(image), kx * self.largeCellW, ky * self.largeCellH)
+
+        self.gridCache[key] = texture
+        while len(self.gridCache) > self.cacheSize:
+            self.gridCache.popitem(last=False)
+        return texture
+
+    @staticmethod
+    def _paint_texture_lines(painter,pen,w,h,tw,th,countx,county,scale):
+        '''在纹理中绘制每个格子的左边与上边,w, h为格子所占的像素范围(不是整数),
+        线宽按照缩放换算为像素,不足一个像素时降低透明度'''
+
+        width = pen.widthF() * scale
+        color = QColor(pen.color())
+        color.setAlphaF(color.alphaF() * min(1.0, width))
+        width = max(1, int(round(width)))
+        for i in range(countx):
+            painter.fillRect(int(round(i * w / countx)), 0, width, th, color)
+        for i in range(county):
+            painter.fillRect(0, int(round(i * h / county)), tw, width, color)
+
+    def invalidateGrid(self):
+        '''清空网格纹理的缓存,修改网格颜色或者尺寸之后需要调用'''
+
+        self.gridCache.clear()
+        self.update()
+
+    def drawBackground(self,painter,rect):
+        '''绘制背景\n
+        网格以缓存的纹理在设备坐标中逐块绘制,每一块的位置单独由场景坐标换算,因此舍入误差不会累积,
+        只有放大到一个大格子超过maxTextureSize像素(可见的网格线很少)或者视图被旋转时才直接绘制网格线'''
+        super().drawBackground(painter,rect)
+        transform = painter.worldTransform()
+        sx, sy = math.hypot(transform.m11(), transform.m12()), math.hypot(transform.m21(), transform.m22())
+        if transform.isRotating() or self.largeCellW * sx > self.maxTextureSize or self.largeCellH * sy > self.maxTextureSize:
+            self.drawGridLines(painter, rect, sx, sy)
+        elif sx > 0 and sy > 0:
+            texture = self.grid_texture(sx, sy)
+            if texture != None:
+                pixmap, pw, ph = texture
+                painter.save()
+                painter.resetTransform()
+                for i in range(math.floor(rect.left() / pw), math.floor(rect.right() / pw) + 1):
+                    for j in range(math.floor(rect.top() / ph), math.floor(rect.bottom() / ph) + 1):
+                        block = transform.mapRect(QRectF(i * pw, j * ph, pw, ph))
+                        painter.drawPixmap(round(block.left()), round(block.top()), pixmap)
+                painter.restore()
 
         halfWidth = int(self.size[0]/2)
         halfHeight = int(self.size[1]/2)
@@ -88,30 +193,79 @@ class EuclidSceneGrid(QGraphicsScene):
             QLine(0, -halfHeight, 0, halfHeight),
             QLine(-halfWidth, 0, halfWidth, 0)
         ]
-        painter.setPen(QColor("#00ffa5"))
+        painter.setPen(self.pen_axis)
         painter.drawLines(*lines)
 
+    def drawGridLines(self,painter,rect,sx,sy):
+        '''直接绘制可见范围内的网格线,小格子在屏幕上太小时只绘制大格子'''
+
+        l = int(math.floor(rect.left()))
+        r = int(math.ceil(rect.right()))
+        t = int(math.floor(rect.top()))
+        b = int(math.ceil(rect.bottom()))
+
+        grids = [(self.pen_hv, self.largeCellW, self.largeCellH)]
+        if self.cellw * sx >= self.minCellPixels and self.cellh * sy >= self.minCellPixels:
+            grids.insert(0, (self.pen_lt, self.cellw, self.cellh))
+        for pen, cellw, cellh in grids:
+            lines = list()
+            left = l - (l % cellw)
+            top = t - (t % cellh)
+            for x in range(left,r,cellw):
+                lines.append(QLine(x,t,x,b))
+            for y in range(top,b,cellh):
+                lines.append(QLine(l,y,r,y))
+            painter.setPen(pen)
+            painter.drawLines(*lines)
+
 class EuclidView(QGraphicsView):
     '''视图主要是作为一个存放Scene的容器, 并提供一些基本的导航的功能'''
 
-    def __init__(self,parent=None):
+    def __init__(self,parent=None,profile=RENDER_QUALITY):
         super().__init__(parent=parent)
         self.setObjectName(EUCLID_VIEW)
         self.zoom = Zoom()
         self.canMove = False
         self.baseDragMode = QGraphicsView.RubberBandDrag
+        self.profile = profile
         self._initialize()
 
     def _initialize(self):
         '''初始化EuclidView的基本属性'''
 
-        self.setRenderHints(QPainter.Antialiasing|QPainter.HighQualityAntialiasing|QPainter.TextAntialiasing|QPainter.SmoothPixmapTransform)
-        self.setViewportUpdateMode(QGraphicsView.FullViewportUpdate)
+        self.setRenderProfile(self.profile)
         self.setHorizontalScrollBarPolicy(Qt.ScrollBarAlwaysOff)
         self.setVerticalScrollBarPolicy(Qt.ScrollBarAlwaysOff)
         self.setTransformationAnchor(QGraphicsView.AnchorUnderMouse)
         self.setDragMode(self.baseDragMode)
 
+    def setRenderProfile(self, profile: RenderProfile):
+        '''切换渲染配置,场景中启用了缓存的Item会同时切换缓存模式'''
+
+        self.profile = profile
+        self.setViewportUpdateMode(profile.updateMode)
+        self.setRenderHints(profile.renderHints)
+        self.setCacheMode(profile.cacheMode)
+        self.resetCachedContent()
+        self.setOptimizationFlags(QGraphicsView.OptimizationFlags(profile.optimizationFlags))
+        self.applyItemCacheMode()
+        self.viewport().update()
+
+    def setScene(self, scene):
+        super().setScene(scene)
+        self.applyItemCacheMode()
+
+    def applyItemCacheMode(self):
+        '''将渲染配置的缓存模式应用到场景中,没有启用缓存的Item不受影响,之后加入场景的Item可以读取场景的itemCacheMode'''
+
+        scene = self.scene()
+        if scene is None:
+            return
+        scene.itemCacheMode = self.profile.itemCacheMode
+        for item in scene.items():
+            if item.cacheMode() != QGraphicsItem.NoCache and item.cacheMode() != self.profile.itemCacheMode:
+                item.setCacheMode(self.profile.itemCacheMode)
+
     def setBaseRubberBand(self, mode):
         self.baseDragMode = mode
         self.setDragMode(mode)
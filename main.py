@@ -18,6 +18,9 @@ from EditorTileWindow import *
 from EditorMapWindow import *
 from EditorProjectCreator import *
 from EditorData import *
+from EditorModel import load_room_file
+import EditorRoomFile
+import os
 
 
 class MapEditorMainWindow(QMainWindow):
@@ -33,6 +36,8 @@ class MapEditorMainWindow(QMainWindow):
         self.brushWindow = EditorBrushWindow(self)
         self.tileWindow = EditorTileWindow(self, labelSize=(50, 64))
         self.roomEditor = EditorMapWindow(self)
+        self.roomEditor.brushCreated.connect(self.brushWindow.add_brush)
+        self.brushWindow.brushChoosed.connect(self.roomEditor.choose_brush)
         self.createProjectWindow = ProjectCreatorWindow(self)
         self.createProjectWindow.hide()
         self.build_menu()
@@ -45,6 +50,18 @@ class MapEditorMainWindow(QMainWindow):
         menu_file = self.menubar.addMenu("文件")
         action = menu_file.addAction("创建工程")
         action.triggered.connect(self.create_project)
+        action = menu_file.addAction("打开工程")
+        action.triggered.connect(self.open_project)
+
+        menu_view = self.menubar.addMenu("视图")
+        menu_profile = menu_view.addMenu("渲染配置")
+        group = QActionGroup(self)
+        for profile in RENDER_PROFILES:
+            action = menu_profile.addAction(profile.title)
+            action.setCheckable(True)
+            action.setChecked(profile is self.roomEditor.view.profile)
+            action.triggered.connect(lambda checked, p=profile: self.roomEditor.view.setRenderProfile(p))
+            group.addAction(action)
 
     def create_project(self):
         '''创建一个新的工程'''
@@ -63,8 +80,43 @@ class MapEditorMainWindow(QMainWindow):
                 self.project = ProjectData(tilesize)
                 self.roomEditor.initproject(self.project)
                 self.tileWindow.load_project(self.project)
+                self.brushWindow.load_project(self.project)
         self.createProjectWindow.startup(_)
 
+    def open_project(self):
+        '''打开一个导出的房间文件,同时恢复工程与房间数据'''
+
+        filepath = qtutils.openfile("打开工程", filter=f"房间文件(*.json *{EditorRoomFile.EXTENSION})")
+        if filepath is None:
+            return
+        try:
+            data, room = load_room_file(filepath)
+        except Exception as e:
+            qtutils.information(None, "打开工程", f"无法读取文件:{str(e)}")
+            return
+        if self.project != None:
+            self.project.tileManager.stop_loading()
+        # DOC> 瓦片图像在后台加载,工程与房间先显示出来,瓦片加载完成后逐批刷新
+        self.project, missingCount = ProjectData.load_fromjson(data, wait=False)
+        # DOC> 缩略图的磁盘缓存存放在房间文件旁边
+        self.project.tileManager.thumbnails.folder = os.path.join(os.path.dirname(filepath), ".thumbnails")
+        self.roomEditor.initproject(self.project)
+        self.tileWindow.load_project(self.project)
+        self.brushWindow.load_project(self.project)
+        self.roomEditor.load_room(room)
+
+        def _(count:int):
+            '''回调函数(所有瓦片加载完成)'''
+
+            count += missingCount
+            if count > 0:
+                qtutils.information(None, "打开工程", f"{count}个瓦片文件丢失")
+        loader = self.project.tileManager.loader
+        loader.tilesLoaded.connect(self.tileWindow.refresh_tiles)
+        loader.tilesLoaded.connect(self.roomEditor.refresh_tiles)
+        loader.progress.connect(lambda done, total:self.roomEditor.output(f"载入瓦片{done}/{total}"))
+        loader.finished.connect(_)
+
     def setup(self):
         '''设置基本参数'''
 
@@ -91,6 +143,7 @@ class MapEditorMainWindow(QMainWindow):
                 return
             elif btn == QMessageBox.Ok:
                 print("保存当前的工程文件")
+        self.roomEditor.shutdown_jobs()
         EuclidWindow.save_layout(self, "./layout.txt")
 
     def resizeEvent(self, a0: QResizeEvent) -> None:
@@ -103,6 +156,7 @@ class MapEditorMainWindow(QMainWindow):
         self.project = ProjectData()
         self.roomEditor.initproject(self.project)
         self.tileWindow.load_project(self.project)
+        self.brushWindow.load_project(self.project)
 
 if __name__ == '__main__':
 
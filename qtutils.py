@@ -13,6 +13,14 @@ def savefile(caption="打开文件",filter="json文件(*.json)") -> str:
         return None
     return filename
 
+def openfile(caption="打开文件",filter="json文件(*.json)", folder="./") -> str:
+    '''获取单个文件'''
+
+    filename, filetypes = QFileDialog.getOpenFileName(None, caption=caption, filter=filter, directory=folder)
+    if len(filename) == 0:
+        return None
+    return filename
+
 def openfiles(caption="打开文件",filter="png文件(*.png)", folder="./") -> list:
     '''获取一组文件'''
 
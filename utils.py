@@ -1,8 +1,9 @@
 import os
 import time
-import copy
 import json
-import queue
+import uuid
+import bisect
+import contextlib
 
 def read(filepath:str) -> str:
     '''以文本的形式读取一个文件的所有信息'''
@@ -16,11 +17,84 @@ def save(cnt:str, filepath:str) -> None:
     with open(filepath, "w", encoding='utf-8') as f:
         f.write(cnt)
 
+@contextlib.contextmanager
+def atomic_open(filepath:str, mode="w", encoding='utf-8'):
+    '''以原子的方式写入文件:先写入同目录下的临时文件,完成后再替换目标文件,
+    写入过程中发生任何异常都不会破坏原有的文件'''
+
+    # DOC> 临时文件名是随机的并且以O_EXCL创建,同一个进程中同时写入同一个目标(例如后台导出与界面中的存储)也不会冲突,
+    # DOC> 创建时的权限0o666由系统按照umask调整,与open新建的文件相同
+    folder, name = os.path.split(os.path.abspath(filepath))
+    tmp = os.path.join(folder, f".{name}.{uuid.uuid4().hex}.tmp")
+    fd = os.open(tmp, os.O_WRONLY | os.O_CREAT | os.O_EXCL | getattr(os, "O_BINARY", 0), 0o666)
+    try:
+        # DOC> 替换已有的文件时保留其权限
+        if os.path.exists(filepath):
+            os.chmod(tmp, os.stat(filepath).st_mode & 0o7777)
+        f = os.fdopen(fd, mode, encoding=None if "b" in mode else encoding)
+    except BaseException:
+        os.close(fd)
+        os.remove(tmp)
+        raise
+    try:
+        yield f
+        f.flush()
+        os.fsync(f.fileno())
+        f.close()
+        os.replace(tmp, filepath)
+    except BaseException:
+        f.close()
+        if os.path.exists(tmp):
+            os.remove(tmp)
+        raise
+
+class JsonStream:
+    '''表示一个需要流式写出的JSON数组,parts中的每一项都是数组中连续的一段元素(list),
+    写出时每次只对一段元素进行编码,因此不需要在内存中构建完整的数组'''
+
+    def __init__(self, parts):
+        self.parts = parts
+
+def write_json(obj, f, encoder=None) -> None:
+    '''将obj以JSON的格式逐段写入到文件对象f中,obj中可以嵌套JsonStream'''
+
+    if encoder is None:
+        encoder = json.JSONEncoder(ensure_ascii=False)
+    if isinstance(obj, JsonStream):
+        f.write("[")
+        first = True
+        for part in obj.parts:
+            if len(part) == 0:
+                continue
+            if not first:
+                f.write(", ")
+            f.write(encoder.encode(part)[1:-1])
+            first = False
+        f.write("]")
+    elif isinstance(obj, dict):
+        f.write("{")
+        for i, (key, value) in enumerate(obj.items()):
+            if i > 0:
+                f.write(", ")
+            f.write(encoder.encode(str(key)))
+            f.write(": ")
+            write_json(value, f, encoder)
+        f.write("}")
+    elif isinstance(obj, (list, tuple)) and any(isinstance(_, (JsonStream, dict, list, tuple)) for _ in obj):
+        f.write("[")
+        for i, value in enumerate(obj):
+            if i > 0:
+                f.write(", ")
+            write_json(value, f, encoder)
+        f.write("]")
+    else:
+        f.write(encoder.encode(obj))
+
 def save_json(obj:dict, filepath:str) -> None:
-    '''存储一个dict到指定的JSON文件中'''
+    '''存储一个dict到指定的JSON文件中,数据逐段写入并以原子的方式替换目标文件'''
 
-    content = json.dumps(obj).encode("utf-8").decode("unicode-escape")
-    save(content, filepath)
+    with atomic_open(filepath) as f:
+        write_json(obj, f)
 
 def now():
     '''以默认的格式[hh:mm:ss]获取当前的时间信息'''
@@ -50,50 +124,87 @@ def parseNameFromPath(path:str,sep='/'):
 
 
 class Counter:
-    '''计数器'''
+    '''计数器\n
+    被回收的id以有序的区间列表[[start, end), ...]记录,总是优先分配最小的空闲id,
+    回收的id与已分配区间的末尾相连时直接收缩当前的计数,因此分配出去的id始终保持紧凑'''
 
     def __init__(self, entry=0):
+        self._entry = entry
         self._id = entry
-        self._queue = queue.Queue()
+        # DOC> 空闲区间的起点与终点(不包含),两个列表一一对应并按照起点升序排列
+        self._starts = list()
+        self._ends = list()
 
     def load_json(self, data):
-        '''从json数据中恢复counter的状态'''
+        '''从json数据中恢复counter的状态,兼容旧版本的recycleList'''
 
         self._id = data["currentId"]
-        self._queue = queue.Queue()
-        for value in data["recycleList"]:
-            self._queue.put(value)
+        self._starts, self._ends = list(), list()
+        if "recycleRanges" in data:
+            for start, end in data["recycleRanges"]:
+                self._starts.append(start)
+                self._ends.append(end)
+        else:
+            for value in data.get("recycleList", []):
+                self.recycle(value)
 
     @property
     def json(self):
-        '''将计数器存储为JSON数据'''
+        '''将计数器存储为JSON数据,空闲id以区间的形式存储'''
 
-        _queue = copy.copy(self._queue)
-        recycleList = list()
-        for i in range(_queue.qsize()):
-            recycleList.append(_queue.get())
-
-        # while _queue.not_empty:
-        #     recycleList.append(_queue.get())
         return {
             "currentId":self._id,
-            "recycleList":recycleList
+            "recycleRanges":[[start, end] for start, end in zip(self._starts, self._ends)]
         }
 
     @property
     def next_id(self):
         '''获取下一个id'''
 
-        if self._queue.empty():
+        if len(self._starts) == 0:
             buf = self._id
             self._id += 1
             return buf
-        return self._queue.get()
+        buf = self._starts[0]
+        if buf + 1 == self._ends[0]:
+            self._starts.pop(0)
+            self._ends.pop(0)
+        else:
+            self._starts[0] = buf + 1
+        return buf
+
+    def recycle(self, _id) -> bool:
+        '''回收一个id,id未被分配或者已经被回收时返回False'''
+
+        if _id < self._entry or _id >= self._id:
+            return False
+        i = bisect.bisect_right(self._starts, _id)
+        if i > 0 and _id < self._ends[i - 1]:
+            return False
+        mergeLeft = i > 0 and self._ends[i - 1] == _id
+        mergeRight = i < len(self._starts) and self._starts[i] == _id + 1
+        if mergeLeft and mergeRight:
+            self._ends[i - 1] = self._ends.pop(i)
+            self._starts.pop(i)
+        elif mergeLeft:
+            self._ends[i - 1] = _id + 1
+        elif mergeRight:
+            self._starts[i] = _id
+        else:
+            self._starts.insert(i, _id)
+            self._ends.insert(i, _id + 1)
 
-    def recycle(self, _id):
-        '''回收一个id'''
+        # DOC> 末尾的空闲区间直接归还给计数
+        if self._ends[-1] == self._id:
+            self._id = self._starts.pop()
+            self._ends.pop()
+        return True
+
+    @property
+    def count(self) -> int:
+        '''当前已经分配出去的id数量'''
 
-        self._queue.put(_id)
+        return self._id - self._entry - sum(end - start for start, end in zip(self._starts, self._ends))
 
 if __name__ == '__main__':
 